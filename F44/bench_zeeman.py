@@ -0,0 +1,103 @@
+#---Benchmark of the profile extraction and Voigt fits of F44---------------
+# The notebook way: Cd_values_*.txt profiles exported by hand, fit_peaks of
+# F44.ipynb (tripleV with 18 parameters, numerical derivatives) for the six
+# Cd images. The zeeman.py way: profiles from the jpg images (cold and warm
+# image cache), triplet fits of the Cd images and line fits of the eleven
+# Neon images in one job. Both results go through get_daDa, calc_del_lambda
+# and calc_mu_b of the notebook to compare mu_B.
+import os
+import time
+import numpy as np
+from scipy.optimize import curve_fit
+from scipy.signal import argrelmin
+from scipy import constants as consts
+
+import zeeman
+
+#---Settings------------------------------------------------
+data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+processes = None    # None: one per CPU
+#-----------------------------------------------------------
+
+# B in T for I = 8..13 A (mean of the six series of the notebook, B1 = B[7:])
+B_up = [[.421, .460, .512, .547, .578, .603], [.416, .464, .513, .546, .577, .602], [.418, .462, .506, .550, .573, .607]]
+B_down = [[.417, .467, .515, .553, .584, np.nan], [.419, .466, .511, .551, .582, np.nan], [.416, .467, .510, .548, .577, np.nan]]
+B1 = np.nanmean(B_up + B_down, axis=0)
+B1_err = np.nanstd(B_up + B_down, axis=0, ddof=1)
+
+
+def tripleV(x, *p):
+    return sum(zeeman.V(x, *p[6*i:6*i+6]) for i in range(3))
+
+
+def notebook_fit_peaks(x, y, kmin, kmax, order):
+    # fit_peaks of the notebook without the plot (and with the error of sigma2 from cov[13][13])
+    result = [[] for _ in range(6)]
+    minima = argrelmin(y, order=order)[0]
+    for i in range(kmin, kmax):
+        x_i = x[minima[i]: minima[i+1]]
+        y_i = y[minima[i]: minima[i+1]]
+        p, cov = curve_fit(tripleV, x_i, y_i, p0=[max(y_i), np.mean(x_i), 5, 5, min(y_i), 0,
+                                                  max(y_i)/np.sqrt(2), np.mean(x_i)-20, 5, 5, min(y_i), 0,
+                                                  max(y_i)/np.sqrt(2), np.mean(x_i)+20, 5, 5, min(y_i), 0],
+                           maxfev=2000000)
+        for values, value in zip(result, (p[1], np.sqrt(cov[1][1]), p[7], np.sqrt(cov[7][7]),
+                                          p[13], np.sqrt(cov[13][13]))):
+            values.append(value)
+    return result
+
+
+def pol2(x, p0, p1, p2):
+    return p0 + p1*x + p2*x*x
+
+
+def get_daDa(result):
+    pi, pi_err = np.array(result[0]), np.array(result[1])
+    k = np.arange(len(pi))
+    p, cov = curve_fit(pol2, pi, k, sigma=pi_err)
+    delk = np.concatenate((np.abs(k - pol2(np.array(result[2]), *p)), np.abs(k - pol2(np.array(result[4]), *p))))
+    return np.mean(delk), np.std(delk, ddof=1)
+
+
+def mu_b(delk, delk_err, B, B_err):
+    # calc_del_lambda and calc_mu_b of the notebook
+    n, d, lam = 1.4567, 4.40e-3, 643.845e-9
+    Dlam = lam*lam/(2*d*np.sqrt(n*n-1))
+    del_lam, del_lam_err = delk*Dlam, delk_err*Dlam
+    dE = consts.h*consts.c/lam - consts.h*consts.c/(lam+del_lam)
+    dE_err = del_lam_err*consts.h*consts.c/(lam+del_lam)**2
+    mu = dE/B
+    return mu, mu*np.sqrt((dE_err/dE)**2 + (B_err/B)**2)
+
+
+def summary(results):
+    mus = np.array([mu_b(*get_daDa(r), B, B_err) for r, B, B_err in zip(results, B1, B1_err)])
+    return np.mean(mus[:, 0]), np.sqrt(np.sum(mus[:, 1]**2)/len(mus))
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    notebook = []
+    for i in range(6):
+        x, y = np.loadtxt(os.path.join(data_path, 'Cd_Zeeman', 'Cd_values_{}.txt'.format(i+1)), skiprows=1,
+                          usecols=(0, 1), unpack=True)
+        y -= np.nanmin(y)
+        y /= np.nanmax(y)
+        notebook.append(notebook_fit_peaks(x, y, 1 if i < 2 else 0, 8, 40))
+    t_notebook = time.perf_counter() - start
+    mu, mu_err = summary(notebook)
+    print('notebook (txt profiles, 6 Cd images): {:.2f} s, {} triplets, mu_B = ({:.2f} +- {:.2f})e-24 J/T'.format(
+        t_notebook, sum(len(r[0]) for r in notebook), mu*1e24, mu_err*1e24))
+
+    cd, neon = os.path.join(data_path, 'Cd_Zeeman'), os.path.join(data_path, 'Neon')
+    zeeman.clear_cache(cd)
+    zeeman.clear_cache(neon)
+    for label, procs in (('cold cache, 1 process', 1), ('warm cache, 1 process', 1), ('warm cache, pool', processes)):
+        start = time.perf_counter()
+        profiles, fits = zeeman.process(cd, neon, processes=procs)
+        t = time.perf_counter() - start
+        results = zeeman.notebook_results(fits)
+        mu, mu_err = summary([results[p.name] for p in profiles[:6]])
+        print('zeeman.py {:<22} {:.2f} s for {} images, {} triplets + {} lines, mu_B = ({:.2f} +- {:.2f})e-24 J/T'.format(
+            label + ':', t, len(profiles), sum(f.kind == 'triplet' for f in fits), sum(f.kind == 'line' for f in fits),
+            mu*1e24, mu_err*1e24))
@@ -0,0 +1,289 @@
+import os
+import json
+import glob
+import time
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib.pyplot as plt
+from scipy.optimize import curve_fit
+from scipy.signal import argrelmin, find_peaks
+from scipy.special import wofz
+from scipy.ndimage import uniform_filter1d
+
+# Intensity profiles straight from the camera images in data/ and batched
+# Voigt fits of the lines, instead of the Cd_values_*.txt / Neon_values_*.txt
+# profiles exported by hand and the one-by-one fits of F44.ipynb.
+# An image is decoded once, the pixels are cached as .npy in the sidecar
+# directory .zeeman next to the images and read back as memory maps (renewed
+# when the mtime or size of the jpg changed). A profile is the sum over the
+# rows of a region (the lines are vertical stripes), binned over columns.
+# All lines of a series are fitted in one job on a process pool with the
+# analytic derivatives of the Voigt profile:
+#   triplet  the Zeeman triplet (sigma-, pi, sigma+) between two minima of a
+#            Cd profile (the windows of fit_peaks in the notebook)
+#   line     a single Voigt profile around a peak of a Neon profile
+#   fits = zeeman.fit_jobs(zeeman.triplet_jobs(zeeman.series('data/Cd_Zeeman')))
+#   results = zeeman.notebook_results(fits)   # [pi, pi_err, sigma1, sigma1_err, sigma2, sigma2_err] per image
+
+sidecar = '.zeeman'
+
+#---Settings------------------------------------------------
+channel = 'red'     # 'red', 'green', 'blue' or 'gray'
+rows = None         # (start, stop) of the summed rows, None: all
+cols = None         # (start, stop) of the columns, None: all
+binning = 1         # columns per profile point
+order = 40          # points, argrelmin order of the minima between the triplets (notebook)
+smooth = 9          # points, moving average before argrelmin
+split_guess = 20    # px, start distance of the sigma lines from the pi line (notebook)
+width_guess = 5     # px, start sigma and gamma of the Voigt profiles (notebook)
+line_prominence = 0.05  # of the profile maximum, peaks of the line spectra
+line_window = 15    # px, +- around a line peak
+min_sigma = 1.0     # px, lower bound of the Gaussian widths (towards a pure Lorentzian the fit crawls)
+tolerance = 1e-6    # relative, ftol and xtol of the fits
+#-----------------------------------------------------------
+
+channels = {'red': 0, 'green': 1, 'blue': 2}
+
+Profile = namedtuple('Profile', ['name', 'x', 'y'])
+
+# kind: 'triplet' or 'line', p0 of triplet or V
+Job = namedtuple('Job', ['name', 'kind', 'x', 'y', 'p0'])
+
+# popt, perr and pcov of the model of the job (NaN if the fit failed)
+Fit = namedtuple('Fit', ['name', 'kind', 'popt', 'perr', 'pcov'])
+
+
+#---images---------------------------------------------------
+def _index_file(path):
+    return os.path.join(path, sidecar, 'index.json')
+
+
+def _read_index(path):
+    try:
+        with open(_index_file(path)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(path, entries, replace=False):
+    # merges entries into the index on disk and installs it with os.replace of a temporary
+    # file with a unique name, like the catalog of F47 (several processes may load images)
+    index = {} if replace else _read_index(path)
+    index.update(entries)
+    os.makedirs(os.path.join(path, sidecar), exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', dir=os.path.join(path, sidecar), suffix='.tmp', delete=False) as file:
+        json.dump(index, file, indent=1)
+    os.replace(file.name, _index_file(path))
+
+
+def load_image(fname):
+    """Pixels (rows x cols x 3, uint8) of an image, decoded once and then read as memory map."""
+    path, name = os.path.split(os.path.abspath(fname))
+    stat = os.stat(fname)
+    key = [stat.st_mtime_ns, stat.st_size]
+    cache = os.path.join(path, sidecar, name + '.npy')
+    index = _read_index(path)
+    if index.get(name) == key and os.path.exists(cache):
+        return np.load(cache, mmap_mode='r')
+    pixels = np.asarray(plt.imread(fname))
+    os.makedirs(os.path.join(path, sidecar), exist_ok=True)
+    np.save(cache, pixels)
+    _write_index(path, {name: key})
+    return np.load(cache, mmap_mode='r')
+
+
+def clear_cache(path):
+    for name in _read_index(path):
+        try:
+            os.remove(os.path.join(path, sidecar, name + '.npy'))
+        except OSError:
+            pass
+    _write_index(path, {}, replace=True)
+
+
+def profile(pixels, rows=rows, cols=cols, channel=channel, binning=binning):
+    """
+    (x, intensity) of the region rows x cols of an image: sum over the rows,
+    binning columns per point, x is the center of the bin in pixels.
+    """
+    r0, r1 = rows or (0, pixels.shape[0])
+    c0, c1 = cols or (0, pixels.shape[1])
+    region = pixels[r0:r1, c0:c1]
+    if region.ndim == 3:
+        region = region.mean(axis=2) if channel == 'gray' else region[:, :, channels[channel]]
+    y = region.sum(axis=0, dtype=float)
+    n = len(y) // binning
+    y = y[:n*binning].reshape(n, binning).sum(axis=1)
+    x = c0 + np.arange(n)*binning + (binning - 1)/2
+    return x, y
+
+
+def series(path, pattern='*.jpg', normalize=True, **region):
+    """
+    Profiles of all images in path in file name order, like the profiles of the
+    notebook: minimum subtracted, divided by the maximum if normalize.
+    region: rows, cols, channel, binning of profile().
+    """
+    profiles = []
+    for fname in sorted(glob.glob(os.path.join(path, pattern))):
+        x, y = profile(load_image(fname), **region)
+        y = y - np.min(y)
+        if normalize:
+            y /= np.max(y)
+        profiles.append(Profile(os.path.basename(fname), x, y))
+    return profiles
+
+
+#---models---------------------------------------------------
+def gauss(x, a, mu, sig, c):
+    return a*np.exp(-((x-mu)*(x-mu))/(sig*sig)) + c
+
+
+def V(x, a, x0, sigma, gamma, off, oc):
+    return a * np.real(wofz(((x-x0) + 1j*gamma)/sigma/np.sqrt(2))) + off + oc*x
+
+
+def V_jacobian(x, a, x0, sigma, gamma, off, oc):
+    # derivatives with respect to a, x0, sigma, gamma, off, oc with w'(z) = -2 z w(z) + 2i/sqrt(pi)
+    s = sigma*np.sqrt(2)
+    z = ((x-x0) + 1j*gamma)/s
+    w = wofz(z)
+    dw = -2*z*w + 2j/np.sqrt(np.pi)
+    return np.stack([w.real, a*np.real(-dw/s), a*np.real(-dw*z/sigma), a*np.real(1j*dw/s),
+                     np.ones_like(x), x], axis=-1)
+
+
+def triplet(x, a1, x1, s1, g1, a2, x2, s2, g2, a3, x3, s3, g3, off, oc):
+    # tripleV of the notebook with one background (the three offsets and slopes are degenerate)
+    return V(x, a1, x1, s1, g1, off, oc) + V(x, a2, x2, s2, g2, 0, 0) + V(x, a3, x3, s3, g3, 0, 0)
+
+
+def triplet_jacobian(x, a1, x1, s1, g1, a2, x2, s2, g2, a3, x3, s3, g3, off, oc):
+    j = [V_jacobian(x, a, x0, s, g, 0, 0)[:, :4] for a, x0, s, g in ((a1, x1, s1, g1), (a2, x2, s2, g2), (a3, x3, s3, g3))]
+    return np.concatenate(j + [np.ones((len(x), 1)), x[:, None]], axis=1)
+
+
+models = {'triplet': (triplet, triplet_jacobian), 'line': (V, V_jacobian)}
+
+
+#---jobs-----------------------------------------------------
+def triplet_windows(y, order=order, smooth=smooth):
+    """
+    (start, stop) between consecutive minima of the smoothed profile with the
+    maximum inside (no triplet cut at the border). A window shorter than 0.6
+    times the median is the gap between the lines of one triplet, its higher minimum
+    is dropped.
+    """
+    minima = list(argrelmin(uniform_filter1d(y, smooth), order=order)[0])
+    while len(minima) > 2:
+        lengths = np.diff(minima)
+        short = int(np.argmin(lengths))
+        if lengths[short] >= 0.6*np.median(lengths):
+            break
+        del minima[short if y[minima[short]] > y[minima[short+1]] else short+1]
+    windows = []
+    for i0, i1 in zip(minima[:-1], minima[1:]):
+        peak = i0 + np.argmax(y[i0:i1])
+        if i0 + (i1-i0)//10 < peak < i1 - (i1-i0)//10:
+            windows.append((int(i0), int(i1)))
+    return windows
+
+
+def triplet_jobs(profiles, order=order):
+    """One job per Zeeman triplet of the profiles, start values from the data like in the notebook."""
+    jobs = []
+    for p in profiles:
+        for i0, i1 in triplet_windows(p.y, order):
+            x, y = p.x[i0:i1], p.y[i0:i1]
+            top, low, center = np.max(y), np.min(y), x[np.argmax(y)]
+            p0 = [top/np.sqrt(2), center - split_guess, width_guess, width_guess,
+                  top, center, width_guess, width_guess,
+                  top/np.sqrt(2), center + split_guess, width_guess, width_guess, low, 0]
+            jobs.append(Job(p.name, 'triplet', x, y, p0))
+    return jobs
+
+
+def line_jobs(profiles, prominence=line_prominence, window=line_window):
+    """One job per peak of the (Neon) line profiles."""
+    jobs = []
+    for p in profiles:
+        peaks, _ = find_peaks(p.y, prominence=prominence*np.max(p.y))
+        for k, i in enumerate(peaks):
+            i0 = max(i - window, (peaks[k-1] + i)//2 if k > 0 else 0)
+            i1 = min(i + window + 1, (peaks[k+1] + i)//2 if k+1 < len(peaks) else len(p.y))
+            x, y = p.x[i0:i1], p.y[i0:i1]
+            jobs.append(Job(p.name, 'line', x, y, [p.y[i] - np.min(y), p.x[i], width_guess/2, width_guess/2, np.min(y), 0]))
+    return jobs
+
+
+def fit_job(job):
+    f, jac = models[job.kind]
+    n = len(job.p0)
+    # centers inside the window, sigma >= min_sigma, gamma >= 0
+    lower, upper = np.full(n, -np.inf), np.full(n, np.inf)
+    for i in range(0, n-2, 4) if job.kind == 'triplet' else (0, ):
+        lower[i+1:i+4] = job.x[0], min_sigma, 0
+        upper[i+1] = job.x[-1]
+    p0 = np.clip(job.p0, lower + 1e-6, upper - 1e-6)
+    try:
+        popt, pcov = curve_fit(f, job.x, job.y, p0=p0, jac=jac, bounds=(lower, upper), method='trf', x_scale='jac',
+                               ftol=tolerance, xtol=tolerance, max_nfev=10000)
+    except (RuntimeError, ValueError) as err:
+        print('fit of {} at {:.0f} px failed ({})'.format(job.name, job.x[len(job.x)//2], err))
+        return Fit(job.name, job.kind, np.full(n, np.nan), np.full(n, np.nan), np.full((n, n), np.nan))
+    return Fit(job.name, job.kind, popt, np.sqrt(np.diag(pcov)), pcov)
+
+
+def fit_jobs(jobs, processes=None, chunksize=4):
+    """Fits all jobs on a pool of processes (processes=1: in this process), results in job order."""
+    if processes == 1 or len(jobs) < 2:
+        return [fit_job(job) for job in jobs]
+    with ProcessPoolExecutor(processes) as pool:
+        return list(pool.map(fit_job, jobs, chunksize=chunksize))
+
+
+#---results--------------------------------------------------
+def lines(fit):
+    """(x0, x0_err) of the lines of a fit sorted by position (sigma-, pi, sigma+ for a triplet)."""
+    centers = [(fit.popt[i], fit.perr[i]) for i in range(1, len(fit.popt) - 2, 4)] if fit.kind == 'triplet' \
+        else [(fit.popt[1], fit.perr[1])]
+    return sorted(centers)
+
+
+def notebook_results(fits):
+    """
+    name -> [pi, pi_err, sigma1, sigma1_err, sigma2, sigma2_err] of the triplet fits,
+    the format of fit_peaks in the notebook (for get_daDa).
+    """
+    results = {}
+    for fit in fits:
+        if fit.kind != 'triplet' or not np.all(np.isfinite(fit.popt)):
+            continue
+        (s1, s1_err), (pi, pi_err), (s2, s2_err) = lines(fit)
+        result = results.setdefault(fit.name, [[] for _ in range(6)])
+        for values, value in zip(result, (pi, pi_err, s1, s1_err, s2, s2_err)):
+            values.append(value)
+    return results
+
+
+def process(cd_path, neon_path=None, processes=None, **region):
+    """Profiles and fits of a whole exposure series in one job, returns (profiles, fits)."""
+    profiles = series(cd_path, **region)
+    jobs = triplet_jobs(profiles)
+    if neon_path is not None:
+        neon = series(neon_path, normalize=False, **region)
+        profiles += neon
+        jobs += line_jobs(neon)
+    return profiles, fit_jobs(jobs, processes)
+
+
+if __name__ == '__main__':
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    start = time.perf_counter()
+    profiles, fits = process(os.path.join(data_dir, 'Cd_Zeeman'), os.path.join(data_dir, 'Neon'))
+    print('{} images, {} fits in {:.2f} s'.format(len(profiles), len(fits), time.perf_counter() - start))
+    for name, result in notebook_results(fits).items():
+        print(name, ' '.join('{:.1f}'.format(pi) for pi in result[0]))
@@ -2,6 +2,9 @@ import devices
 import time
 import numpy as np
 
+import lifetimefit
+import dip
+
 
 
 ## define and set times for measurement cycle
@@ -22,64 +25,171 @@ detect = 50
 # with wait3, thats why the total cycle time is defined like this:
 cycle_time = load + wait1 + excite + wait2 + rigol + wait3 + detect
 
-devices.set_time('load', load)
-devices.set_time('wait1', wait1)
-devices.set_time('excite', excite)
-devices.set_time('wait2', wait2)
-devices.set_time('detect', detect)
-devices.set_time('wait3', wait3)
-devices.set_time('rigol', rigol)
-
-## set magnetic field
-devices.set_coil_current(1.3) # maximum current: 1.3 A
-
-## set ring voltage
-# The sweeping will be done by switching to 15 V with a capacitance
-# connected to use the discharge of the C as a method of ramping.
-# The ramp is not linear and you can check the voltage value at
-# data taking time using an osci probe connected to Vring in the
-# detection system box.
-# This voltage here defines the ring voltage before the ramp, so
-# also during excitation. But reducing it, will also change the
-# voltage and axial frequency your ion has during detection.
-devices.set_ring_voltage(39.5)
-
-
-## Initialize the RIGOL spectrum analyzer for measurement
-# Trigger and some other settings are hard code in the routine, but
-# some values you might want to adjust during a scan can be given as
-# an argument. Check the definition of this function for more information.
-#devices.set_analyzer_to_zero_span()
-SWT = 250                                                                    
-devices.set_analyzer_to_zero_span(center_freq="57.35MHz", ref_level = "-16.0", 
-                              PDIV_scale = "3.0", sweep_time="{}ms".format(SWT))
-
-# just give the RIGOL some time to understand its commands.
-time.sleep(1)
-
-# continuously load, excite, and measure:
-f = open('lifetime_Neumann_Striebel.txt', 'w')
-averages = 10
+SWT = 250   # sweep time of the RIGOL in ms
 
+# lifetime measurement: averages shots for each storage time wait2
+averages = 10
 wait_times = np.linspace(20, 500, 55)
-
-for wait2 in wait_times:
-     mmd_arr = []
-     #devices.set_trigger_times(load, wait1, excite, wait2, detect, wait3, rigolt)
-     devices.set_time('wait2', wait2)
-     cycle_time = load + wait1 + excite + wait2 + rigol + wait3 + detect
-     wait = wait1 + excite + wait2 + rigol + 30 + SWT/2
-     for j in range(averages):
-          print('.', end='')
-          devices.send_trigger()
-          time.sleep((cycle_time+200)/1000)
-          data = devices.get_analyzer_data_fast() #this function obtains the data currently shown in the DSA 815 - an array containing the vertical coordinates of the points in the graph.
-          mmd_arr.append(np.average(data[:10]) - min(data)) # calculates the MMD of the data. MMD = depth of deepest dip in graph "Maximum-Minimum-Difference"
-     print('')
-     mmd = np.average(mmd_arr)
-     std = np.std(mmd_arr)
-     print(wait, mmd)
-     f.write(str(wait)+','+ str(mmd)+','+str(std)+'\n')
-     f.flush()
-
-f.close()
+fname = 'lifetime_Neumann_Striebel.txt'
+
+# online mode (measure_lifetime_online): the wait times and averages are chosen
+# after every point where they reduce the error of tau most, until tau has
+# target_rel_error or max_shots shots are used
+online = False
+target_rel_error = 0.05
+max_shots = 550         # as many as the fixed grid
+online_averages = (3, 5, 10)
+
+# dip depth of the traces (see dip.py): 'lifetime' is the MMD used here so far (minimum of all
+# points), 'legacy' the one of MeasurementScript.py, 'smoothed' and 'matched' are less biased
+# by single noisy points. reject_outliers drops shots far off the others of a point.
+dip_method = 'lifetime'
+reject_outliers = False
+
+
+def setup():
+    devices.set_time('load', load)
+    devices.set_time('wait1', wait1)
+    devices.set_time('excite', excite)
+    devices.set_time('wait2', wait2)
+    devices.set_time('detect', detect)
+    devices.set_time('wait3', wait3)
+    devices.set_time('rigol', rigol)
+
+    ## set magnetic field
+    devices.set_coil_current(1.3) # maximum current: 1.3 A
+
+    ## set ring voltage
+    # The sweeping will be done by switching to 15 V with a capacitance
+    # connected to use the discharge of the C as a method of ramping.
+    # The ramp is not linear and you can check the voltage value at
+    # data taking time using an osci probe connected to Vring in the
+    # detection system box.
+    # This voltage here defines the ring voltage before the ramp, so
+    # also during excitation. But reducing it, will also change the
+    # voltage and axial frequency your ion has during detection.
+    devices.set_ring_voltage(39.5)
+
+
+    ## Initialize the RIGOL spectrum analyzer for measurement
+    # Trigger and some other settings are hard code in the routine, but
+    # some values you might want to adjust during a scan can be given as
+    # an argument. Check the definition of this function for more information.
+    #devices.set_analyzer_to_zero_span()
+    devices.set_analyzer_to_zero_span(center_freq="57.35MHz", ref_level = "-16.0", 
+                                  PDIV_scale = "3.0", sweep_time="{}ms".format(SWT))
+
+    # just give the RIGOL some time to understand its commands.
+    time.sleep(1)
+
+
+def wait_time(wait2):
+    # time axis of the file: from the load pulse until the middle of the sweep
+    return wait1 + excite + wait2 + rigol + 30 + SWT/2
+
+
+def shot_time(wait2):
+    return (load + wait1 + excite + wait2 + rigol + wait3 + detect + 200)/1000
+
+
+def measure_point(wait2, averages):
+    # MMDs of averages shots with the storage time wait2
+    shot_traces = []
+    #devices.set_trigger_times(load, wait1, excite, wait2, detect, wait3, rigolt)
+    devices.set_time('wait2', wait2)
+    for j in range(averages):
+         print('.', end='')
+         devices.trigger_shot()
+         time.sleep(shot_time(wait2))
+         data = devices.get_analyzer_data_fast() #this function obtains the data currently shown in the DSA 815 - an array containing the vertical coordinates of the points in the graph.
+         shot_traces.append(data)
+    print('')
+    # MMDs of all shots in one pass (see dip.py). MMD = depth of deepest dip in graph "Maximum-Minimum-Difference"
+    result = dip.measure(shot_traces, dip_method, reject_outliers)
+    return list(result.values[result.valid])
+
+
+def measure_lifetime(wait_times=wait_times, averages=averages, fname=fname):
+    # continuously load, excite, and measure:
+    f = open(fname, 'w')
+
+    for wait2 in wait_times:
+         mmd_arr = measure_point(wait2, averages)
+         wait = wait_time(wait2)
+         mmd = np.average(mmd_arr)
+         std = np.std(mmd_arr)
+         print(wait, mmd)
+         f.write(str(wait)+','+ str(mmd)+','+str(std)+'\n')
+         f.flush()
+
+    f.close()
+
+
+def measure_lifetime_online(wait_times=wait_times, fname=fname, target=target_rel_error,
+                            max_shots=max_shots, averages=online_averages):
+    """
+    Same file as measure_lifetime (wait,mmd,std), but the next wait2 out of wait_times and
+    the number of averages are chosen with the fit of all points so far (see lifetimefit.py).
+    Starts with 4 points spread over wait_times, stops when the relative error of tau is
+    below target. The fit after every point is printed and written to <fname>_fit.log.
+    Returns the fit parameters and their covariance.
+    """
+    f = open(fname, 'w')
+    log = open(fname.rsplit('.', 1)[0] + '_fit.log', 'w')
+    wait_times = np.asarray(wait_times, dtype=float)
+    start = [wait_times[i] for i in np.linspace(0, len(wait_times)-1, 4).astype(int)]
+    points = []     # (wait, mmd, std, n)
+    popt, pcov = np.array(lifetimefit.guess, dtype=float), None
+    shots = 0
+    next_points = [(wait2, averages[1]) for wait2 in start]
+    while shots < max_shots:
+         wait2, n = next_points.pop(0) if next_points else next_points_for(points, popt, wait_times, averages)
+         mmd_arr = measure_point(wait2, n)
+         shots += n
+         wait, mmd, std = wait_time(wait2), np.average(mmd_arr), np.std(mmd_arr)
+         points.append((wait, mmd, std, n))
+         f.write(str(wait)+','+ str(mmd)+','+str(std)+'\n')
+         f.flush()
+         if len(points) < 4:
+              continue
+         fitted = None
+         for p0 in (popt, lifetimefit.guess):   # start again from the guess if the fit runs away
+              try:
+                   fitted = lifetimefit.fit(*zip(*points), p0=p0, pooled=True)
+              except (RuntimeError, ValueError) as err:
+                   print('fit failed ('+str(err)+')')
+                   continue
+              if 0 < fitted[0][1] < 10*max(wait_time(wait_times)):
+                   break
+         if fitted is None:
+              continue
+         popt, pcov = fitted
+         tau, tau_err = popt[1], np.sqrt(pcov[1][1])
+         line = 'wait={:.1f} n={} mmd={:.3f} shots={} N0={:.2f} tau=({:.2f} +- {:.2f}) ms off={:.3f}'.format(
+              wait, n, mmd, shots, popt[0], tau, tau_err, popt[2])
+         print(line)
+         log.write(line+'\n')
+         log.flush()
+         if len(points) >= 6 and np.isfinite(tau_err) and tau_err/abs(tau) < target:
+              break
+
+    f.close()
+    log.close()
+    return popt, pcov
+
+
+def next_points_for(points, popt, wait_times, averages):
+    # wait2 and number of averages that reduce the error of tau most per second
+    wait, mmd, std, n = (np.array(a) for a in zip(*points))
+    sigma = lifetimefit.shot_sigma(std, n)
+    t, k = lifetimefit.next_point(wait_time(wait_times), lambda t: shot_time(t - wait_time(0)),
+                                  wait, n, popt, sigma, averages)
+    return t - wait_time(0), k
+
+
+if __name__ == "__main__": # setup() and measure_lifetime() can also be imported, e.g. by the benchmarks
+    setup()
+    if online:
+        measure_lifetime_online()
+    else:
+        measure_lifetime()
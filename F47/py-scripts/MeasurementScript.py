@@ -1,6 +1,17 @@
 import devices
+import traces
+import adaptive
+import ringsweep
+import dip
+import scanstore
+import campaign
+import monitor
+import instrument
 import time
 import os
+import sys
+import queue
+import threading
 import numpy as np
 
 #============================================
@@ -14,6 +25,13 @@ if not os.path.exists(directoryname):
     os.makedirs(directoryname)
 path = directoryname
 
+#besides the csv files, all scans are stored with the single shots and the run
+#parameters in one binary store (see scanstore.py), None: only csv files
+store_path = os.path.join(path, 'scans.store')
+
+#journal of the campaign in measurement(), a crashed campaign continues where it stopped
+journal_file = 'campaign_journal.jsonl'
+
 #Trigger timings
 load = 500
 wait1 = 5
@@ -24,27 +42,72 @@ wait3 = 0
 detect = 50
 cycle_time = load + wait1 + excite + wait2 + rigol + wait3 + detect
      
-devices.set_time('load', load)
-devices.set_time('wait1', wait1)
-devices.set_time('excite', excite)
-devices.set_time('wait2', wait2)
-devices.set_time('detect', detect)
-devices.set_time('wait3', wait3)
-devices.set_time('rigol', rigol)
+#upload all times with one command (instead of devices.set_time for every single time)
+devices.configure_trigger(load, wait1, excite, wait2, detect, wait3, rigol)
 
 #number of averages per cycle
 average_num = 5 
 
+#wait for the devices to report the end of a shot instead of sleeping for the
+#worst case (see devices.enable_event_pacing), falls back to the fixed sleeps.
+#Off by default: needs a trigger box firmware that acknowledges every cycle (devices.trigger_ack)
+event_pacing = False
+
+#trigger, read out and evaluate the shots in parallel threads (see scanFreqPipelined)
+pipelined = False
+readout_margin = 50 #ms between the end of the sweep and the readout of the trace
+trigger_margin = 20 #ms between the end of a cycle and the next trigger
+
+#dip depth of the traces (see dip.py): 'legacy' (mean of the first 10 points - minimum),
+#'smoothed' or 'matched' (less biased by single noisy points), reject_outliers drops the
+#shots of a step which are far off the others (median/MAD)
+dip_method = 'legacy'
+reject_outliers = False
+
+#sweep time of the spectrum analyzer in ms
+sweep_time = 250
+
+#hardware looped averaging: the trigger box runs average_num cycles back-to-back and
+#the analyzer averages the traces, only one trace is read out per frequency step
+burst = False
+
+#adaptive scans (see scanFreqAdaptive): coarse steps with few averages over the full
+#range, then fine steps with average_num averages only around dips and edges
+coarse_step = 1.0
+coarse_average_num = 2
+refine_threshold = 4.0 #a dip/edge has to be this many noise levels deep/high
+
 #trap ring voltage
 ring_voltages = [24, 27, 28.12, 30, 35, 40]
 
 #magnet coil currents
 coil_currents = [1.1, 1.15, 1.2, 1.25, 1.3]
 
+#ring voltage sweep detection (see ringsweep.py and axialRingSweep): the SRS ramps the ring
+#voltage linearly, started by the detect pulse, the trace gives the dip against the voltage.
+#With wait3 = 30 the ramp starts together with the sweep of the analyzer.
+ring_sweep_range = (45, 20)     #V, start and end of the ramp (loading and excitation at the start voltage)
+ring_sweep_time = 200           #ms, at least 100 ms for the full range, at most the sweep time
+ring_sweep_offset = 0           #ms, delay of the ramp start found by a calibration
+axial_center_freqs = [52, 55, 57.3, 60, 62]   #MHz, analyzer center frequencies of axialRingSweep
+ring_sweep_detection = False    #measurement() starts with axialRingSweep
+
+#show every trace and the MMDs live in a separate plot process (see monitor.py),
+#the window can be closed and opened again with monitor.start() during the campaign
+live_monitor = False
+
+#record the time of every device function, transfer, sleep and retry of the campaign
+#in measurement() (see instrument.py), written as timeline (open it in ui.perfetto.dev)
+instrumentation = False
+timeline_file = 'timeline.json'
+
 
 #finalize setup for measurement: set spectrum analyzer to zero span mode
 devices.set_analyzer_to_zero_span(center_freq="57.3MHz", ref_level = "-15.5", 
-                              PDIV_scale = "5.0", sweep_time="250ms")
+                              PDIV_scale = "5.0", sweep_time="{}ms".format(sweep_time))
+
+if live_monitor:
+    monitor.start()
 
 print("Start...")
 
@@ -52,12 +115,71 @@ print("Start...")
 # MEASUREMENT FUNCTION
 #============================================
 
-def scanFreq(freq_min, freq_max, freq_step, rvolt, ccurrent, excitation_power):
+def trigger_shot():
+    # starts one measurement cycle, after a failure of the trigger box only this shot is repeated
+    devices.trigger_shot()
+
+def mmd(data):
+    # MMD of a trace = depth of deepest dip in graph
+    return dip.depths(data, dip_method)[0]
+
+def shot_depths(shot_traces, f=np.nan):
+    # MMDs of the traces of one step in one pass (see dip.py), without the rejected shots
+    if not shot_traces:
+        return []
+    result = dip.measure(shot_traces, dip_method, reject_outliers)
+    for data, value in zip(shot_traces, result.values):
+        monitor.feed(data, f, value) # only copies the trace if the live monitor is running
+    return list(result.values[result.valid])
+
+def prepare_scan(rvolt, ccurrent, excitation_power, event_pacing=event_pacing, burst=burst):
+    if event_pacing:
+        # with burst the analyzer has to sweep continuously for the averaging
+        devices.enable_event_pacing(events=("generator",) if burst else ("trigger", "sweep", "generator"))
+    devices.set_ring_voltage(rvolt) #sets the ring voltage to given value
+    devices.set_coil_current(ccurrent) #sets the coil current to given value
+    devices.excitation_on() #switch on the output of the excitation
+    devices.set_excitation_power(excitation_power) #sets the excitation power to given value
+
+def measure_frequency(f, averages=None, burst=burst):
+    """
+    Sets the excitation frequency to f and returns the MMD averaged over averages shots (default: average_num).
+    With burst the analyzer averages the traces and the MMD of the averaged trace is returned.
+    """
+    return np.average(measure_shots(f, averages, burst))
+
+def measure_shots(f, averages=None, burst=burst):
+    # MMDs of the single shots at f (with burst only the one of the averaged trace)
+    if averages is None:
+        averages = average_num
+    devices.set_excitation_frequency(f) #set the current excitation frequency to f
+    if burst:
+        data = devices.get_analyzer_burst_data(averages, burst_time(averages))
+        return shot_depths([data], f) # MMD of the averaged trace
+    shot_traces = []
+    for ii in range(averages):
+        devices.arm_sweep() #only needed for event pacing: analyzer waits for the next trigger
+        trigger_shot()
+
+        #wait until the analyzer finished the sweep, or a bit longer than the measurement cycle
+        devices.wait_sweep_complete(0.4 + (cycle_time+150)/1000)
+        devices.wait_trigger_done(0) #the trigger box has to be ready for the next shot
+        data = devices.get_analyzer_data_fast() #this function obtains the data currently shown in the DSA 815 - an array containing the vertical coordinates (MMD) of the points in the graph.
+        shot_traces.append(data)
+    return shot_depths(shot_traces, f) # MMDs of the traces. MMD = depth of deepest dip in graph
+
+def scanFreq(freq_min, freq_max, freq_step, rvolt, ccurrent, excitation_power, event_pacing=event_pacing, pipelined=pipelined, burst=burst):
     """
     This function scans over the frequency of the antenna excitation signal starting from freq_min until freq_max in steps of freq_step.
     For each step it reads the trace of the SDA815 spectrum analyzer and calculates the MMD (maximum-minimum-depth), averages it (depending
     on your settings) and writes it into a file.
+    With event_pacing the next step starts as soon as the devices report that they are done, otherwise fixed sleeps are used.
+    With pipelined the scan is done by scanFreqPipelined.
+    With burst the averaging is done by the analyzer over average_num back-to-back cycles. The MMD is then
+    calculated from the averaged trace instead of averaging the MMDs of the single traces.
     """
+    if pipelined and not burst:
+        return scanFreqPipelined(freq_min, freq_max, freq_step, rvolt, ccurrent, excitation_power, event_pacing)
 
     #epoch_time = int(time.time()) # this function saves the current time (as kept by the computer) into epoch_time
 
@@ -69,50 +191,271 @@ def scanFreq(freq_min, freq_max, freq_step, rvolt, ccurrent, excitation_power):
     """
 
     #define the filename and create/open datafile
-    fname = 'Neumann_Striebel_' + time.strftime("%Y_%m_%d_%H_%M_%S") + "_" + str(rvolt) + "V_" + str(ccurrent) + "A_" + str(freq_min) + "-" + str(freq_max) + "MHz_" + str(excitation_power) + "dBm.csv"
-    file = open(os.path.join(path, fname), "w+")
+    file = open(os.path.join(path, scan_filename(freq_min, freq_max, rvolt, ccurrent, excitation_power)), "w+")
     file_flush_counter = 0  #counts the amount of data points saved into the buffer (the computer's temporary storage space)
-    devices.set_ring_voltage(rvolt) #sets the ring voltage to given value
-    devices.set_coil_current(ccurrent) #sets the coil current to given value
-    devices.excitation_on() #switch on the output of the excitation
-    devices.set_excitation_power(excitation_power) #sets the excitation power to given value
-    for f in np.arange(freq_min, freq_max, freq_step): #scan the frequencies from freq_min in steps of size freq_step until freq_max
-        devices.set_excitation_frequency(f) #set the current excitation frequency to f
-        mmr_av = []
-        for ii in range(average_num):
-            try:
-                devices.send_trigger()
-            except:
-                print("trigger failed")
-                try:
-                    devices.trigger.clear()
-                    time.sleep(0.3)
-                    devices.send_trigger()
-                except:
-                    print("trigger failed double")
-                    devices.trigger.clear()
-                    devices.fix_arduino_comm()
-                    time.sleep(10)
-                    devices.send_trigger()
-        
-            time.sleep(0.4)
-            time.sleep((cycle_time+150)/1000) #sleep in seconds, a bit longer than the measurement cycle        
-            data = devices.get_analyzer_data_fast() #this function obtains the data currently shown in the DSA 815 - an array containing the vertical coordinates (MMD) of the points in the graph.
-            mmr_av.append(np.average(data[0:10]) - min(data[1:])) # calculates the MMD of the data. MMD = depth of deepest dip in graph
-            
-        mmr = np.average(mmr_av)
+    store = open_store(freq_min, freq_max, freq_step, rvolt, ccurrent, excitation_power, burst=burst)
+    scan_start = time.perf_counter()
+    try:
+        prepare_scan(rvolt, ccurrent, excitation_power, event_pacing, burst)
+        for f in np.arange(freq_min, freq_max, freq_step): #scan the frequencies from freq_min in steps of size freq_step until freq_max
+            shots = measure_shots(f, average_num, burst)
+            mmr = np.average(shots) #MMD averaged over average_num shots
+            if store:
+                store.append(f, shots)
         
-        #print(str(f) + "," + str(mmr))  # prints the data point we just obtained - excitation signal frequency and the corresponding MMD to the shell.
-        file.write(str(f) + "," + str(mmr) + "\n") # saves the data point into the buffer.
-		# to save the data point into the file and not only into the buffer, we need to flush the file.
-		# We choose to do this every 40 data points (an arbitrary number) and not every one data point
-		# in order to make the program run faster.
-        if(file_flush_counter >= 10): # we flush the file every 40 data points
-            file.flush()  # not only write into buffer also to the file
-            file_flush_counter = 0 # reset the buffer
-        else: # if we didn't reach 40 yet,
-            file_flush_counter += 1 # increase the count by 1
-    file.close() # close the file
+            #print(str(f) + "," + str(mmr))  # prints the data point we just obtained - excitation signal frequency and the corresponding MMD to the shell.
+            file.write(str(f) + "," + str(mmr) + "\n") # saves the data point into the buffer.
+            # to save the data point into the file and not only into the buffer, we need to flush the file.
+            # We choose to do this every 40 data points (an arbitrary number) and not every one data point
+            # in order to make the program run faster.
+            if(file_flush_counter >= 10): # we flush the file every 40 data points
+                file.flush()  # not only write into buffer also to the file
+                file_flush_counter = 0 # reset the buffer
+            else: # if we didn't reach 40 yet,
+                file_flush_counter += 1 # increase the count by 1
+    finally:
+        file.close() # close the file
+        if store:
+            store.close()
+        if event_pacing:
+            devices.disable_event_pacing() #also after an error: the analyzer must not stay in single sweep mode
+    print("scan {}-{} MHz: {:.1f} s, {}".format(freq_min, freq_max, time.perf_counter()-scan_start, devices.pacing_report()))
+
+
+def measure_ring_sweep(averages=None):
+    """
+    Dip depth against ring voltage with the SRS ramp during detection, averaged over
+    averages shots (default: average_num). Returns the voltages and depths (see ringsweep.py).
+    """
+    if averages is None:
+        averages = average_num
+    devices.set_ring_sweep(ring_sweep_range[0], ring_sweep_range[1], ring_sweep_time/1000)    # SRS time in s
+    data = []
+    for ii in range(averages):
+        devices.rearm_ring_sweep() #start voltage, the ramp runs once per arming
+        devices.arm_sweep()
+        trigger_shot()
+        devices.wait_sweep_complete(0.4 + (cycle_time+150)/1000)
+        devices.wait_trigger_done(0)
+        data.append(devices.get_analyzer_data_fast())
+        monitor.feed(data[-1], mmd=mmd(data[-1]))
+    devices.ring_sweep_done()
+    voltages = ringsweep.trace_voltages(len(data[0]), sweep_time, ring_sweep_range[0], ring_sweep_range[1],
+                                        ring_sweep_time, ringsweep.ramp_delay(wait3, ring_sweep_offset))
+    return ringsweep.voltage_curve(np.mean(data, axis=0), voltages)
+
+def axialRingSweep(center_freqs=axial_center_freqs, ccurrent=1.3, averages=None, event_pacing=event_pacing):
+    """
+    Axial frequency against ring voltage with one ring sweep per analyzer center frequency instead of
+    a frequency scan per ring voltage: the dip of the electrons is where their axial frequency equals
+    the center frequency. Writes f,U,depth to a csv file and returns the voltages and the fitted C_2.
+    """
+    start = time.perf_counter()
+    if event_pacing:
+        devices.enable_event_pacing(events=("trigger", "sweep"))
+    devices.set_coil_current(ccurrent)
+    devices.excitation_off() #no excitation: all electrons stay in the trap
+    center = devices.state.get(("analyzer", "center"), (None,))[0]
+    rows = []
+    try:
+        for fc in center_freqs:
+            devices.set_analyzer_center_frequency("{}MHz".format(fc))
+            U, depth = measure_ring_sweep(averages)
+            rows.append((fc,) + ringsweep.dip_voltage(U, depth))
+            print("{} MHz: dip at {:.2f} V ({:.1f} dB)".format(*rows[-1]))
+    finally:
+        if center is not None:
+            devices.set_analyzer_center_frequency(center) #the zero span setup stays valid
+        devices.set_ring_voltage(ring_sweep_range[0])
+        if event_pacing:
+            devices.disable_event_pacing()
+    fname = 'Neumann_Striebel_' + time.strftime("%Y_%m_%d_%H_%M_%S") + "_" + str(ccurrent) + "A_ringsweep.csv"
+    with open(os.path.join(path, fname), "w") as file:
+        for row in rows:
+            file.write(",".join(str(v) for v in row) + "\n")
+    C_2, C_2_err = ringsweep.fit_C2([r[0] for r in rows], [r[1] for r in rows])
+    print("ring sweeps: C_2 = {:.0f} +- {:.0f} 1/m^2 from {} sweeps in {:.1f} s".format(C_2, C_2_err, len(rows), time.perf_counter()-start))
+    return [r[1] for r in rows], C_2
+
+
+def burst_time(averages=None):
+    # time from the trigger until the sweep of the last cycle of a burst is finished
+    if averages is None:
+        averages = average_num
+    return ((averages-1)*cycle_time + load + wait1 + excite + wait2 + rigol + 30 + sweep_time)/1000
+
+
+def scan_filename(freq_min, freq_max, rvolt, ccurrent, excitation_power):
+    return 'Neumann_Striebel_' + time.strftime("%Y_%m_%d_%H_%M_%S") + "_" + str(rvolt) + "V_" + str(ccurrent) + "A_" + str(freq_min) + "-" + str(freq_max) + "MHz_" + str(excitation_power) + "dBm.csv"
+
+
+def open_store(freq_min, freq_max, freq_step, rvolt, ccurrent, excitation_power, **attrs):
+    # new run in the binary store, None if scans are only written to csv files
+    if store_path is None:
+        return None
+    attrs.update(group='Neumann_Striebel', timestamp=time.strftime("%Y_%m_%d_%H_%M_%S"), rvolt=rvolt, ccurrent=ccurrent,
+                 freq_min=freq_min, freq_max=freq_max, freq_step=freq_step, excitation_power=excitation_power,
+                 average_num=average_num, sweep_time=sweep_time, cycle_time=cycle_time)
+    return scanstore.ScanWriter(store_path, attrs, max_shots=max(average_num, 10))
+
+
+def scanFreqPipelined(freq_min, freq_max, freq_step, rvolt, ccurrent, excitation_power, event_pacing=event_pacing):
+    """
+    Same scan as scanFreq (same frequencies, averages and file), but trigger, readout and evaluation run in parallel:
+    - trigger thread: sends the next trigger as soon as the trigger box finished the last cycle. The frequency of
+      the next step is set right after the excitation of the last shot of a step, while the trap is still cycling.
+    - readout thread: reads each trace after its sweep, before the sweep of the next shot starts. The analyzer
+      stays in continuous mode, so the next shot can already be loading while the last sweep is running.
+    - this thread: parses the traces, calculates the MMD, averages and writes the file.
+    The time per shot goes down to about the cycle time (or sweep_time + readout_margin if that is longer).
+    """
+    file = open(os.path.join(path, scan_filename(freq_min, freq_max, rvolt, ccurrent, excitation_power)), "w+")
+    file_flush_counter = 0
+    store = open_store(freq_min, freq_max, freq_step, rvolt, ccurrent, excitation_power, pipelined=True)
+    scan_start = time.perf_counter()
+    if event_pacing:
+        devices.enable_event_pacing(events=("trigger", "generator"))
+    prepare_scan(rvolt, ccurrent, excitation_power, event_pacing=False)
+
+    freqs = np.arange(freq_min, freq_max, freq_step)
+    excite_end = (load + wait1 + excite)/1000   # after the trigger
+    sweep_end = (load + wait1 + excite + wait2 + rigol + 30 + sweep_time + readout_margin)/1000
+    shots = queue.Queue()       # (step, trigger time) of the triggered shots
+    payloads = queue.Queue()    # (step, raw trace, binary) of the read out shots
+    errors = []
+    stop = threading.Event()
+
+    def trigger_loop():
+        try:
+            devices.set_excitation_frequency(freqs[0])
+            last = None
+            for k in range(len(freqs)):
+                for ii in range(average_num):
+                    if last is not None:
+                        # the trigger box has to finish the cycle and the analyzer has to show the last trace long enough
+                        devices.wait_trigger_done(max(last + (cycle_time+trigger_margin)/1000 - time.perf_counter(), 0))
+                        time.sleep(max(last + (sweep_time+readout_margin)/1000 - time.perf_counter(), 0))
+                    if stop.is_set():
+                        return
+                    trigger_shot()
+                    last = time.perf_counter()
+                    shots.put((k, last))
+                    if ii == average_num-1 and k+1 < len(freqs):
+                        # queue the next frequency as soon as the excitation of this shot is over
+                        time.sleep(max(last + excite_end - time.perf_counter(), 0))
+                        devices.set_excitation_frequency(freqs[k+1])
+        except Exception as err:
+            errors.append(err)
+            stop.set()
+        finally:
+            shots.put(None)
+
+    def readout_loop():
+        try:
+            while True:
+                item = shots.get()
+                if item is None:
+                    break
+                k, t = item
+                time.sleep(max(t + sweep_end - time.perf_counter(), 0))
+                binary = devices.binary_trace
+                try:
+                    payloads.put((k, devices.get_trace_payload(binary), binary))
+                except Exception as err:
+                    print("Error at readout ("+str(err)+")")
+                    payloads.put((k, devices.get_analyzer_data_fast(), None))
+        except Exception as err:
+            errors.append(err)
+            stop.set()
+        finally:
+            payloads.put(None)
+
+    threads = [threading.Thread(target=trigger_loop), threading.Thread(target=readout_loop)]
+    for thread in threads:
+        thread.start()
+
+    mmr_av = {}
+    n_shots = 0
+    try:
+        while True:
+            item = payloads.get()
+            if item is None:
+                break
+            k, raw, binary = item
+            n_shots += 1
+            try:
+                data = raw if binary is None else traces.parse_trace(raw, binary)
+            except ValueError as err:
+                # the shot is lost, the step is averaged over the remaining shots
+                print("Could not parse trace ("+str(err)+")")
+                if binary:
+                    devices.binary_trace = False
+                data = None
+            mmr_av.setdefault(k, [])
+            if data is not None:
+                mmr_av[k].append(data)
+            if n_shots == (k+1)*average_num: # last shot of the step
+                shots_k = shot_depths(mmr_av.pop(k), freqs[k])
+                mmr = np.average(shots_k)
+                if store:
+                    store.append(freqs[k], shots_k)
+                file.write(str(freqs[k]) + "," + str(mmr) + "\n")
+                if(file_flush_counter >= 10):
+                    file.flush()
+                    file_flush_counter = 0
+                else:
+                    file_flush_counter += 1
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        file.close()
+        if store:
+            store.close()
+        if event_pacing:
+            devices.disable_event_pacing()
+    if errors:
+        raise errors[0]
+    scan_time = time.perf_counter() - scan_start
+    print("scan {}-{} MHz (pipelined): {:.1f} s, {:.0f} ms per shot, {}".format(
+        freq_min, freq_max, scan_time, scan_time/max(n_shots, 1)*1e3, devices.pacing_report()))
+
+
+def scanFreqAdaptive(freq_min, freq_max, freq_step, rvolt, ccurrent, excitation_power, event_pacing=event_pacing, burst=burst,
+                     coarse_step=coarse_step, predict=True, passes=2):
+    """
+    Adaptive version of scanFreq: scans freq_min to freq_max with coarse_step and coarse_average_num averages,
+    then with freq_step and average_num averages wherever the MMD shows a dip or a steep edge (see adaptive.py).
+    With predict the regions around the trap frequencies expected for ccurrent and rvolt are scanned finely as well.
+    The file has the same format as for scanFreq (f,mmr sorted by frequency), it is rewritten after every pass.
+    """
+    fname = os.path.join(path, scan_filename(freq_min, freq_max, rvolt, ccurrent, excitation_power))
+    scan_start = time.perf_counter()
+
+    def write(freqs, mmrs):
+        with open(fname, "w") as file:
+            for f, mmr in zip(freqs, mmrs):
+                file.write(str(f) + "," + str(mmr) + "\n")
+
+    seeds = adaptive.predicted_windows(ccurrent, rvolt, freq_min, freq_max) if predict else []
+    try:
+        prepare_scan(rvolt, ccurrent, excitation_power, event_pacing, burst)
+        freqs, mmrs, averages = adaptive.adaptive_scan(
+            lambda f, n: measure_frequency(f, n, burst), freq_min, freq_max,
+            coarse_step=coarse_step, fine_step=freq_step, coarse_averages=coarse_average_num,
+            fine_averages=average_num, seeds=seeds, threshold=refine_threshold, passes=passes, callback=write)
+    finally:
+        if event_pacing:
+            devices.disable_event_pacing()
+    store = open_store(freq_min, freq_max, freq_step, rvolt, ccurrent, excitation_power, burst=burst, adaptive=True)
+    if store:
+        # only the averaged MMDs are known here, std and shots stay empty
+        store.extend(freqs, mmrs, np.full(len(freqs), np.nan), np.full(len(freqs), time.time()), [[]]*len(freqs))
+        store.close()
+    n_uniform = len(np.arange(freq_min, freq_max, freq_step))
+    print("scan {}-{} MHz (adaptive): {:.1f} s, {} points with {} shots instead of {} points with {} shots, {}".format(
+        freq_min, freq_max, time.perf_counter()-scan_start, len(freqs), int(np.sum(averages)),
+        n_uniform, n_uniform*average_num, devices.pacing_report()))
 
 
 #============================================
@@ -129,41 +472,76 @@ scanFreq(freq_min,freq_max,freq_step, ring_voltage, ccurent)
 """
 
 
-excitation_powers = [-5,0,5,10]
-coil_currents = [1.1, 1.15, 1.2, 1.25, 1.3]
-ring_voltages = [20,25,30,35,40,45]
+def set_job_state(job):
+    # coil current and ring voltage of a campaign job, set before the settling time of campaign.run
+    devices.set_coil_current(job.ccurrent)
+    devices.set_ring_voltage(job.rvolt)
+
+def devices_job_state():
+    # coil current and ring voltage the devices were set to in this session (None if unknown)
+    current = devices.state.get(("hameg", "current"))
+    voltage = devices.state.get(("srs", "voltage"))
+    if current is None:
+        return None
+    return campaign.Job(float(voltage[0]) if voltage else None, float(current[0]), None, None, None, None)
+
+def measurement():
+    global path, store_path
+    excitation_powers = [-5,0,5,10]
+    coil_currents = [1.1, 1.15, 1.2, 1.25, 1.3]
+    ring_voltages = [20,25,30,35,40,45]
+
+
+    freq_sequences = [(1,10), (30,80), (300,500)]
 
+    freq_step = 0.1
 
-freq_sequences = [(1,10), (30,80), (300,500)]
+    # frequency sweep over 3 excitation powers (1/4)
+    jobs = [campaign.Job(40, 1.3, ep, freq_min, freq_max, freq_step)
+            for ep in excitation_powers for (freq_min, freq_max) in freq_sequences]
 
-freq_step = 0.1
+    # voltage sweep (2/4)
+    jobs += [campaign.Job(rv, 1.3, 10, freq_min, freq_max, freq_step)
+             for rv in ring_voltages for (freq_min, freq_max) in freq_sequences]
 
-# frequency sweep over 3 excitation powers
-print('frequency sweep over excitation power (1/4)')
-for ep in excitation_powers:
-    for (freq_min, freq_max) in freq_sequences:
-        scanFreq(freq_min, freq_max, freq_step, rvolt=40, ccurrent=1.3, excitation_power=ep)
+    # current sweep (3/4)
+    jobs += [campaign.Job(40, cc, 10, freq_min, freq_max, freq_step)
+             for cc in coil_currents for (freq_min, freq_max) in freq_sequences]
 
+    # complete frequence spectrum (4/4)
+    jobs += [campaign.Job(39.5, 1.3, 10, 1, 500, 0.1)]
 
-# voltage sweep
-print('frequency sweep over ring voltage (2/4)')
-for rv in ring_voltages:
-    for (freq_min, freq_max) in freq_sequences:
-        scanFreq(freq_min, freq_max, freq_step, rvolt=rv, ccurrent=1.3, excitation_power=10)
+    # the jobs run in an order with few coil current changes, after a crash
+    # the script continues with the unfinished jobs in the old directory
+    resumed = campaign.resume_path(journal_file, path, jobs)
+    if resumed != path:
+        if not os.listdir(path):
+            os.rmdir(path)
+        path = resumed
+        store_path = os.path.join(path, 'scans.store') if store_path is not None else None
+    if instrumentation:
+        instrument.enable(devices, traces, sys.modules[__name__])
+    try:
+        if ring_sweep_detection:
+            # axial frequency against ring voltage (and C_2) from a few ring sweeps
+            axialRingSweep()
+        campaign.run(jobs, scanFreq, path, journal_file, prepare=set_job_state, start=devices_job_state())
+    finally:
+        monitor.stop() #closes the plot process and the shared memory ring buffer, also after an error
+    if instrumentation:
+        instrument.disable()
+        instrument.write_trace(os.path.join(path, timeline_file))
+        print(instrument.summary())
 
-# current sweep
-print('frequency sweep over coil currents (3/4)')
-for cc in coil_currents:
-    for (freq_min, freq_max) in freq_sequences:
-        scanFreq(freq_min, freq_max, freq_step, rvolt=40, ccurrent=cc, excitation_power=10)
 
-print('complete frequence spectrum (4/4)')
-scanFreq(1, 500, 0.1, rvolt=39.5, ccurrent=1.3, excitation_power=10)
+    del devices.hf_gen
+    del devices.analyzer
 
+    print('finished')
+    print(devices.command_report()) # transfers per device during the campaign
+    #Reset coil current to let the coil cool down
+    devices.set_coil_current(0.05)
 
-del devices.hf_gen
-del devices.analyzer
 
-print('finished')
-#Reset coil current to let the coil cool down
-devices.set_coil_current(0.05)
+if __name__ == "__main__": # the scan function can also be imported, e.g. by the benchmarks
+    measurement()
@@ -1,4 +1,6 @@
 import devices
+import monitor
+import dip
 import time
 
 ## define and set times for measurement cycle
@@ -17,48 +19,70 @@ detect = 50
 # can be shifted independently to later times after the detection (RAMP) 
 # with wait3, thats why the total cycle time is defined like this:
 cycle_time = load + wait1 + excite + wait2 + rigol + wait3 + detect
+
+# show the traces and their MMD live (see monitor.py)
+live_monitor = False
      
-devices.set_time('load', load)
-devices.set_time('wait1', wait1)
-devices.set_time('excite', excite)
-devices.set_time('wait2', wait2)
-devices.set_time('rigol', rigol),
-
-devices.set_time('wait3', wait3)
-devices.set_time('detect', detect)
-
-## set magnetic field
-devices.set_coil_current(1.3) # maximum current: 1.3 A
-
-
-## set ring voltage
-# The sweeping will be done by switching to 15 V with a capacitance
-# connected to use the discharge of the C as a method of ramping.
-# The ramp is not linear and you can check the voltage value at
-# data taking time using an osci probe connected to Vring in the
-# detection system box.
-# This voltage here defines the ring voltage before the ramp, so
-# also during excitation. But reducing it, will also change the
-# voltage and axial frequency your ion has during detection.
-devices.set_ring_voltage(39.5)
-
-
-## Initialize the RIGOL spectrum analyzer for measurement
-# Trigger and some other settings are hard code in the routine, but
-# some values you might want to adjust during a scan can be given as
-# an argument. Check the definition of this function for more information.
-#devices.set_analyzer_to_zero_span()
-devices.set_analyzer_to_zero_span(center_freq="57.3MHz", ref_level = "-15.5", 
-                              PDIV_scale = "5.0", sweep_time="250ms")
-
-# just give the RIGOL some time to understand its commands.
-time.sleep(1)
-
-# continuously load, excite, and measure:
-
-
-while True: 
-     devices.send_trigger()
-     time.sleep((cycle_time+200)/1000)
-     time.sleep(0.5)
-     print('.', end='')
+
+
+def setup():
+    devices.set_time('load', load)
+    devices.set_time('wait1', wait1)
+    devices.set_time('excite', excite)
+    devices.set_time('wait2', wait2)
+    devices.set_time('rigol', rigol),
+
+    devices.set_time('wait3', wait3)
+    devices.set_time('detect', detect)
+
+    ## set magnetic field
+    devices.set_coil_current(1.3) # maximum current: 1.3 A
+
+
+    ## set ring voltage
+    # The sweeping will be done by switching to 15 V with a capacitance
+    # connected to use the discharge of the C as a method of ramping.
+    # The ramp is not linear and you can check the voltage value at
+    # data taking time using an osci probe connected to Vring in the
+    # detection system box.
+    # This voltage here defines the ring voltage before the ramp, so
+    # also during excitation. But reducing it, will also change the
+    # voltage and axial frequency your ion has during detection.
+    devices.set_ring_voltage(39.5)
+
+
+    ## Initialize the RIGOL spectrum analyzer for measurement
+    # Trigger and some other settings are hard code in the routine, but
+    # some values you might want to adjust during a scan can be given as
+    # an argument. Check the definition of this function for more information.
+    #devices.set_analyzer_to_zero_span()
+    devices.set_analyzer_to_zero_span(center_freq="57.3MHz", ref_level = "-15.5", 
+                                  PDIV_scale = "5.0", sweep_time="250ms")
+
+    # just give the RIGOL some time to understand its commands.
+    time.sleep(1)
+
+
+def run(shots=None, live=False):
+    # continuously load, excite, and measure (shots=None: until interrupted)
+    # live: read every trace and show it with its MMD in the live monitor (monitor.py)
+    if live:
+        monitor.start()
+    n = 0
+    while shots is None or n < shots:
+         devices.trigger_shot()
+         time.sleep((cycle_time+200)/1000)
+         if live:
+             data = devices.get_analyzer_data_fast()
+             depth = dip.mmd(data)   # MMD like in MeasurementScript.py
+             monitor.feed(data, mmd=depth)
+             print('{:.2f} '.format(depth), end='')
+         else:
+             print('.', end='')
+         time.sleep(0.5)
+         n += 1
+
+
+if __name__ == "__main__": # setup() and run() can also be imported, e.g. by the benchmarks
+    setup()
+    run(live=live_monitor)
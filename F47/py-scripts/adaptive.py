@@ -0,0 +1,127 @@
+import numpy as np
+from scipy.ndimage import median_filter
+
+import trap
+
+# Planning of adaptive frequency scans: a coarse scan over the full range,
+# then finer steps with more averages only where the MMD shows a dip or a
+# steep edge (and optionally around the frequencies expected from B and V_0).
+# The measurement itself is done by a function measure(f, averages) -> MMD,
+# see scanFreqAdaptive in MeasurementScript.py.
+
+
+def merge_windows(windows, gap=0.0):
+    """Merges (f_min, f_max) windows that overlap or are at most gap apart."""
+    merged = []
+    for lo, hi in sorted(windows):
+        if merged and lo <= merged[-1][1] + gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def noise_level(mmd):
+    # robust estimate of the point-to-point noise (MAD of the differences)
+    diff = np.diff(mmd)
+    if len(diff) == 0:
+        return 0.0
+    return 1.4826 * np.median(np.abs(diff - np.median(diff))) / np.sqrt(2)
+
+
+def refine_windows(freqs, mmd, threshold=4.0, baseline_points=21, reference=None):
+    """
+    Windows that need a finer scan: around every point that lies threshold noise
+    levels below the running median (dip), or that differs by more than threshold
+    noise levels from its neighbour (edge). The window of a point reaches to its
+    neighbours, so further passes extend a window until the dip is covered.
+    reference=(freqs, mmd) of the coarse scan: baseline and noise are taken from
+    these points, so densely refined regions do not pull the running median down.
+    """
+    order = np.argsort(freqs)
+    freqs = np.asarray(freqs, dtype=float)[order]
+    mmd = np.asarray(mmd, dtype=float)[order]
+    if len(freqs) < 3:
+        return []
+    ref_freqs, ref_mmd = (freqs, mmd) if reference is None else map(np.asarray, reference)
+    noise = max(noise_level(ref_mmd), 1e-12)
+    baseline = median_filter(ref_mmd, size=min(baseline_points, len(ref_mmd)), mode='nearest')
+    baseline = np.interp(freqs, ref_freqs, baseline)
+    selected = baseline - mmd > threshold*noise
+    edge = np.abs(np.diff(mmd)) > threshold*noise*np.sqrt(2)
+    selected[:-1] |= edge
+    selected[1:] |= edge
+    idx = np.nonzero(selected)[0]
+    lower = freqs[np.maximum(idx-1, 0)]
+    upper = freqs[np.minimum(idx+1, len(freqs)-1)]
+    return merge_windows(zip(lower, upper))
+
+
+def predicted_windows(current, voltage, freq_min, freq_max, width=3.0, C_2=trap.C_2):
+    """Windows of +-width MHz around the expected trap frequencies inside the scan range."""
+    windows = []
+    for f in trap.trap_frequencies(current, voltage, C_2).values():
+        lo, hi = max(f - width, freq_min), min(f + width, freq_max)
+        if lo < hi:
+            windows.append((lo, hi))
+    return merge_windows(windows)
+
+
+def grid(freq_min, freq_max, step, aligned=False):
+    # same frequencies as np.arange in scanFreq, rounded to get rid of float noise.
+    # aligned grids start at a multiple of step, so windows share their points
+    if aligned:
+        freq_min = np.ceil(freq_min/step - 1e-9) * step
+    return np.round(np.arange(freq_min, freq_max, step), 6)
+
+
+def adaptive_scan(measure, freq_min, freq_max, coarse_step=1.0, fine_step=0.1,
+                  coarse_averages=2, fine_averages=5, seeds=(), threshold=4.0,
+                  passes=2, callback=None):
+    """
+    Coarse scan from freq_min to freq_max, then up to passes refinement passes with
+    fine_step and fine_averages inside the windows found by refine_windows (and the
+    seed windows in the first pass). Points are only measured again if they had
+    fewer averages.
+    measure(f, averages) returns the MMD, callback(freqs, mmd) is called after every
+    pass. Returns the sorted frequencies, MMDs and the number of averages per point.
+    """
+    points = {}     # f -> (mmd, averages)
+
+    def run(freqs, averages):
+        n = 0
+        for f in freqs:
+            if f in points and points[f][1] >= averages:
+                continue
+            points[f] = (measure(f, averages), averages)
+            n += 1
+        return n
+
+    def result():
+        freqs = np.array(sorted(points))
+        mmd = np.array([points[f][0] for f in freqs])
+        averages = np.array([points[f][1] for f in freqs])
+        return freqs, mmd, averages
+
+    coarse = grid(freq_min, freq_max, coarse_step)
+    run(coarse, coarse_averages)
+    if callback:
+        callback(*result()[:2])
+
+    windows = list(seeds)
+    for i in range(passes):
+        freqs, mmd, averages = result()
+        reference = (coarse, np.array([points[f][0] for f in coarse]))
+        # windows less than two coarse steps apart are joined, otherwise the
+        # flank between two close dips stays at the coarse resolution
+        windows = merge_windows(windows + refine_windows(freqs, mmd, threshold, reference=reference), gap=2*coarse_step)
+        fine = [grid(lo, hi + fine_step/2, fine_step, aligned=True) for lo, hi in windows]
+        fine = np.unique(np.concatenate(fine)) if fine else np.array([])
+        fine = fine[(fine >= freq_min) & (fine < freq_max)]
+        if run(fine, fine_averages) == 0:
+            break
+        if callback:
+            callback(*result()[:2])
+        windows = []
+
+    return result()
@@ -0,0 +1,88 @@
+#---Benchmark of the adaptive frequency scan-------------------------------
+# Compares the uniform scan of scanFreq (freq_step, average_num averages) with
+# the adaptive scan (adaptive.py) on a simulated MMD spectrum with dips at the
+# trap frequencies. Reports the number of measured points/shots and the error
+# of the peak positions fitted like in fit_peak of F47_Auswertung.ipynb.
+import numpy as np
+from scipy.optimize import curve_fit
+
+import adaptive
+import trap
+
+#---Settings------------------------------------------------
+freq_min, freq_max, freq_step = 1, 500, 0.1
+coarse_step = 1.0
+average_num = 5
+coarse_average_num = 2
+current, voltage = 1.3, 40
+shot_noise = 1.5        # noise of the MMD of a single shot
+seed = 1
+#-----------------------------------------------------------
+
+# the simulated trap deviates a bit from the formulas used for the prediction
+true = trap.trap_frequencies(current*1.01, voltage, C_2=trap.C_2*1.05)
+peaks = [  # (name, f, width, depth)
+    ('magnetron', true['minus'], 0.4, 8),
+    ('axial', true['z'], 2.0, 10),
+    ('modified', true['plus'], 2.0, 10),
+    ('cyclotron', true['c'], 1.5, 8),
+]
+
+
+def C_PI(x, a, b, c, y, n=1):
+    return c*np.exp(-np.power((x-a)/b, 2*n)) + y
+
+
+def spectrum(f):
+    return 20 + sum(C_PI(f, f0, width, -depth, 0) for name, f0, width, depth in peaks)
+
+
+class Simulation:
+    def __init__(self):
+        self.rng = np.random.default_rng(seed)
+        self.shots = 0
+
+    def measure(self, f, averages):
+        self.shots += averages
+        return spectrum(f) + self.rng.normal(0, shot_noise, averages).mean()
+
+
+def fit_peaks(freqs, mmd):
+    errors = []
+    for name, f0, width, depth in peaks:
+        # +-1.5 widths, so the tail of the close modified cyclotron peak stays out
+        window = (freqs > f0 - 1.5*width) & (freqs < f0 + 1.5*width)
+        x, y = freqs[window], mmd[window]
+        try:
+            guess = [x[np.argmin(y)], width, np.min(y) - np.median(y), np.median(y)]
+            popt, pcov = curve_fit(C_PI, x, y, p0=guess, maxfev=10000)
+            errors.append(abs(popt[0] - f0))
+        except (RuntimeError, ValueError, TypeError):
+            errors.append(np.nan)
+    return errors
+
+
+def report(name, freqs, mmd, shots):
+    errors = fit_peaks(freqs, mmd)
+    print('{:<22}{:>7}{:>8}  '.format(name, len(freqs), shots) +
+          ''.join('{:>11.3f}'.format(err) for err in errors))
+
+
+if __name__ == '__main__':
+    print('{:<22}{:>7}{:>8}  '.format('scan', 'points', 'shots') +
+          ''.join('{:>11}'.format(p[0]) for p in peaks))
+    print('{:<39}'.format('true frequency [MHz]') + ''.join('{:>11.2f}'.format(p[1]) for p in peaks))
+    print('peak position error [MHz]:')
+
+    sim = Simulation()
+    freqs = np.arange(freq_min, freq_max, freq_step)
+    mmd = np.array([sim.measure(f, average_num) for f in freqs])
+    report('uniform', freqs, mmd, sim.shots)
+
+    for predict in (False, True):
+        sim = Simulation()
+        seeds = adaptive.predicted_windows(current, voltage, freq_min, freq_max) if predict else []
+        freqs, mmd, averages = adaptive.adaptive_scan(
+            sim.measure, freq_min, freq_max, coarse_step=coarse_step, fine_step=freq_step,
+            coarse_averages=coarse_average_num, fine_averages=average_num, seeds=seeds)
+        report('adaptive' + (' + prediction' if predict else ''), freqs, mmd, sim.shots)
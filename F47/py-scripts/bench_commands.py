@@ -0,0 +1,60 @@
+#---Instrument round trips of a measurement campaign----------------------
+# Runs a short version of the campaign in MeasurementScript.measurement()
+# (same loops over excitation power, ring voltage and coil current, but only
+# two frequency steps per range) against the simulated devices, once with
+# every setting sent (devices.state_cache = False, the old behaviour) and once
+# with the state cache and the batched analyzer setup. Prints the transfers
+# per device from devices.command_report().
+import os
+import sys
+import time
+import tempfile
+
+os.environ['F47_BACKEND'] = 'sim'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())    # MeasurementScript creates its data directory here
+
+#---Settings------------------------------------------------
+excitation_powers = [-5, 0, 5, 10]
+ring_voltages = [20, 25, 30, 35, 40, 45]
+coil_currents = [1.1, 1.15, 1.2, 1.25, 1.3]
+freq_sequences = [(1, 1.2), (30, 30.2), (300, 300.2)]
+freq_step = 0.1
+average_num = 1
+#-----------------------------------------------------------
+
+import devices
+import MeasurementScript as ms
+
+ms.average_num = average_num
+
+
+def campaign():
+    devices.set_analyzer_to_zero_span(center_freq="57.3MHz", ref_level = "-15.5",
+                                      PDIV_scale = "5.0", sweep_time="{}ms".format(ms.sweep_time))
+    scans = [(40, 1.3, ep) for ep in excitation_powers]
+    scans += [(rv, 1.3, 10) for rv in ring_voltages]
+    scans += [(40, cc, 10) for cc in coil_currents]
+    for rvolt, ccurrent, excitation_power in scans:
+        for freq_min, freq_max in freq_sequences:
+            ms.scanFreq(freq_min, freq_max, freq_step, rvolt=rvolt, ccurrent=ccurrent,
+                        excitation_power=excitation_power)
+
+
+results = []
+for cache in (False, True):
+    devices.state_cache = cache
+    devices.invalidate()
+    devices.command_report()    # reset
+    start = time.perf_counter()
+    campaign()
+    dt = time.perf_counter() - start
+    stats = {name: dict(s) for name, s in devices.command_stats.items()}
+    results.append((cache, dt, stats, devices.command_report()))
+
+print('')
+for cache, dt, stats, report in results:
+    transfers = sum(s['writes'] + s['queries'] for s in stats.values())
+    print('state cache {}: {} transfers, {:.1f} s in transfers, campaign {:.1f} s'.format(
+        'on' if cache else 'off', transfers, sum(s['time'] for s in stats.values()), dt))
+    print(report)
@@ -0,0 +1,56 @@
+#---Dip depth of trace batches: speed and robustness-------------------
+# Synthetic zero-span traces like the ones of the simulated analyzer
+# (601 points, Gaussian dip, white noise), a fraction of them with a single
+# spike sample. Compares the per-shot loops of the scripts with dip.depths on
+# the whole batch and shows bias and spread of the dip methods with and
+# without outlier rejection.
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import dip
+
+#---Settings------------------------------------------------
+shots = 10000
+depth = 15.0        # dB
+noise = 0.3         # dB
+spikes = 0.02       # fraction of the shots with a spike
+spike = -10.0       # dB
+batch = 10          # shots per step in the scripts
+#-----------------------------------------------------------
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 1, 601)
+    clean = -40 - depth*np.exp(-((x-0.45)/0.04)**2)
+    data = clean + rng.normal(0, noise, (shots, len(x)))
+    spiked = rng.random(shots) < spikes
+    data[spiked, rng.integers(50, 550, np.sum(spiked))] += spike
+
+    traces = [list(row) for row in data]    # the scripts get lists from the analyzer
+    start = time.perf_counter()
+    loop = [np.average(t[0:10]) - np.min(t[1:]) for t in traces]
+    t_loop = (time.perf_counter() - start) / shots
+    start = time.perf_counter()
+    for i in range(0, shots, batch):
+        dip.depths(traces[i:i+batch])
+    t_batch = (time.perf_counter() - start) / shots
+    start = time.perf_counter()
+    values = dip.depths(data)
+    t_all = (time.perf_counter() - start) / shots
+    assert np.allclose(values, loop)
+    print('legacy MMD: loop {:.1f} us/trace, batches of {} {:.1f} us/trace, one batch {:.2f} us/trace'.format(
+        t_loop*1e6, batch, t_batch*1e6, t_all*1e6))
+
+    print('{:<10} {:>8} {:>8} {:>14} {:>8}'.format('method', 'bias', 'std', 'bias (reject)', 'std'))
+    for method in ('legacy', 'lifetime', 'smoothed', 'matched'):
+        values = dip.depths(data, method)
+        steps = values.reshape(-1, batch)
+        kept = [dip.measure(data[i:i+batch], method, reject=True) for i in range(0, shots, batch)]
+        means = np.array([r.mean for r in kept])
+        print('{:<10} {:8.3f} {:8.3f} {:14.3f} {:8.3f}'.format(
+            method, np.mean(values) - depth, np.std(steps.mean(axis=1)), np.mean(means) - depth, np.std(means)))
@@ -0,0 +1,63 @@
+#---Instrumentation of a scan on the simulated setup-------------------
+# Runs scanFreq (MeasurementScript.py) on the simulated devices without and
+# with instrument.enable(devices, traces, MeasurementScript), prints the
+# overhead per span and the summary table and writes the timeline to
+# timeline.json in the temporary directory.
+import os
+import sys
+import time
+import json
+import tempfile
+
+os.environ['F47_BACKEND'] = 'sim'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())
+
+#---Settings------------------------------------------------
+freq_min, freq_max, freq_step = 60, 61, 0.2
+average_num = 5
+spans = 100000      # for the overhead per span
+#-----------------------------------------------------------
+
+
+import devices
+import traces
+import instrument
+import MeasurementScript as ms
+
+ms.average_num = average_num
+
+
+def scan():
+    start = time.perf_counter()
+    ms.scanFreq(freq_min, freq_max, freq_step, rvolt=40, ccurrent=1.3, excitation_power=10)
+    return time.perf_counter() - start
+
+
+def span_overhead():
+    start = time.perf_counter()
+    for i in range(spans):
+        with instrument.span('x'):
+            pass
+    return (time.perf_counter() - start) / spans
+
+
+if __name__ == '__main__':
+    t_disabled = span_overhead()
+    t_plain = scan()
+
+    instrument.enable(devices, traces, ms)
+    t_instrumented = scan()
+    n_events = len(instrument.events)
+    t_enabled = span_overhead()
+    instrument.disable()
+    del instrument.events[n_events:]    # only the scan in the timeline
+    instrument.stats.pop(('host', 'x'))
+
+    print(instrument.summary())
+    instrument.write_trace('timeline.json')
+    with open('timeline.json') as file:
+        n_trace = len(json.load(file)['traceEvents'])
+    print('scan: {:.1f} s without, {:.1f} s with instrumentation ({} spans, timeline {} with {} events)'.format(
+        t_plain, t_instrumented, n_events, os.path.abspath('timeline.json'), n_trace))
+    print('span: {:.2f} us disabled, {:.2f} us enabled'.format(t_disabled*1e6, t_enabled*1e6))
@@ -0,0 +1,59 @@
+#---Beam time of the lifetime measurement: fixed grid vs. online mode-----
+# Replaces the shots of Lifetime.py by a synthetic decay with the parameters
+# of the lab data (lifetime_Neumann_Striebel.txt) and compares the fixed grid
+# of measure_lifetime() with measure_lifetime_online(): shots, beam time and
+# the spread of tau over several repetitions (grid: fit of the file like in
+# Lifetime_Analysis.py, online: the fit at the end of the online mode).
+import os
+import sys
+import tempfile
+
+os.environ['F47_BACKEND'] = 'sim'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())
+
+import numpy as np
+
+#---Settings------------------------------------------------
+N0, tau, off = 300, 60, 0.7     # decay in the time axis of the file (wait)
+shot_noise = 1.2                # std of the MMD of a single shot
+repeats = 20
+seed = 1
+#-----------------------------------------------------------
+
+import Lifetime
+import lifetimefit
+
+rng = np.random.default_rng(seed)
+beam = {'shots': 0, 'time': 0.0}
+
+def synthetic_point(wait2, averages):
+    beam['shots'] += averages
+    beam['time'] += averages*Lifetime.shot_time(wait2)
+    mmd = lifetimefit.fit_func(Lifetime.wait_time(wait2), N0, tau, off)
+    return list(mmd + rng.normal(0, shot_noise, averages))
+Lifetime.measure_point = synthetic_point
+
+def fit_file(fname):
+    wait, avg, std = np.genfromtxt(fname, delimiter=',', unpack=True)
+    popt, pcov = lifetimefit.fit(wait, avg, std, np.ones_like(wait))   # like Lifetime_Analysis.py
+    return popt[1]
+
+
+def run(name, func):
+    taus, shots, times = [], [], []
+    for i in range(repeats):
+        beam.update(shots=0, time=0.0)
+        result = func()     # online: (popt, pcov)
+        taus.append(fit_file('lifetime.txt') if result is None else result[0][1])
+        shots.append(beam['shots'])
+        times.append(beam['time'])
+    taus = np.array(taus)
+    print('{:<10}{:>8.0f}{:>14.1f}{:>12.2f}{:>12.2f}'.format(
+        name, np.mean(shots), np.mean(times)/60, np.mean(taus), np.std(taus)))
+
+
+if __name__ == '__main__':
+    print('{:<10}{:>8}{:>14}{:>12}{:>12}'.format('mode', 'shots', 'beam [min]', 'tau [ms]', 'std tau'))
+    run('grid', lambda: Lifetime.measure_lifetime(fname='lifetime.txt'))
+    run('online', lambda: Lifetime.measure_lifetime_online(fname='lifetime.txt'))
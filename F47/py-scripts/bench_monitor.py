@@ -0,0 +1,56 @@
+#---Overhead of the live monitor on the acquisition-------------------
+# Runs the same scanFreq on the simulated setup without and with the live
+# monitor (plot process attached, drawing without a window) and measures the
+# time per shot, then pushes traces into the ring buffer as fast as possible
+# to get the time of monitor.feed() alone. The plot process is detached and
+# attached again during the second scan.
+import os
+import sys
+import time
+import tempfile
+
+os.environ['F47_BACKEND'] = 'sim'
+os.environ['MPLBACKEND'] = 'Agg'    # also for the plot process, no window
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())
+
+#---Settings------------------------------------------------
+freq_min, freq_max, freq_step = 60, 61, 0.2
+average_num = 5
+pushes = 20000
+#-----------------------------------------------------------
+
+import numpy as np
+
+import monitor
+import MeasurementScript as ms
+
+ms.average_num = average_num
+
+
+def scan():
+    start = time.perf_counter()
+    ms.scanFreq(freq_min, freq_max, freq_step, rvolt=40, ccurrent=1.3, excitation_power=10)
+    return (time.perf_counter() - start) / (len(np.arange(freq_min, freq_max, freq_step))*average_num)
+
+
+if __name__ == '__main__':
+    t_plain = scan()
+
+    mon = monitor.start(plot=True)
+    t_monitor = scan()
+    mon.detach()
+    mon.attach()
+    time.sleep(1)
+
+    trace = np.random.default_rng(0).normal(20, 1, monitor.trace_length)
+    start = time.perf_counter()
+    for i in range(pushes):
+        monitor.feed(trace, 60.0, 5.0)
+    t_feed = (time.perf_counter() - start) / pushes
+    alive = mon.process.poll() is None
+    monitor.stop()
+
+    print('scanFreq: {:.1f} ms per shot without, {:.1f} ms with the live monitor'.format(t_plain*1e3, t_monitor*1e3))
+    print('monitor.feed: {:.1f} us per trace of {} points, plot process {} after detach/attach'.format(
+        t_feed*1e6, monitor.trace_length, 'running' if alive else 'NOT running'))
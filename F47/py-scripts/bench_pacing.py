@@ -0,0 +1,53 @@
+#---Time per shot of the scan modes of scanFreq---------------------------
+# Runs the same short frequency scan with the fixed sleeps, with the event
+# driven pacing, pipelined and with hardware looped averaging (burst) against
+# the simulated devices (sim_devices.py) and reports the time per scan and per
+# shot.
+import os
+import sys
+import time
+import tempfile
+
+os.environ['F47_BACKEND'] = 'sim'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())    # MeasurementScript creates its data directory here
+
+#---Settings------------------------------------------------
+freq_min, freq_max, freq_step = 60, 60.6, 0.2
+average_num = 5
+#-----------------------------------------------------------
+
+import sim_devices
+import MeasurementScript as ms
+
+# count the commands sent to the simulated trigger box and analyzer
+commands = {}
+_write = sim_devices.Connection._write
+def counting_write(self, cmd, *args):
+    name = type(self.device).__name__
+    commands[name] = commands.get(name, 0) + 1
+    return _write(self, cmd, *args)
+sim_devices.Connection._write = counting_write
+
+ms.average_num = average_num
+shots = len(ms.np.arange(freq_min, freq_max, freq_step)) * average_num
+
+modes = [
+    ('fixed sleeps', dict(event_pacing=False, pipelined=False)),
+    ('event pacing', dict(event_pacing=True, pipelined=False)),
+    ('pipelined', dict(event_pacing=True, pipelined=True)),
+    ('burst', dict(event_pacing=True, burst=True)),
+]
+results = []
+for name, kwargs in modes:
+    commands.clear()
+    start = time.perf_counter()
+    ms.scanFreq(freq_min, freq_max, freq_step, rvolt=40, ccurrent=1.3, excitation_power=10, **kwargs)
+    results.append((name, time.perf_counter() - start, commands.get('Trigger', 0), commands.get('Analyzer', 0)))
+
+fixed = results[0][1]
+print('')
+print('{} shots per scan, cycle time {} ms'.format(shots, ms.cycle_time))
+for name, dt, n_trigger, n_analyzer in results:
+    print('{:<14}{:6.1f} s per scan, {:5.0f} ms per shot, saved {:5.1f} s ({:3.0f} %), {:3d} trigger / {:3d} analyzer commands'.format(
+        name, dt, dt/shots*1e3, fixed-dt, (fixed-dt)/fixed*100, n_trigger, n_analyzer))
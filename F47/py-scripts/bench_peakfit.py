@@ -0,0 +1,120 @@
+#---Benchmark of the resonance fits of the F47 campaign-------------------
+# Fits the 51 windows of F47_Auswertung.ipynb (same stacks, index windows and
+# exponents n) once like fit_peak in the notebook (one curve_fit per call with
+# the hand-picked guesses, numerical derivatives, maxfev=1000000) and once
+# with peakfit.fit_peaks (guesses from the data, analytic Jacobian, process
+# pool). Prints the time of both and the largest difference of the fitted
+# frequencies.
+import os
+import time
+import numpy as np
+from scipy.optimize import curve_fit
+
+import peakfit
+
+#---Settings------------------------------------------------
+data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+repeats = 3
+processes = None    # None: one per CPU
+#-----------------------------------------------------------
+
+# (stack, start, stop, n, guess of the notebook, I, U, P_e) in the order of the notebook
+windows = [
+    ('ep', -5, 0, 90, 2, [6.28,0.15,-17,22], 1.3, 40, -5),
+    ('ep', 0, 38, 62, 1, [6.28,0.15,-17,22], 1.3, 40, 0),
+    ('ep', -5, 370, 480, 1, [62,3,-17,22], 1.3, 40, -5),
+    ('ep', 0, 360, 480, 1, [62,3,-17,22], 1.3, 40, 0),
+    ('ep', -5, 480, 530, 1, [71,3,-17,22], 1.3, 40, -5),
+    ('ep', 0, 450, 550, 1, [71,3,-17,22], 1.3, 40, 0),
+    ('ep', -5, 1900, 2000, 1, [435,3,-17,22], 1.3, 40, -5),
+    ('ep', 10, 1900, 2000, 1, [435,3,-17,22], 1.3, 40, 10),
+    ('ep', -5, 2020, 2080, 1, [445,3,-17,22], 1.3, 40, -5),
+    ('ep', 10, 2000, 2100, 1, [445,3,-17,22], 1.3, 40, 10),
+    ('U', 30, 30, 50, 3, [4.7,1,-17,22], 1.3, 30, 10),
+    ('U', 35, 35, 55, 2, [4.7,1,-17,22], 1.3, 35, 10),
+    ('U', 40, 40, 60, 2, [6.1,1,-17,22], 1.3, 40, 10),
+    ('U', 45, 50, 70, 2, [6.1,1,-17,22], 1.3, 45, 10),
+    ('U', 30, 150, 550, 2, [60,5,-10,12], 1.3, 30, 10),
+    ('U', 35, 250, 550, 2, [60,5,-10,12], 1.3, 35, 10),
+    ('U', 40, 300, 550, 2, [65,2,-5,5], 1.3, 40, 10),
+    ('U', 45, 350, 520, 2, [70,2,-5,5], 1.3, 45, 10),
+    ('U', 30, 1900, 2040, 1, [440,5,-10,12], 1.3, 30, 10),
+    ('U', 30, 2025, 2090, 1, [440,5,-10,12], 1.3, 30, 10),
+    ('U', 35, 1900, 2040, 1, [440,5,-10,12], 1.3, 35, 10),
+    ('U', 35, 2000, 2090, 1, [440,5,-10,12], 1.3, 35, 10),
+    ('U', 40, 1900, 2000, 1, [440,5,-10,12], 1.3, 40, 10),
+    ('U', 40, 2000, 2090, 1, [440,5,-10,12], 1.3, 40, 10),
+    ('U', 45, 1900, 2000, 1, [440,5,-10,12], 1.3, 45, 10),
+    ('U', 45, 2000, 2090, 1, [440,5,-10,12], 1.3, 45, 10),
+    ('I', 1.1, 60, 80, 2, [7.3,1,-5,5], 1.1, 40, 10),
+    ('I', 1.15, 56, 75, 2, [7.3,1,-5,5], 1.15, 40, 10),
+    ('I', 1.2, 50, 73, 2, [7.3,1,-5,5], 1.2, 40, 10),
+    ('I', 1.25, 50, 65, 2, [7.3,1,-5,5], 1.25, 40, 10),
+    ('I', 1.3, 45, 60, 2, [7.3,1,-5,5], 1.3, 40, 10),
+    ('I', 1.1, 400, 470, 2, [65,5,-7,7], 1.1, 40, 10),
+    ('I', 1.1, 450, 550, 1, [65,5,-7,7], 1.1, 40, 10),
+    ('I', 1.15, 400, 470, 2, [65,5,-7,7], 1.15, 40, 10),
+    ('I', 1.15, 460, 550, 1, [65,5,-7,7], 1.15, 40, 10),
+    ('I', 1.2, 400, 470, 2, [65,5,-7,7], 1.2, 40, 10),
+    ('I', 1.2, 455, 550, 1, [65,5,-7,7], 1.2, 40, 10),
+    ('I', 1.25, 430, 470, 2, [65,5,-7,7], 1.25, 40, 10),
+    ('I', 1.25, 455, 540, 1, [65,5,-7,7], 1.25, 40, 10),
+    ('I', 1.3, 400, 470, 1, [65,5,-7,7], 1.3, 40, 10),
+    ('I', 1.3, 465, 550, 1, [65,5,-7,7], 1.3, 40, 10),
+    ('I', 1.1, 1100, 1310, 1, [370,5,-8,8], 1.1, 40, 10),
+    ('I', 1.1, 1280, 1500, 1, [370,5,-8,8], 1.1, 40, 10),
+    ('I', 1.15, 1340, 1480, 1, [385,5,-8,8], 1.15, 40, 10),
+    ('I', 1.15, 1470, 1550, 1, [385,5,-8,8], 1.15, 40, 10),
+    ('I', 1.2, 1350, 1650, 1, [400,5,-8,8], 1.2, 40, 10),
+    ('I', 1.2, 1650, 1800, 1, [400,5,-8,8], 1.2, 40, 10),
+    ('I', 1.25, 1700, 1820, 1, [420,5,-8,8], 1.25, 40, 10),
+    ('I', 1.25, 1820, 1900, 1, [430,5,-8,8], 1.25, 40, 10),
+    ('I', 1.3, 1930, 2000, 1, [440,5,-8,8], 1.3, 40, 10),
+    ('I', 1.3, 2000, 2100, 1, [440,5,-8,8], 1.3, 40, 10),
+]
+
+
+def load_stacks():
+    # the three frequency ranges of every setting concatenated, like in the notebook
+    files = sorted(f for f in os.listdir(data_path) if f.split('.')[-1] == 'csv')
+    data = {f: np.genfromtxt(os.path.join(data_path, f), delimiter=',', unpack=True) for f in files}
+    stack = lambda names: np.concatenate([data[f] for f in names], axis=1)
+    return {
+        'ep': {ep: stack([f for f in files[0:12] if f.split('_')[-1] == '{}dBm.csv'.format(ep)]) for ep in (-5, 0, 5, 10)},
+        'U': {U: stack([f for f in files[12:30] if f.split('_')[-4] == '{}V'.format(U)]) for U in (20, 25, 30, 35, 40, 45)},
+        'I': {I: stack([f for f in files[30:45] if f.split('_')[-3] == '{}A'.format(I)]) for I in (1.1, 1.15, 1.2, 1.25, 1.3)},
+    }
+
+
+def notebook_fit(data, indices, guess, n):
+    # fit_peak of the notebook without the plot
+    x = data[0][indices[0]: indices[1]]
+    y = data[1][indices[0]: indices[1]]
+
+    def cpi(x,a,b,c,y):
+        return c*np.exp(-np.power((x-a)/b,2*n)) + y
+
+    popt, pcov = curve_fit(cpi, x, y, p0=guess, maxfev=1000000)
+    return popt[0]
+
+
+if __name__ == '__main__':
+    stacks = load_stacks()
+
+    start = time.perf_counter()
+    for i in range(repeats):
+        f_notebook = [notebook_fit(stacks[s][k], (i0, i1), guess, n) for s, k, i0, i1, n, guess, I, U, P_e in windows]
+    t_notebook = (time.perf_counter() - start) / repeats
+
+    jobs = [peakfit.Job(stacks[s][k], (i0, i1), n, None, I, U, P_e) for s, k, i0, i1, n, guess, I, U, P_e in windows]
+    for name, procs in (('peakfit, 1 process', 1), ('peakfit, pool', processes)):
+        start = time.perf_counter()
+        for i in range(repeats):
+            results = peakfit.fit_peaks(jobs, processes=procs)
+        t = (time.perf_counter() - start) / repeats
+        f = np.array([r.peak.f for r in results])
+        diff = np.abs(f - f_notebook)
+        sigma = np.array([r.peak.sigma for r in results])
+        print('{:<20} {:7.1f} ms for {} fits (notebook {:.1f} ms), |f - f_notebook|: median {:.4f} MHz, '
+              'max {:.3f} MHz, {} fits differ by more than sigma'.format(
+              name, t*1e3, len(jobs), t_notebook*1e3, np.nanmedian(diff), np.nanmax(diff), int(np.sum(diff > sigma))))
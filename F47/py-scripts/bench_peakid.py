@@ -0,0 +1,58 @@
+#---Benchmark of the automatic peak identification of the F47 campaign-----
+# Runs peakid.identify on all scans of F47/data (cold and warm catalog cache)
+# and compares the lines with the 51 hand-windowed fits of F47_Auswertung.ipynb
+# (the windows of bench_peakfit.py): for every window of the notebook the
+# identified line of the same setting closest to the notebook frequency.
+# The notebook calls some of the axial dips side bands, so the mode of the
+# closest line is printed next to it. A window without a line within
+# peakid.max_fit_offset fitted widths counts as missing.
+import time
+import numpy as np
+
+import peakid
+from catalog import Catalog
+from bench_peakfit import data_path, windows, load_stacks, notebook_fit
+
+# the three series of the campaign in file name order, like in the notebook
+series = {'ep': slice(0, 12), 'U': slice(12, 30), 'I': slice(30, 45)}
+series_key = {'ep': 'P_e', 'U': 'U', 'I': 'I'}
+
+
+def setting_index(settings, files, s, key):
+    names = files[series[s]]
+    for i, setting in enumerate(settings):
+        if setting.scans[0].fname in names and getattr(setting, series_key[s]) == key:
+            return i
+
+
+if __name__ == '__main__':
+    Catalog(data_path).clear_cache()
+    for label in ('cold cache', 'warm cache'):
+        start = time.perf_counter()
+        cat = Catalog(data_path)
+        settings, lines = peakid.identify(cat)
+        t = time.perf_counter() - start
+        print('{}: {} scans, {} settings, {} lines identified and fitted in {:.0f} ms'.format(
+            label, len(cat), len(settings), len(lines), t*1e3))
+    ok = [line for line in lines if peakid.valid(line, settings)]
+    tables = peakid.tables(settings, lines, modes=tuple(peakid.fundamental) + tuple(peakid.derived))
+    print('valid fits: ' + ', '.join('{} {}'.format(mode, len(peaks)) for mode, peaks in tables.items()))
+
+    files = [scan.fname for scan in cat]
+    stacks = load_stacks()
+    diff, within, missing = [], 0, 0
+    print('{:<4} {:>5}  {:>10}  {:>18}  {}'.format('', '', 'notebook', 'peakid', 'mode'))
+    for s, key, i0, i1, n, guess, I, U, P_e in windows:
+        f_notebook = notebook_fit(stacks[s][key], (i0, i1), guess, n)
+        i = setting_index(settings, files, s, key)
+        line = min((line for line in ok if line.setting == i), key=lambda line: abs(line.result.peak.f - f_notebook))
+        peak = line.result.peak
+        if abs(peak.f - f_notebook) > peakid.max_fit_offset*peak.sigma:
+            missing += 1
+            print('{:<4} {:>5}  {:10.3f}  {:>18}'.format(s, key, f_notebook, 'missing'))
+            continue
+        diff.append(abs(peak.f - f_notebook))
+        within += diff[-1] < peak.sigma
+        print('{:<4} {:>5}  {:10.3f}  {:9.3f} +- {:5.3f}  {}'.format(s, key, f_notebook, peak.f, peak.sigma, line.mode))
+    print('|f - f_notebook|: median {:.4f} MHz, max {:.3f} MHz, {} of {} within sigma, {} missing'.format(
+        np.median(diff), np.max(diff), within, len(diff), missing))
@@ -0,0 +1,80 @@
+#---Benchmark of the pdf report of check_data.py-------------------
+# Writes n_scans synthetic scans (points each, noise and a dip of one or two
+# points) to a temporary directory and renders them with report.render.
+# Prints the time, the peak memory of this process and whether the dip of
+# every scan is still in the decimated trace. For comparison the old
+# check_data.py figure (all scans in one figure on one page) is rendered for
+# the F47/data files.
+import os
+import time
+import glob
+import resource
+import tempfile
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+
+import catalog
+import decimate
+import report
+
+#---Settings------------------------------------------------
+n_scans = 300
+points = 5000
+processes = None    # None: one per CPU
+data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+#-----------------------------------------------------------
+
+
+def write_scans(path, rng):
+    dips = []
+    for i in range(n_scans):
+        f = np.linspace(300, 500, points)
+        mmd = 20 + rng.normal(0, 1, points)
+        k = rng.integers(points)
+        mmd[k] -= 15    # narrow dip, a single point
+        dips.append(mmd[k])
+        fname = 'Bench_2021_05_01_00_{:02d}_{:02d}_40V_1.3A_300-500MHz_{}dBm.csv'.format(i // 60, i % 60, i)
+        np.savetxt(os.path.join(path, fname), np.transpose([f, mmd]), delimiter=',')
+    return dips
+
+
+def old_figure(files, pdfname):
+    # check_data.py before the report: one figure with all files on one page
+    fig, axs = plt.subplots(len(files), 1, figsize=(50, 50))
+    axs = axs.ravel()
+    for i, item in enumerate(files):
+        axs[i].plot(np.loadtxt(item, usecols=[0], delimiter=','), np.loadtxt(item, usecols=[1], delimiter=','))
+        axs[i].set_title(item, fontsize=25)
+    pp = PdfPages(pdfname)
+    plt.savefig(pp, format='pdf')
+    pp.close()
+    plt.close(fig)
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        write_scans(tmp, rng)
+        cat = catalog.Catalog(tmp)
+        lost = 0
+        for scan in cat:
+            f, mmd = decimate.minmax(scan.f, scan.mmd, report.points)
+            lost += np.min(mmd) != np.min(scan.mmd)
+            scan.release()
+        for label in ('cold cache', 'warm cache'):
+            start = time.perf_counter()
+            pages = report.render(catalog.Catalog(tmp), os.path.join(tmp, 'report.pdf'), processes=processes)
+            t = time.perf_counter() - start
+            print('report, {}: {} scans x {} points on {} pages in {:.1f} s ({:.0f} kB)'.format(
+                label, n_scans, points, pages, t, os.path.getsize(os.path.join(tmp, 'report.pdf'))/1e3))
+        print('dips lost by the decimation: {} of {}'.format(lost, n_scans))
+        print('peak memory: {:.0f} MB'.format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1e3))
+
+        files = sorted(glob.glob(os.path.join(data_path, '*.csv')))
+        start = time.perf_counter()
+        old_figure(files, os.path.join(tmp, 'old.pdf'))
+        t_old = time.perf_counter() - start
+        start = time.perf_counter()
+        report.render(catalog.Catalog(data_path), os.path.join(tmp, 'new.pdf'), processes=processes)
+        print('F47/data ({} files): old figure {:.1f} s, report {:.1f} s'.format(len(files), t_old, time.perf_counter() - start))
@@ -0,0 +1,44 @@
+#---Axial frequency against ring voltage on the simulated setup---------------
+# Measures the voltages where the axial frequency equals the analyzer center
+# frequency with axialRingSweep (one ring sweep per center frequency, see
+# ringsweep.py) and compares them and the fitted C_2 with the values of the
+# simulated trap (trap.C_2). For comparison the time of the host driven way is
+# estimated: one 30-80 MHz scanFreq per ring voltage like in measurement().
+import os
+import sys
+import time
+import tempfile
+
+os.environ['F47_BACKEND'] = 'sim'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())
+
+#---Settings------------------------------------------------
+center_freqs = [52, 55, 57.3, 60, 62]
+averages = 3
+ring_voltages = [20, 25, 30, 35, 40, 45]    # voltage sweep of measurement()
+#-----------------------------------------------------------
+
+import numpy as np
+
+import trap
+import devices
+import MeasurementScript as ms
+
+ms.wait3 = 30   # ramp and analyzer sweep start together
+devices.configure_trigger(ms.load, ms.wait1, ms.excite, ms.wait2, ms.detect, ms.wait3, ms.rigol)
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    voltages, C_2 = ms.axialRingSweep(center_freqs, ccurrent=1.3, averages=averages)
+    t_sweep = time.perf_counter() - start
+    f_40 = trap.trap_frequencies(1.3, 40)['z']
+    expected = [40*(f/f_40)**2 for f in center_freqs]
+    for f, U, U0 in zip(center_freqs, voltages, expected):
+        print('{:5.1f} MHz: {:6.2f} V (trap: {:6.2f} V)'.format(f, U, U0))
+    print('C_2 = {:.0f} 1/m^2 (trap: {:.0f}), {} sweeps with {} shots in {:.1f} s'.format(
+        C_2, trap.C_2, len(center_freqs), averages, t_sweep))
+    points = len(np.arange(30, 80, 0.1))*len(ring_voltages)
+    print('host driven: {} scans 30-80 MHz, {} points with {} shots, about {:.1f} h'.format(
+        len(ring_voltages), points, ms.average_num, points*ms.average_num*ms.cycle_time/1000/3600))
@@ -0,0 +1,109 @@
+#---Throughput of the measurement scripts on the simulated setup----------
+# Baseline for the acquisition optimizations: runs scanFreq
+# (MeasurementScript.py), the lifetime measurement (Lifetime.py) and the
+# trigger loop (Test.py) against the simulated devices (sim_devices.py) and
+# reports the points per second, the time per trace readout and the time
+# spent in time.sleep() by the scripts and devices.py. The simulated
+# latencies of the devices are not counted as sleeps, the sleeps of the
+# threads of the pipelined scan add up.
+import os
+import sys
+import time
+import tempfile
+
+os.environ['F47_BACKEND'] = 'sim'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(tempfile.mkdtemp())    # the scripts write their data files here
+
+#---Settings------------------------------------------------
+freq_min, freq_max, freq_step = 60, 61, 0.2     # scanFreq
+average_num = 5
+lifetime_waits = [20, 100, 300]                 # Lifetime.py, wait2 in ms
+lifetime_averages = 3
+test_shots = 10                                 # Test.py
+#-----------------------------------------------------------
+
+import numpy as np
+
+import devices
+import sim_devices
+import MeasurementScript as ms
+import Lifetime
+import Test
+
+# time spent in time.sleep() and in the trace readout
+counters = {'sleep': 0.0, 'traces': 0, 'trace_time': 0.0, 'failures': 0}
+
+_sleep = time.sleep
+def counting_sleep(seconds):
+    counters['sleep'] += seconds
+    _sleep(seconds)
+time.sleep = counting_sleep
+
+_get_trace_payload = devices.get_trace_payload
+def timed_get_trace_payload(binary=True):
+    start = time.perf_counter()
+    try:
+        return _get_trace_payload(binary)
+    finally:
+        counters['traces'] += 1
+        counters['trace_time'] += time.perf_counter() - start
+devices.get_trace_payload = timed_get_trace_payload
+
+_serial_write = sim_devices.Serial.write
+def counting_serial_write(self, data):
+    try:
+        return _serial_write(self, data)
+    except sim_devices.SerialException:
+        counters['failures'] += 1
+        raise
+sim_devices.Serial.write = counting_serial_write
+
+
+def run(name, points, func):
+    for key in counters:
+        counters[key] = 0
+    start = time.perf_counter()
+    func()
+    dt = time.perf_counter() - start
+    per_trace = counters['trace_time']/counters['traces']*1e3 if counters['traces'] else float('nan')
+    return (name, points, dt, points/dt, counters['traces'], per_trace, counters['sleep'], counters['failures'])
+
+
+def scan(**kwargs):
+    ms.average_num = average_num
+    ms.scanFreq(freq_min, freq_max, freq_step, rvolt=40, ccurrent=1.3, excitation_power=10, **kwargs)
+
+
+def lifetime():
+    # the shots are repeated by devices.trigger_shot after a failure, the timings of setup() are sent once
+    sim_devices.failures = False
+    Lifetime.setup()
+    sim_devices.failures = True
+    Lifetime.measure_lifetime(lifetime_waits, lifetime_averages, 'lifetime_bench.txt')
+
+
+def test():
+    sim_devices.failures = False    # the same for Test.py
+    Test.setup()
+    sim_devices.failures = True
+    Test.run(test_shots)
+
+
+if __name__ == '__main__':
+    n_freqs = len(np.arange(freq_min, freq_max, freq_step))
+    results = [
+        run('scanFreq, fixed sleeps', n_freqs, lambda: scan(event_pacing=False)),
+        run('scanFreq, event pacing', n_freqs, lambda: scan(event_pacing=True)),
+        run('scanFreq, pipelined', n_freqs, lambda: scan(event_pacing=True, pipelined=True)),
+        run('scanFreq, burst', n_freqs, lambda: scan(event_pacing=True, burst=True)),
+        run('Lifetime.py', len(lifetime_waits), lifetime),
+        run('Test.py', test_shots, test),
+    ]
+
+    print('')
+    print('{:<24}{:>7}{:>9}{:>10}{:>8}{:>11}{:>10}{:>7}{:>10}'.format(
+        'script', 'points', 'time [s]', 'points/s', 'traces', 'ms/trace', 'sleep [s]', 'sleep', 'failures'))
+    for name, points, dt, rate, n_traces, per_trace, sleep, failures in results:
+        print('{:<24}{:>7}{:>9.1f}{:>10.3f}{:>8}{:>11.1f}{:>10.1f}{:>6.0f}%{:>10}'.format(
+            name, points, dt, rate, n_traces, per_trace, sleep, sleep/dt*100, failures))
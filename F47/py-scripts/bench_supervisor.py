@@ -0,0 +1,129 @@
+#---Recovery of the trigger link with a pty stand-in for the Arduino-----------
+# The trigger box is replaced by a pseudo terminal (supervisor.PtyStandIn)
+# which answers like the Arduino: "trig" -> "done", "times ..." sets the
+# timings, "times?" returns them. The link is opened with pyserial like in
+# devices.py. During the shots the stand-in drops off (like the Arduino from
+# the USB) and comes back after replug_delay as a new device with the default
+# timings. Prints the time from the failure until the repeated shot was
+# acknowledged and whether the timings were replayed. Only runs on posix.
+# 1. the timings are uploaded with one "times" command
+# 2. the timings are set one by one with devices.set_time like Lifetime.py and
+#    Test.py, the link replays the state of devices.py (devices._replay) and
+#    wait2 changes during the shots like in Lifetime.measure_point
+import os
+import sys
+import time
+import tempfile
+import threading
+
+os.environ['F47_BACKEND'] = 'sim'    # devices.py without the lab devices, the trigger link is replaced below
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import serial
+import supervisor
+import devices
+
+#---Settings------------------------------------------------
+shots = 200
+drops = (50, 100, 150)  # shots after which the stand-in drops off
+replug_delay = 0.1      # s until the port is back
+times = (500, 5, 10, 5, 50, 0, 5)
+default_times = (200, 5, 10, 5, 50, 30, 5)
+wait2_change = (120, 8)  # (shot, new wait2) of the set_time case
+#-----------------------------------------------------------
+
+
+class Arduino:
+    def __init__(self):
+        self.times = list(default_times)
+
+    def handle(self, line):
+        parts = line.split()
+        if parts[0] == 'trig':
+            return b'done\r\n'
+        if parts[0] == 'times?':
+            return (','.join(str(t) for t in self.times) + '\r\n').encode()
+        if parts[0] == 'times':
+            self.times = [int(v) for v in parts[1:]]
+        elif parts[0] in devices.trigger_times:
+            self.times[devices.trigger_times.index(parts[0])] = int(parts[1])
+        return None
+
+
+def open_link(path, on_connect):
+    return supervisor.Link('trigger', lambda: supervisor.open_serial(serial, path, 115200, 1, reset=False),
+                           probe=(b'times?\r\n', lambda line: line.count(b',') == 6), on_connect=on_connect)
+
+
+def run(label, stand_in, link, expected, change=None):
+    # shots with drop-offs, change(n) -> new expected timings or None
+    global arduino
+    recoveries, replayed = [], []
+    failed_at = None
+    start = time.perf_counter()
+    for n in range(shots):
+        if change is not None:
+            expected = change(n) or expected
+        if n in drops:
+            # the Arduino drops off and comes back as a new device after replug_delay
+            stand_in.drop()
+            def replug():
+                global arduino
+                arduino = Arduino()
+                stand_in.restart()
+            threading.Timer(replug_delay, replug).start()
+        for attempt in range(3):
+            try:
+                link.write(b'trig\r\n')
+                if link.readline().strip() != b'done':
+                    raise supervisor.LinkDown('no acknowledgement')
+                break
+            except OSError:
+                if failed_at is None:
+                    failed_at = time.perf_counter()
+                link.wait_up(5)
+        if failed_at is not None:
+            recoveries.append(time.perf_counter() - failed_at)
+            replayed.append(tuple(arduino.times) == tuple(expected))
+            failed_at = None
+    total = time.perf_counter() - start
+    link.close()
+    stand_in.close()
+
+    print('{}: {} shots in {:.2f} s, {} drop-offs'.format(label, shots, total, len(drops)))
+    for i, (t, ok) in enumerate(zip(recoveries, replayed)):
+        print('  drop {}: shot repeated after {:.0f} ms (replug after {:.0f} ms), timings replayed: {}'.format(
+            i+1, t*1e3, replug_delay*1e3, ok))
+    print('  ' + link.report())
+
+
+if __name__ == '__main__':
+    directory = tempfile.mkdtemp()
+    arduino = Arduino()
+
+    # 1. one times command, replayed by the on_connect of the link
+    path = os.path.join(directory, 'ttyTrigger1')
+    stand_in = supervisor.PtyStandIn(path, lambda line: arduino.handle(line))
+    config = {'times': 'times ' + ' '.join(str(t) for t in times) + '\r\n'}
+    link = open_link(path, lambda conn: conn.write(config['times'].encode()))
+    link.write(config['times'].encode())
+    run('times command', stand_in, link, times)
+
+    # 2. devices.set_time for every timing (Lifetime.setup), the cached state of devices.py is replayed
+    arduino = Arduino()
+    path = os.path.join(directory, 'ttyTrigger2')
+    stand_in = supervisor.PtyStandIn(path, lambda line: arduino.handle(line))
+    devices.invalidate("trigger")
+    devices.trigger = open_link(path, devices._replay("trigger"))
+    for ident, value in zip(devices.trigger_times, times):
+        devices.set_time(ident, value)
+    expected = list(times)
+
+    def change(n):
+        # new storage time like Lifetime.measure_point
+        if n == wait2_change[0]:
+            devices.set_time('wait2', wait2_change[1])
+            expected[devices.trigger_times.index('wait2')] = wait2_change[1]
+            return expected
+    run('devices.set_time', stand_in, devices.trigger, expected, change)
+    print('old recovery (trigger.clear, fix_arduino_comm, sleeps): > 12.3 s per failure')
@@ -0,0 +1,95 @@
+#---Benchmark of the trace transfer and parsing of the DSA815-------------
+# Compares the old ASCII parsing of get_analyzer_data_fast() with the new
+# ASCII and binary (REAL) parser from traces.py.
+# Works without the instrument on recorded payloads: record some with
+#   devices.save_trace_payload('trace_payloads/dip_1.bin', binary=True)
+# (binary=False records the ASCII answer). If no recorded payloads are found,
+# a synthetic 601 point zero span trace with a dip is used.
+import glob
+import time
+import numpy as np
+
+import traces
+
+#---Settings------------------------------------------------
+payload_files = 'trace_payloads/*.bin'
+n_points = 601          # trace length of the DSA815
+repeats = 2000
+link_rate = 1.0e6       # rough USBTMC throughput in byte/s, to estimate the transfer time
+measure_instrument = False  # time the real transfer (needs the lab hardware)
+#-----------------------------------------------------------
+
+
+def legacy_parse(data_str):
+    # parser of get_analyzer_data_fast() before the binary transfer
+    hp = data_str.find("-",0,100)
+    data_str = data_str[hp:]
+    return [float(s) for s in data_str.split(',')]
+
+
+def synthetic_trace(n=n_points, seed=1):
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 1, n)
+    trace = -40 - 12*np.exp(-((t-0.45)/0.04)**2) + rng.normal(0, 0.4, n)
+    return trace.astype(traces.BINARY_DTYPE)
+
+
+def load_traces():
+    loaded = []
+    for fname in sorted(glob.glob(payload_files)):
+        with open(fname, 'rb') as f:
+            raw = f.read()
+        try:
+            loaded.append((fname, traces.parse_ascii_trace(raw)))
+        except ValueError:
+            loaded.append((fname, traces.parse_binary_trace(raw)))
+    if not loaded:
+        loaded.append(('synthetic', synthetic_trace()))
+    return loaded
+
+
+def time_it(func, arg, repeats=repeats):
+    start = time.perf_counter()
+    for i in range(repeats):
+        func(arg)
+    return (time.perf_counter() - start) / repeats
+
+
+def bench_payload(name, trace):
+    ascii_raw = traces.make_ascii_payload(trace)
+    binary_raw = traces.make_binary_payload(trace)
+    ascii_str = ascii_raw.decode()
+
+    # all parsers have to give the same trace
+    assert np.allclose(legacy_parse(ascii_str), trace, atol=1e-4) or trace[0] >= 0
+    assert np.allclose(traces.parse_ascii_trace(ascii_raw), trace, atol=1e-4)
+    assert np.array_equal(traces.parse_binary_trace(binary_raw), trace.astype(traces.BINARY_DTYPE))
+
+    results = [
+        ('ascii, legacy', len(ascii_raw), time_it(legacy_parse, ascii_str)),
+        ('ascii, numpy', len(ascii_raw), time_it(traces.parse_ascii_trace, ascii_raw)),
+        ('binary REAL', len(binary_raw), time_it(traces.parse_binary_trace, binary_raw)),
+    ]
+    print('{} ({} points)'.format(name, len(trace)))
+    print('  {:<15}{:>10}{:>16}{:>16}'.format('mode', 'bytes', 'transfer [ms]', 'parse [us]'))
+    for mode, size, parse in results:
+        print('  {:<15}{:>10}{:>16.2f}{:>16.1f}'.format(mode, size, size/link_rate*1e3, parse*1e6))
+    print('  speedup of the parsing: {:.0f}x'.format(results[0][2]/results[2][2]))
+
+
+def bench_instrument(n=50):
+    import devices
+    for binary in (False, True):
+        start = time.perf_counter()
+        for i in range(n):
+            raw = devices.get_trace_payload(binary)
+            traces.parse_trace(raw, binary)
+        dt = (time.perf_counter() - start) / n
+        print('instrument, {}: {:.1f} ms per trace ({} bytes)'.format('binary' if binary else 'ascii', dt*1e3, len(raw)))
+
+
+if __name__ == '__main__':
+    for name, trace in load_traces():
+        bench_payload(name, trace)
+    if measure_instrument:
+        bench_instrument()
@@ -0,0 +1,88 @@
+#---Benchmark of the bootstrap and profile uncertainties of F47--------------
+# 1. lifetime fit of Lifetime_Analysis.py: the same parametric resamples
+#    refitted one at a time with curve_fit (like a hand-written bootstrap
+#    loop) and with uncertainty.bootstrap (1 process and pool), then the
+#    non-parametric bootstrap; the intervals of tau against the curve_fit error
+# 2. profile of tau: curve_fit with tau fixed at every grid point against
+#    uncertainty.profile (all grid points at once)
+# 3. one resonance window of bench_peakfit (C_PI, n = 1), non-parametric
+import os
+import time
+import numpy as np
+from scipy.optimize import curve_fit
+
+import lifetimefit
+import uncertainty
+from bench_peakfit import load_stacks
+
+#---Settings------------------------------------------------
+data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+n_loop = 1000       # resamples of the curve_fit loop
+n_boot = 10000
+processes = None    # None: one per CPU
+window = ('ep', 0, 360, 480)
+#-----------------------------------------------------------
+
+
+def describe(label, samples, value, error=None):
+    i = uncertainty.interval(samples, value)
+    extra = '' if error is None else ', curve_fit +- {:.3f}'.format(error)
+    print('  {:<32} [{:.3f}, {:.3f}] std {:.3f}{}'.format(label, i.lower, i.upper, i.sigma, extra))
+
+
+if __name__ == '__main__':
+    wait, avg, std = np.genfromtxt(os.path.join(data_path, 'lifetime_Neumann_Striebel.txt'), delimiter=',', unpack=True)
+    model = uncertainty.models['lifetime']
+    popt, pcov, chi2 = uncertainty.nominal(model, wait, avg, std, lifetimefit.guess)
+    scale = np.sqrt(chi2 / (len(wait) - len(popt)))
+    print('lifetime: tau = {:.3f} +- {:.3f} ms (curve_fit), chi^2/dof = {:.2f}'.format(
+        popt[1], np.sqrt(pcov[1, 1]), scale**2))
+
+    _, y_b, _ = uncertainty.resample(np.random.default_rng(0), n_loop, wait, avg, std, popt, model, 'parametric', scale)
+    start = time.perf_counter()
+    loop = np.array([curve_fit(lifetimefit.fit_func, wait, y, p0=lifetimefit.guess, sigma=std)[0] for y in y_b])
+    t_loop = time.perf_counter() - start
+    start = time.perf_counter()
+    p, _, converged = uncertainty.fit_batch(model, wait, y_b, std, np.tile(popt, (n_loop, 1)))
+    t_batch = time.perf_counter() - start
+    print('  curve_fit loop:        {:7.3f} s for {} resamples'.format(t_loop, n_loop))
+    print('  fit_batch, same data:  {:7.3f} s ({:.0f}x), {} converged, max |tau - tau_curve_fit| {:.1e} ms'.format(
+        t_batch, t_loop / t_batch, converged.sum(), np.max(np.abs(p[:, 1] - loop[:, 1]))))
+    for kind in ('parametric', 'nonparametric'):
+        for label, procs in (('1 process', 1), ('pool', processes)):
+            start = time.perf_counter()
+            samples = uncertainty.bootstrap(model, wait, avg, std, popt, kind, n_boot, chi2, procs)
+            t = time.perf_counter() - start
+            print('  bootstrap {:<13} {:<9} {:7.3f} s for {} resamples ({:.0f}x per resample), {} converged'.format(
+                kind + ',', label + ':', t, n_boot, t_loop / t * n_boot / n_loop, len(samples)))
+        describe('tau, ' + kind, samples[:, 1], popt[1], np.sqrt(pcov[1, 1]))
+    describe('tau, curve_fit loop', loop[:, 1], popt[1])
+
+    grid = np.linspace(popt[1] - 5*np.sqrt(pcov[1, 1]), popt[1] + 5*np.sqrt(pcov[1, 1]), 201)
+    start = time.perf_counter()
+    chi2_loop = []
+    for tau in grid:
+        f = lambda t, N0, off: lifetimefit.fit_func(t, N0, tau, off)
+        q = curve_fit(f, wait, avg, p0=popt[[0, 2]], sigma=std)[0]
+        chi2_loop.append(np.sum(((avg - f(wait, *q)) / std)**2))
+    t_loop = time.perf_counter() - start
+    start = time.perf_counter()
+    chi2_grid, tau = uncertainty.profile(model, wait, avg, std, popt, 1, grid, chi2)
+    t = time.perf_counter() - start
+    print('profile of tau on {} points: curve_fit loop {:.3f} s, uncertainty.profile {:.3f} s ({:.0f}x), '
+          'max |chi^2 difference| {:.1e}'.format(len(grid), t_loop, t, t_loop / t, np.nanmax(np.abs(chi2_grid - chi2_loop))))
+    print('  Delta chi^2 = 1: [{:.3f}, {:.3f}] ms, half width {:.3f}'.format(tau.lower, tau.upper, tau.sigma))
+
+    s, k, i0, i1 = window
+    data = load_stacks()[s][k]
+    x, y = data[0][i0:i1], data[1][i0:i1]
+    model = uncertainty.resonance(1)
+    start = time.perf_counter()
+    result = uncertainty.analyse(model, x, y, np.ones_like(x), [62, 3, -17, 22], 'nonparametric', n_boot,
+                                 profile_parameter='a', processes=processes)
+    t = time.perf_counter() - start
+    a = result.intervals['a']
+    print('resonance {} {} [{}:{}]: {:.2f} s, a = {:.3f} MHz, curve_fit +- {:.3f}, bootstrap [{:.3f}, {:.3f}], '
+          'profile [{:.3f}, {:.3f}], {} of {} converged'.format(s, k, i0, i1, t, a.value, np.sqrt(result.pcov[0, 0]),
+                                                               a.lower, a.upper, result.profile.lower,
+                                                               result.profile.upper, len(result.samples), n_boot))
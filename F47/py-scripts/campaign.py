@@ -0,0 +1,212 @@
+import os
+import json
+import glob
+import time
+from collections import namedtuple
+import numpy as np
+
+# Resumable measurement campaigns: a campaign is a list of scanFreq jobs
+# which is worked off in an order with few slow transitions. Every started
+# and finished job is appended to a journal (one json object per line), so
+# after a crash the same campaign continues with the unfinished jobs. A job
+# that was interrupted continues after the last frequency in its csv file,
+# the rest is appended to that file. prepare(job) sets the coil current and
+# ring voltage of a job before the settling time, so the settling happens at
+# the new values; start tells run where the devices are before the first job.
+#   jobs = [campaign.Job(rvolt=40, ccurrent=1.3, excitation_power=10, freq_min=1, freq_max=10, freq_step=0.1), ...]
+#   campaign.run(jobs, scanFreq, path, 'campaign_journal.jsonl', prepare=set_job_state)
+
+Job = namedtuple('Job', ['rvolt', 'ccurrent', 'excitation_power', 'freq_min', 'freq_max', 'freq_step'])
+
+#---Settings------------------------------------------------
+current_settle_time = 60    # s, thermal settling of the coil after a current change
+voltage_settle_time = 1     # s, after a ring voltage change
+#-----------------------------------------------------------
+
+
+def n_points(job, freq_min=None):
+    return len(np.arange(job.freq_min if freq_min is None else freq_min, job.freq_max, job.freq_step))
+
+
+def transition_time(a, b):
+    # time lost between job a and job b (a=None: start of the campaign with unknown coil current)
+    if a is None or a.ccurrent != b.ccurrent:
+        return current_settle_time
+    if a.rvolt != b.rvolt:
+        return voltage_settle_time
+    return 0
+
+
+def order_jobs(jobs, start=None):
+    """
+    Order with as few coil current changes as possible: the jobs are grouped by
+    coil current (closest to the current of start first, then monotonic), the
+    ring voltage alternates its direction between the groups, so the voltage
+    does not jump back at every current change.
+    """
+    currents = sorted(set(job.ccurrent for job in jobs))
+    if start is not None and currents and abs(currents[-1] - start.ccurrent) < abs(currents[0] - start.ccurrent):
+        currents.reverse()
+    ordered = []
+    for i, current in enumerate(currents):
+        group = [job for job in jobs if job.ccurrent == current]
+        group.sort(key=lambda job: (job.rvolt if i % 2 == 0 else -job.rvolt, job.excitation_power, job.freq_min))
+        ordered += group
+    return ordered
+
+
+def job_suffix(job):
+    # end of the file name written by scanFreq, see scan_filename in MeasurementScript.py
+    return "_{}V_{}A_{}-{}MHz_{}dBm.csv".format(job.rvolt, job.ccurrent, job.freq_min, job.freq_max, job.excitation_power)
+
+
+def last_frequency(fname):
+    # last complete line of an (interrupted) csv file
+    with open(fname) as file:
+        lines = [line for line in file.read().split('\n') if line.count(',') == 1]
+    if not lines:
+        return None
+    try:
+        return float(lines[-1].split(',')[0])
+    except ValueError:
+        return None
+
+
+def format_time(seconds):
+    return '{:d}h {:02d}m'.format(int(seconds // 3600), int(seconds % 3600 // 60))
+
+
+class Journal:
+    """Append-only log of a campaign, read back with Journal(fname).load()."""
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.path = None
+        self.jobs = None
+        self.done = {}      # job index -> list of files
+        self.started = {}   # job index -> start time
+        if os.path.exists(fname):
+            self.load()
+
+    def load(self):
+        with open(self.fname) as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue    # line of a crash while writing
+                if entry['event'] == 'campaign':
+                    self.path = entry['path']
+                    self.jobs = [Job(*job) for job in entry['jobs']]
+                elif entry['event'] == 'start':
+                    self.started[entry['job']] = entry['time']
+                elif entry['event'] == 'done':
+                    self.done[entry['job']] = entry['files']
+
+    def write(self, **entry):
+        entry['wall_time'] = time.strftime("%Y_%m_%d_%H_%M_%S")
+        with open(self.fname, 'a') as file:
+            file.write(json.dumps(entry) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+    def begin(self, jobs, path):
+        if self.jobs is not None:
+            # a different campaign: keep the old journal
+            os.rename(self.fname, self.fname + time.strftime(".%Y_%m_%d_%H_%M_%S"))
+            self.__init__(self.fname)
+        self.path = path
+        self.jobs = list(jobs)
+        self.write(event='campaign', path=path, jobs=[list(job) for job in jobs])
+
+    def files_used(self):
+        return set(f for files in self.done.values() for f in files)
+
+
+def resume_path(journal_file, path, jobs):
+    """Data directory of the unfinished campaign with these jobs in the journal, else path."""
+    journal = Journal(journal_file)
+    if journal.jobs == [Job(*job) for job in jobs] and len(journal.done) < len(jobs) and os.path.isdir(journal.path):
+        return journal.path
+    return path
+
+
+def run(jobs, scan, path, journal_file='campaign_journal.jsonl', reorder=True, prepare=None, start=None):
+    """
+    Runs scan(freq_min, freq_max, freq_step, rvolt=..., ccurrent=..., excitation_power=...) for all jobs
+    which are not finished according to the journal. scan writes its csv file to path (scanFreq).
+    prepare(job): sets coil current and ring voltage of the job, called before the settling time.
+    start: Job (or an object with rvolt and ccurrent) with the state of the devices before the first
+    job, None if unknown. No settling before the first job if the devices are already there.
+    """
+    jobs = [Job(*job) for job in jobs]
+    journal = Journal(journal_file)
+    if journal.jobs != jobs or len(journal.done) == len(jobs):
+        journal.begin(jobs, path)
+    elif journal.done:
+        print("resuming campaign: {} of {} jobs done".format(len(journal.done), len(jobs)))
+    path = journal.path
+
+    todo = [i for i in range(len(jobs)) if i not in journal.done]
+    if reorder:
+        position = {job: k for k, job in enumerate(order_jobs([jobs[i] for i in todo], start))}
+        todo.sort(key=lambda i: (i not in journal.started, position[jobs[i]]))   # interrupted jobs first
+
+    measured_points, measured_time = 0, 0.0
+    last = start
+    campaign_start = time.perf_counter()
+    for n, i in enumerate(todo):
+        job = jobs[i]
+        wait = transition_time(last, job)
+        if prepare is not None:
+            prepare(job)
+        if wait:
+            time.sleep(wait)    # settling after a coil current (or ring voltage) change
+
+        freq_min, files = job.freq_min, []
+        if i in journal.started:
+            # interrupted job: continue after the last frequency in its file
+            used = journal.files_used()
+            candidates = sorted(f for f in glob.glob(os.path.join(path, '*' + job_suffix(job)))
+                                if os.path.basename(f) not in used)
+            f_last = last_frequency(candidates[-1]) if candidates else None
+            if f_last is not None:
+                files.append(os.path.basename(candidates[-1]))
+                freq_min = round(f_last + job.freq_step, 6)
+                journal.write(event='progress', job=i, f=f_last)
+                print("job {}: continuing at {} MHz".format(i, freq_min))
+        journal.write(event='start', job=i, time=time.time())
+
+        start = time.perf_counter()
+        points = n_points(job, freq_min)
+        if points > 0:
+            before = set(os.listdir(path))
+            scan(freq_min, job.freq_max, job.freq_step, rvolt=job.rvolt, ccurrent=job.ccurrent,
+                 excitation_power=job.excitation_power)
+            new = sorted(set(os.listdir(path)) - before)
+            new = [f for f in new if f.endswith(job_suffix(job._replace(freq_min=freq_min)))]
+            if files and new:
+                # append the rest of the interrupted job to its first file
+                with open(os.path.join(path, files[0]), 'a') as file, open(os.path.join(path, new[-1])) as rest:
+                    file.write(rest.read())
+                os.remove(os.path.join(path, new[-1]))
+            else:
+                files += new
+        journal.write(event='done', job=i, files=files, points=points)
+        journal.done[i] = files
+
+        measured_points += points
+        measured_time += time.perf_counter() - start
+        last = job
+        remaining = todo[n+1:]
+        if remaining and measured_points:
+            eta = sum(n_points(jobs[k]) for k in remaining) * measured_time / measured_points
+            previous = job
+            for k in remaining:
+                eta += transition_time(previous, jobs[k])
+                previous = jobs[k]
+            print("job {}/{} done ({:.2f} points/s), ETA {} (about {})".format(
+                len(journal.done), len(jobs), measured_points/measured_time, format_time(eta),
+                time.strftime("%H:%M", time.localtime(time.time() + eta))))
+    print("campaign finished after {}".format(format_time(time.perf_counter() - campaign_start)))
+    return path
@@ -0,0 +1,240 @@
+import os
+import json
+import glob
+import time
+import tempfile
+import weakref
+import numpy as np
+
+from scanstore import parse_filename
+
+# Catalog of the csv files of scanFreq in a data directory.
+# Opening a catalog only lists the directory and parses the file names
+# (group, timestamp, V, A, frequency range, dBm), the data of a scan is read
+# when it is used. The parsed (f, mmd) arrays are cached as .npy files in the
+# sidecar directory .catalog next to the csv files and are read back as memory
+# maps, a cache file is renewed when the mtime or size of its csv file changed.
+# The index of the cache (index.json) is written once by flush(), close() or
+# when the catalog is collected, not after every file. Worker processes open
+# their catalog with write_index=False and hand their new entries to the
+# catalog of the parent (updates() and merge()).
+#   with catalog.Catalog('../data') as cat:
+#       for scan in cat.select(current=1.3, power=10, range=(30, 80)):
+#           plt.plot(scan.f, scan.mmd)
+
+sidecar = '.catalog'
+
+# selection keywords -> run parameters of parse_filename
+keys = {'voltage': 'rvolt', 'current': 'ccurrent', 'power': 'excitation_power', 'group': 'group'}
+
+
+class Scan:
+    """One csv file of the catalog, the data is loaded on first use."""
+
+    def __init__(self, catalog, fname, attrs):
+        self.catalog = catalog
+        self.fname = fname
+        self.attrs = attrs    # None if the file name is not one of scanFreq
+        self._data = None
+
+    @property
+    def path(self):
+        return os.path.join(self.catalog.path, self.fname)
+
+    @property
+    def data(self):
+        """(f, mmd) as 2 x N array like np.genfromtxt(..., unpack=True)."""
+        if self._data is None:
+            self._data = self.catalog.load(self.fname)
+        return self._data
+
+    @property
+    def f(self):
+        return self.data[0]
+
+    @property
+    def mmd(self):
+        return self.data[1]
+
+    def release(self):
+        # frees the data, it is read again from the cache when used
+        self._data = None
+
+    def __getattr__(self, name):
+        # scan.rvolt, scan.ccurrent, ... from the file name
+        attrs = self.__dict__.get('attrs')
+        if attrs is not None and name in attrs:
+            return attrs[name]
+        raise AttributeError(name)
+
+    def __repr__(self):
+        return 'Scan({!r})'.format(self.fname)
+
+
+class Catalog:
+    """Indexed table of the csv files in path, see select()."""
+
+    def __init__(self, path='.', pattern='*.csv', write_index=True):
+        self.path = path
+        self.pattern = pattern
+        self.cache_dir = os.path.join(path, sidecar)
+        self.index = _read_index(self.cache_dir)
+        self._pending = {}    # index entries of the files cached since the last flush
+        self.write_index = write_index
+        if write_index:
+            self._finalizer = weakref.finalize(self, _write_index, self.cache_dir, self._pending)
+        self.scans = []
+        for fname in sorted(os.path.basename(f) for f in glob.glob(os.path.join(path, pattern))):
+            try:
+                attrs = parse_filename(fname)
+            except (ValueError, IndexError):
+                attrs = None
+            self.scans.append(Scan(self, fname, attrs))
+        # value -> positions in scans for every selection keyword
+        self.by = {key: {} for key in keys}
+        for i, scan in enumerate(self.scans):
+            if scan.attrs is None:
+                continue
+            for key, attr in keys.items():
+                self.by[key].setdefault(scan.attrs[attr], []).append(i)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.scans)
+
+    def __iter__(self):
+        return iter(self.scans)
+
+    def __getitem__(self, i):
+        return self.scans[i]
+
+    def select(self, voltage=None, current=None, power=None, group=None, range=None):
+        """
+        Scans with the given run parameters (None: any), in file name order.
+        range=(freq_min, freq_max) in MHz selects the frequency range of the scan.
+        """
+        selected = None
+        for key, value in (('voltage', voltage), ('current', current), ('power', power), ('group', group)):
+            if value is None:
+                continue
+            found = set(self.by[key].get(float(value) if key != 'group' else value, []))
+            selected = found if selected is None else selected & found
+        if selected is None:
+            selected = set(i for i, scan in enumerate(self.scans) if scan.attrs is not None)
+        scans = [self.scans[i] for i in sorted(selected)]
+        if range is not None:
+            scans = [scan for scan in scans
+                     if (scan.attrs['freq_min'], scan.attrs['freq_max']) == (float(range[0]), float(range[1]))]
+        return scans
+
+    def values(self, key):
+        """Sorted values of a selection keyword in the catalog, e.g. values('current')."""
+        return sorted(self.by[key])
+
+    #---sidecar cache---
+    def load(self, fname):
+        """(f, mmd) of a csv file, from the sidecar cache if it is up to date."""
+        stat = os.stat(os.path.join(self.path, fname))
+        key = [stat.st_mtime_ns, stat.st_size]
+        cache = os.path.join(self.cache_dir, fname + '.npy')
+        if self.index.get(fname) == key and os.path.exists(cache):
+            return np.load(cache, mmap_mode='r')
+        data = np.loadtxt(os.path.join(self.path, fname), delimiter=',', ndmin=2).T
+        os.makedirs(self.cache_dir, exist_ok=True)
+        np.save(cache, data)
+        self.index[fname] = key
+        self._pending[fname] = key
+        return data
+
+    def flush(self):
+        """Writes the new entries of the index (nothing for write_index=False)."""
+        if self.write_index and self._pending:
+            _write_index(self.cache_dir, self._pending)
+
+    def close(self):
+        self.flush()
+
+    def updates(self):
+        """Index entries of the files cached since the last call, for merge() in another process."""
+        entries = dict(self._pending)
+        self._pending.clear()
+        return entries
+
+    def merge(self, entries):
+        """Adds the index entries of a worker (see updates()), written with the next flush."""
+        self.index.update(entries)
+        self._pending.update(entries)
+
+    def clear_cache(self):
+        for fname in self.index:
+            try:
+                os.remove(os.path.join(self.cache_dir, fname + '.npy'))
+            except OSError:
+                pass
+        self.index = {}
+        self._pending.clear()
+        if self.write_index:
+            _write_index(self.cache_dir, {}, replace=True)
+
+
+def _index_file(cache_dir):
+    return os.path.join(cache_dir, 'index.json')
+
+
+def _read_index(cache_dir):
+    try:
+        with open(_index_file(cache_dir)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(cache_dir, entries, replace=False):
+    # merges entries into the index on disk (other catalogs of the directory may have written
+    # theirs) and installs it with os.replace of a temporary file with a unique name
+    if not entries and not replace:
+        return
+    index = {} if replace else _read_index(cache_dir)
+    index.update(entries)
+    os.makedirs(cache_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', dir=cache_dir, suffix='.tmp', delete=False) as file:
+        json.dump(index, file, indent=1)
+    os.replace(file.name, _index_file(cache_dir))
+    entries.clear()
+
+
+def stack(scans):
+    """Concatenation of the scans (e.g. the three frequency ranges of a setting) like in the notebook."""
+    data = np.concatenate([scan.data for scan in scans], axis=1)
+    for catalog in set(scan.catalog for scan in scans):
+        catalog.flush()
+    return data
+
+
+if __name__ == '__main__':
+    # opens F47/data with a cold and a warm cache and compares with genfromtxt
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+    start = time.perf_counter()
+    for fname in sorted(glob.glob(os.path.join(data_dir, '*.csv'))):
+        np.genfromtxt(fname, delimiter=',', unpack=True)
+    csv_time = time.perf_counter() - start
+
+    Catalog(data_dir).clear_cache()
+    for label in ('cold cache', 'warm cache'):
+        start = time.perf_counter()
+        cat = Catalog(data_dir)
+        scans = cat.select(current=1.3, power=10, range=(30, 80))
+        points = sum(len(scan.f) for scan in scans)
+        t_select = time.perf_counter() - start
+        n = sum(len(scan.f) for scan in cat)
+        cat.close()
+        t_all = time.perf_counter() - start
+        print('{}: open + select {:.1f} ms ({} scans, {} points), all {} scans {:.1f} ms'.format(
+            label, t_select*1e3, len(scans), points, len(cat), t_all*1e3))
+    print('genfromtxt of all files: {:.0f} ms'.format(csv_time*1e3))
@@ -1,10 +1,10 @@
 #---Import all packages and set working directory-------------
-import glob
-import numpy as np
 import matplotlib.pyplot as plt
 #import peakutils #activate only if installed // used for peakdetection
-from matplotlib.backends.backend_pdf import PdfPages
+import os
 import re
+import catalog
+import report
 numbers = re.compile(r'(\d+)')
 def numericalSort(value):
     parts = numbers.split(value)
@@ -16,23 +16,26 @@ filepath = '*.csv'
 peakdetection = False
 exportpdf = True
 pdfname = 'FrequencyScans.pdf'
+pagegrid = (4, 2)    # scans per page (rows, cols) of the pdf
+decimation = 'minmax'    # 'minmax' or 'lttb', see decimate.py
 #-----------------------------------------------------------
-files = sorted(glob.glob(filepath), key=numericalSort)
-fig, axs = plt.subplots(len(glob.glob(filepath)),1, figsize=(50, 50))
-fig.subplots_adjust(hspace = .3, wspace=0.2)
-axs = axs.ravel()
 
-for i, item in enumerate(files):
-    axs[i].plot(np.loadtxt(item, usecols=[0], delimiter=','), np.loadtxt(item, usecols=[1], delimiter=','))
-    axs[i].set_title(item, fontsize=25)
-    axs[i].set_ylabel('Amplitude[a.u]', fontsize=20)
-    axs[i].set_xlabel('Frequency [MHz]', fontsize=20)
-fig.suptitle('Bestimmung Zyklotronfrequenz', fontsize=80).set_y(0.93)
+if __name__ == "__main__": # the pdf pages are prepared in worker processes which import this file
+    # the data is read once and cached by the catalog (sidecar directory .catalog)
+    scans = sorted(catalog.Catalog(os.path.dirname(filepath) or '.', os.path.basename(filepath)), key=lambda scan: numericalSort(scan.fname))
 
+    if exportpdf:
+        # one page per grid of scans, downsampled to screen resolution (dips are kept)
+        report.render(scans, pdfname, rows=pagegrid[0], cols=pagegrid[1], method=decimation)
+    else:
+        fig, axs = plt.subplots(len(scans),1, figsize=(50, 50))
+        fig.subplots_adjust(hspace = .3, wspace=0.2)
+        axs = axs.ravel()
 
-#plt.show() #activate if you want to see plot instead of just export pdf
-if exportpdf:
-    pp = PdfPages(pdfname)
-    plt.savefig(pp, format='pdf')
-    pp.close()
-
+        for i, scan in enumerate(scans):
+            axs[i].plot(scan.f, scan.mmd)
+            axs[i].set_title(scan.fname, fontsize=25)
+            axs[i].set_ylabel('Amplitude[a.u]', fontsize=20)
+            axs[i].set_xlabel('Frequency [MHz]', fontsize=20)
+        fig.suptitle('Bestimmung Zyklotronfrequenz', fontsize=80).set_y(0.93)
+        plt.show()
@@ -0,0 +1,49 @@
+import numpy as np
+
+# Peak preserving downsampling of traces for plotting.
+# minmax keeps the smallest and largest value of every bin (in their order),
+# so a dip of a single point is never lost. lttb (largest triangle three
+# buckets) keeps the point of every bucket that spans the largest triangle
+# with its neighbours, it looks closer to the original line at the same
+# number of points but can miss a dip if several are in one bucket.
+
+
+def minmax(x, y, n_out):
+    """About n_out points (n_out//2 bins with min and max) of the trace x, y."""
+    x, y = np.asarray(x), np.asarray(y)
+    n_bins = max(n_out // 2, 1)
+    if len(x) <= n_out:
+        return x, y
+    # bins of equal length, the last one is padded with NaN
+    size = -(-len(y) // n_bins)
+    n_bins = -(-len(y) // size)
+    padded = np.full(n_bins*size, np.nan)
+    padded[:len(y)] = y
+    padded = padded.reshape(n_bins, size)
+    start = np.arange(n_bins)*size
+    a, b = start + np.nanargmin(padded, axis=1), start + np.nanargmax(padded, axis=1)
+    order = np.stack([np.minimum(a, b), np.maximum(a, b)], axis=1).ravel()
+    return x[order], y[order]
+
+
+def lttb(x, y, n_out):
+    """n_out points of the trace x, y with the largest triangle three buckets method."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if len(x) <= n_out or n_out < 3:
+        return x, y
+    edges = np.linspace(1, len(x) - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, len(x) - 1
+    a = 0
+    for k in range(n_out - 2):
+        lo, hi = edges[k], edges[k+1]
+        # average of the next bucket (the last point for the last bucket)
+        nlo, nhi = hi, edges[k+2] if k + 2 < len(edges) else len(x)
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx)*(y[lo:hi] - y[a]) - (x[a] - x[lo:hi])*(cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[k+1] = a
+    return x[keep], y[keep]
+
+
+methods = {'minmax': minmax, 'lttb': lttb}
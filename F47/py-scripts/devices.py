@@ -1,21 +1,160 @@
-import pyvisa as visa
+import os
+import sys
 import time
-import serial
+
+# F47_BACKEND=sim (or the command line flag --sim) runs all scripts against the
+# simulated devices in sim_devices.py
+backend = "sim" if "--sim" in sys.argv else os.environ.get("F47_BACKEND", "lab")
+if backend == "sim":
+    import sim_devices as visa
+    import sim_devices as serial
+else:
+    import pyvisa as visa
+    import serial
 
 import numpy as np
 
+import traces
+import instrument
+import supervisor
+
 rm = visa.ResourceManager('@ni')
 print(rm.list_resources())
 
+def _replay(name):
+    # after a reconnect: sends the cached settings of the device over the new connection
+    def replay(conn):
+        for (device, setting), (value, cmd) in list(state.items()):
+            if device == name and cmd is not None:
+                conn.write(cmd.encode())
+    return replay
+
+# The serial devices are supervised links (see supervisor.py): after a failed transfer
+# they reconnect in the background and get their cached settings again. Settings of
+# hameg and srs are repeated after the reconnect, a failed trigger raises supervisor.LinkDown.
+identify = (b"*IDN?\r\n", lambda line: len(line) > 2)
 #func_gen    = rm.open_resource('USB0::0x0957::0x2C07::MY52803890::INSTR')  # Small function generator for ring voltage ramp
-hameg       = serial.Serial("COM6", 9600, timeout = 1)  # 4-channel power supply for filament current
-srs         = serial.Serial("COM4",baudrate=115200,timeout=1) # New main supply for electrodes; tuning ratio with voltage divider
+hameg       = supervisor.Link("hameg", lambda: serial.Serial("COM6", 9600, timeout = 1),  # 4-channel power supply for filament current
+                              probe=identify, on_connect=_replay("hameg"), retry_writes=True)
+srs         = supervisor.Link("srs", lambda: serial.Serial("COM4",baudrate=115200,timeout=1), # New main supply for electrodes; tuning ratio with voltage divider
+                              probe=identify, on_connect=_replay("srs"), retry_writes=True)
 hf_gen      = rm.open_resource('GPIB0::7::INSTR')       # Big HF generator for freq scans
 analyzer    = rm.open_resource('USB0::0x1AB1::0x0960::DSA8A154402671::INSTR')
-trigger     = serial.Serial("COM5", 115200, timeout = 1)          # Arduino trigger generator
+trigger     = supervisor.Link("trigger", lambda: supervisor.open_serial(serial, "COM5", 115200, 1, reset=False), # Arduino trigger generator
+                              probe=(b"times?\r\n", lambda line: line.count(b",") == 6), on_connect=_replay("trigger"))
 
 time.sleep(1) # wait for the serial connection to the trigger box
 
+# Instrument state cache and command statistics
+# The set_... functions remember every value they sent in state and skip the
+# write if the device already has this value. Analyzer commands are collected
+# between begin_batch() and flush_batch() and sent as one transfer, joined by ";".
+# After changes at the front panel call invalidate() (the next set_... sends
+# again) or resync() (sends all cached values again).
+# command_report() shows the transfers per device and the time spent in them.
+serial_devices = ("hameg", "srs", "trigger")
+state_cache = True      # False: every set_... is sent, no batching (old behaviour)
+state = {}              # (device, setting) -> (value, command)
+scpi_batch = None       # queued analyzer commands while a batch is open
+max_batch_length = 200  # characters per batched transfer
+command_stats = {}
+
+def _transfer(name, cmd, read=None):
+    # one write (and read) to the device with the given global name
+    conn = globals()[name]
+    start = time.perf_counter()
+    try:
+        # span of the transfer if the instrumentation is enabled (see instrument.py)
+        with instrument.span(cmd.split(" ")[0].strip(), "serial" if name in serial_devices else "visa", device=name, cmd=cmd[:60]):
+            conn.write(cmd.encode() if name in serial_devices else cmd)
+            return None if read is None else read(conn)
+    finally:
+        stats = command_stats.setdefault(name, {"writes": 0, "queries": 0, "skipped": 0, "time": 0.0})
+        stats["writes" if read is None else "queries"] += 1
+        stats["time"] += time.perf_counter() - start
+
+def send(name, cmd):
+    if name == "analyzer" and scpi_batch:
+        flush_batch()   # keep the order of the commands
+    _transfer(name, cmd)
+
+def query(name, cmd):
+    if name == "analyzer" and scpi_batch:
+        flush_batch()
+    return _transfer(name, cmd, lambda conn: conn.read())
+
+def query_raw(name, cmd):
+    if name == "analyzer" and scpi_batch:
+        flush_batch()
+    return _transfer(name, cmd, lambda conn: conn.read_raw())
+
+def analyzer_write(cmd):
+    if scpi_batch is not None:
+        scpi_batch.append(cmd)
+    else:
+        send("analyzer", cmd)
+
+def set_value(name, setting, value, cmd):
+    # sends cmd unless the device already has this value, returns True if sent
+    if state_cache and (name, setting) in state and state[(name, setting)][0] == value:
+        command_stats.setdefault(name, {"writes": 0, "queries": 0, "skipped": 0, "time": 0.0})["skipped"] += 1
+        return False
+    if name == "analyzer":
+        analyzer_write(cmd)
+    else:
+        send(name, cmd)
+    state[(name, setting)] = (value, cmd)
+    return True
+
+def begin_batch():
+    global scpi_batch
+    if state_cache and scpi_batch is None:
+        scpi_batch = []
+
+def flush_batch():
+    global scpi_batch
+    batch, scpi_batch = scpi_batch or [], None
+    chunk = ""
+    try:
+        for cmd in batch:
+            if not cmd.startswith((":", "*")):
+                cmd = ":" + cmd     # every command of the batch starts at the root
+            if chunk and len(chunk) + 1 + len(cmd) > max_batch_length:
+                _transfer("analyzer", chunk)
+                chunk = ""
+            chunk = chunk + ";" + cmd if chunk else cmd
+        if chunk:
+            _transfer("analyzer", chunk)
+    except Exception:
+        invalidate("analyzer")  # unknown which settings arrived
+        raise
+
+def invalidate(name=None):
+    # forgets the cached settings (of one device)
+    for key in list(state):
+        if name is None or key[0] == name:
+            del state[key]
+
+def resync(name=None):
+    # sends all cached settings (of one device) again
+    begin_batch()
+    for (device, setting), (value, cmd) in list(state.items()):
+        if (name is None or device == name) and cmd is not None:
+            if device == "analyzer":
+                analyzer_write(cmd)
+            else:
+                send(device, cmd)
+    flush_batch()
+
+def command_report(reset=True):
+    lines = []
+    for name, s in sorted(command_stats.items()):
+        lines.append("{:<9}{:6d} writes {:6d} queries {:6d} skipped {:8.2f} s".format(
+            name, s["writes"], s["queries"], s["skipped"], s["time"]))
+    if reset:
+        command_stats.clear()
+    return "\n".join(lines)
+
 # SRS205 - controls ring electrode and correction electrodes.
 # initialize in +/- 100V range, 15V setting and output on.
 #srs.write(b"*RST\r\n");
@@ -24,119 +163,172 @@ time.sleep(1) # wait for the serial connection to the trigger box
 #srs.write(b"SOUTon\r\n");
 
 def set_ring_voltage(voltage):
-    srs.write(("VOLT" + str(voltage) + "\r\n").encode());
-    srs.write(("SOUTon\r\n").encode());
+    set_value("srs", "voltage", str(voltage), "VOLT" + str(voltage) + "\r\n")
+    set_value("srs", "output", "on", "SOUTon\r\n")
 
 def set_ring_sweep(scan_start, scan_stop, scan_time): #defines the ring voltage sweep for detection; fastest time is 100ms for the full range
-    srs.write(("VOLT" + str(scan_start) + "\r\n").encode());
-    srs.write(("SOUTon\r\n").encode());
-    srs.write(("SCAR RANGE100\r\n").encode())
-    srs.write(("SCAB" + str(scan_start) + "\r\n").encode());
-    srs.write(("SCAE" + str(scan_stop) + "\r\n").encode());
-    srs.write(("SCAT" + str(scan_time) + "\r\n").encode());
-    srs.write(("SCAA ARMED\r\n").encode());
+    set_ring_voltage(scan_start)
+    cmd = "SCAR RANGE100\r\n"
+    cmd += "SCAB" + str(scan_start) + "\r\n"
+    cmd += "SCAE" + str(scan_stop) + "\r\n"
+    cmd += "SCAT" + str(scan_time) + "\r\n"
+    set_value("srs", "sweep", (scan_start, scan_stop, scan_time), cmd)   # one transfer
+    send("srs", "SCAA ARMED\r\n")
 
 def srs_rearm_device(): # Arms the device for the next identical sweep
-    srs.write(("SCAA ARMED\r\n").encode());
+    send("srs", "SCAA ARMED\r\n")
+
+def rearm_ring_sweep():
+    # back to the start voltage of the programmed sweep (the SRS stays at the end voltage) and armed again
+    sweep = state.get(("srs", "sweep"))
+    if sweep is not None:
+        send("srs", "VOLT" + str(sweep[0][0]) + "\r\n")
+    srs_rearm_device()
+
+def ring_sweep_done():
+    # the SRS stays at the end voltage after the ramp, so the next set_ring_voltage has to be sent
+    state.pop(("srs", "voltage"), None)
     
 # Hameg
 
 def set_coil_current(current):
-    hameg.write("INST OUT3\r\n".encode())
     str_value = "{0:.3f}".format(float(current))
     cmd = "CURR " +str_value+ "\r\n"
-    hameg.write(cmd.encode())
-    hameg.write("INST OUT4\r\n".encode())
-    hameg.write(cmd.encode())
+    set_value("hameg", "current", str_value, "INST OUT3\r\n" + cmd + "INST OUT4\r\n" + cmd)
 
 
 # hf_gen: The high frequency signal generator for the electron excitation
 def set_excitation_frequency(frequency):
-    hf_gen.write("FR "+str(frequency)+" MZ")     # set Frequency
-    time.sleep(0.05)                                # wait for generator to set the new freqency
+    if set_value("hf_gen", "frequency", str(frequency), "FR "+str(frequency)+" MZ"):   # set Frequency
+        wait_generator_settled(0.05)                # wait for generator to set the new freqency
 
 def set_excitation_power(power):
-    hf_gen.write("AP "+str(power)+" DM")         # set Amplitude
-    time.sleep(0.1)
+    if set_value("hf_gen", "power", str(power), "AP "+str(power)+" DM"):   # set Amplitude
+        time.sleep(0.1)
 
 def excitation_on():
-    hf_gen.write("R3")                           # output on
-    time.sleep(0.1)
+    if set_value("hf_gen", "output", "on", "R3"):  # output on
+        time.sleep(0.1)
 
 def excitation_off():
-    hf_gen.write("R2")                           # output off
-    time.sleep(0.1)
+    if set_value("hf_gen", "output", "off", "R2"): # output off
+        time.sleep(0.1)
 
 # RIGOL spectrum analyzer for axial excitation and detection
 def set_analyzer_to_zero_span(center_freq="56.5MHz", ref_level = "-12.0", 
-                              PDIV_scale = "1.0", sweep_time="100ms", attenuation="7"):
-    
-    analyzer.write(":SYST:PRES:TYPe FACT")
-    analyzer.write(":SYST:PRES")
-
+                              PDIV_scale = "1.0", sweep_time="100ms", attenuation="7", force=False):
+    # nothing is sent if the analyzer is already set up like this (force=True: preset anyway)
+    config = (center_freq, ref_level, PDIV_scale, sweep_time, attenuation)
+    if state_cache and not force and state.get(("analyzer", "zero_span"), (None,))[0] == config:
+        return
+
+    send("analyzer", ":SYST:PRES:TYPe FACT")
+    send("analyzer", ":SYST:PRES")
+    invalidate("analyzer")  # the preset resets all settings
+    global trace_format
+    trace_format = "ASCii"
+
+    begin_batch()
     #analyzer.write(":SENSe:FREQuency:CENTer 57.4MHz")
-    analyzer.write(":SENSe:FREQuency:CENTer "+center_freq)
-    analyzer.write(":SENSe:FREQuency:SPAN 0")
+    set_analyzer_center_frequency(center_freq)
+    set_value("analyzer", "span", "0", ":SENSe:FREQuency:SPAN 0")
 
     # the sweep time 100 ms is usefull to make sure you see everything
     # if you want to "zoom" in you can reduce this to e.g. 25 ms and
     # the resulting dip may be more stable in amplitude because you
     # get 4 times as many points in the time span you are intereseted in. 
     #analyzer.write(":SENSe:SWEep:TIME 100ms")
-    analyzer.write(":SENSe:SWEep:TIME "+sweep_time)
-    analyzer.write(":SENSe:SWEep:TIME:AUTO:RULes NORMal")
+    set_analyzer_sweep_time(sweep_time)
+    set_value("analyzer", "sweep_rules", "NORMal", ":SENSe:SWEep:TIME:AUTO:RULes NORMal")
 
     # trigger settings, non negatiable
-    analyzer.write(":TRIGger:SEQuence:SOURce EXTernal")
-    analyzer.write(":TRIGger:SEQuence:EXTernal:SLOPe POSitive")
+    set_value("analyzer", "trigger_source", "EXTernal", ":TRIGger:SEQuence:SOURce EXTernal")
+    set_value("analyzer", "trigger_slope", "POSitive", ":TRIGger:SEQuence:EXTernal:SLOPe POSitive")
 
     # these are the best settings for sampling
     #analyzer.write(":SENSe:BANDwidth:RESolution 1000000") # why?
     #analyzer.write(":SENSe:BANDwidth:VIDeo 1000000")      # why?
-    analyzer.write(":SENSe:DETector:FUNCtion SAMPle")   # no averaging
+    set_value("analyzer", "detector", "SAMPle", ":SENSe:DETector:FUNCtion SAMPle")   # no averaging
 
     #analyzer.write(":SENSe:POWer:RF:ATTenuation 7")
-    analyzer.write(":SENSe:POWer:RF:ATTenuation "+attenuation)
-    analyzer.write(":SOURce:POWer:LEVel:IMMediate:AMPLitude -20dBm")
+    set_value("analyzer", "attenuation", attenuation, ":SENSe:POWer:RF:ATTenuation "+attenuation)
+    set_resonator_power("-20dBm")
 
     # adjusting for the window on the spectrum analyzer
     #analyzer.write(":DISPlay:WINdow:TRACe:Y:SCALe:RLEVel -8.0") 
-    analyzer.write(":DISPlay:WINdow:TRACe:Y:SCALe:RLEVel "+ref_level) 
+    set_analyzer_ref_level(ref_level)
     #analyzer.write(":DISPlay:WINdow:TRACe:Y:SCALe:PDIVision 0.5") 
-    analyzer.write(":DISPlay:WINdow:TRACe:Y:SCALe:PDIVision "+PDIV_scale)
+    set_analyzer_ydivision(PDIV_scale)
 
-    analyzer.write(":DISPlay:WINdow:TRACe:Y:SCALe:SPACing LOG")  # Careful: No unit defaults to Volt now!!!
-    analyzer.write("OUTPut ON")
+    set_value("analyzer", "spacing", "LOG", ":DISPlay:WINdow:TRACe:Y:SCALe:SPACing LOG")  # Careful: No unit defaults to Volt now!!!
+    flush_batch()   # one transfer instead of ~15
+    state[("analyzer", "zero_span")] = (config, None)
 
 def set_analyzer_ref_level(ref_level):
-    analyzer.write(":DISPlay:WINdow:TRACe:Y:SCALe:RLEVel "+str(ref_level))
+    set_value("analyzer", "ref_level", str(ref_level), ":DISPlay:WINdow:TRACe:Y:SCALe:RLEVel "+str(ref_level))
 
 def set_analyzer_ydivision(division):
-    analyzer.write(":DISPlay:WINdow:TRACe:Y:SCALe:PDIVision "+str(division))
+    set_value("analyzer", "ydivision", str(division), ":DISPlay:WINdow:TRACe:Y:SCALe:PDIVision "+str(division))
 
 def set_analyzer_sweep_time(sweep_time):
-    analyzer.write(":SENSe:SWEep:TIME "+str(sweep_time))
+    set_value("analyzer", "sweep_time", str(sweep_time), ":SENSe:SWEep:TIME "+str(sweep_time))
 
 def set_analyzer_center_frequency(frequency):
-     analyzer.write(":SENSe:FREQuency:CENTer "+str(frequency))
+    set_value("analyzer", "center", str(frequency), ":SENSe:FREQuency:CENTer "+str(frequency))
      
-def get_analyzer_data_fast():
+# Trace transfer format of the analyzer. REAL sends the 601 points as 32 bit
+# floats (2.4 kB instead of ~8.5 kB ASCII) which can be decoded without
+# converting every single number from a string.
+trace_format = "ASCii"
+binary_trace = True     # set to False if the binary transfer does not work
+
+def set_trace_format(fmt="REAL"):
+    global trace_format, binary_trace
+    send("analyzer", ":FORMat:TRACe:DATA "+fmt)
+    trace_format = fmt
+    if fmt == "REAL":
+        binary_trace = True
+
+def get_trace_payload(binary=True):
+    # raw answer of the analyzer to a trace query (bytes, including the header)
+    fmt = "REAL" if binary else "ASCii"
+    if trace_format != fmt:
+        set_trace_format(fmt)
+    return query_raw("analyzer", ":TRACe:DATA? TRACE1")
+
+def read_trace(binary=True):
+    # single trace readout as numpy array, falls back to ASCII if the binary transfer fails
+    global binary_trace
+    if binary and binary_trace:
+        try:
+            return traces.parse_binary_trace(get_trace_payload(binary=True))
+        except Exception as err:
+            print("Binary trace transfer failed ("+str(err)+"), using ASCII from now on")
+            instrument.retry("binary trace", err)
+            binary_trace = False
+            analyzer.clear()
+    return traces.parse_ascii_trace(get_trace_payload(binary=False))
+
+def save_trace_payload(fname, binary=True):
+    # records the raw answer of the analyzer, e.g. for bench_traces.py
+    with open(fname, "wb") as f:
+        f.write(get_trace_payload(binary))
+
+def get_analyzer_data_fast(binary=True):
     for t in range(0, 10):
         try:
-            data_str = analyzer.query(":TRACe:DATA? TRACE1")    #get data from spectrum analyzer
-            hp = data_str.find("-",0,100)                       # cut header away
-            data_str = data_str[hp:]                            # cut header away
-            data = [float(s) for s in data_str.split(',')]      # convert into float numbers
+            data = read_trace(binary)   #get data from spectrum analyzer
             break;
 
         except:
             print("Error at "+str(t))
+            instrument.retry("read_trace", sys.exc_info()[1])
             time.sleep(4)
             pass
 
     return data
 
-def get_analyzer_data(average_number):
+def get_analyzer_data(average_number, binary=True):
 
     if(average_number < 1):
         average_number = 1
@@ -144,68 +336,132 @@ def get_analyzer_data(average_number):
     for t in range(0, 10):
         try:
             #Take Data
-            analyzer.write(":TRACe1:AVERage:TYPE VIDeo")
-            analyzer.write(":TRACe:AVERage:COUNt "+str(average_number))
+            begin_batch()
+            set_value("analyzer", "average_type", "VIDeo", ":TRACe1:AVERage:TYPE VIDeo")
+            set_value("analyzer", "average_count", str(average_number), ":TRACe:AVERage:COUNt "+str(average_number))
 
-            analyzer.write(":TRACe:AVERage:CLEar")
+            analyzer_write(":TRACe:AVERage:CLEar")
             #analyzer.write(":TRACe:AVERage:RESet")
+            flush_batch()
 
             avg_count = 0.0
             while avg_count < average_number:
-                avg_count = int(analyzer.query(":TRACe:AVERage:COUNt:CURRent?"))
+                avg_count = int(query("analyzer", ":TRACe:AVERage:COUNt:CURRent?"))
                 time.sleep(1.5) # DSA 815 doesn't like to many request per time
 
         
-            analyzer.write(":TRACe1:MODE VIEW")
+            set_value("analyzer", "trace_mode", "VIEW", ":TRACe1:MODE VIEW")
             break;
 
         except:
             print("Error at set/read average")
+            instrument.retry("set/read average", sys.exc_info()[1])
+            invalidate("analyzer")
             time.sleep(4)
             pass
      
     for t in range(0, 10):
         try:
-            data_str = analyzer.query(":TRACe:DATA? TRACE1")    #get data from spectrum analyzer
-            hp = data_str.find("-",0,100)                       # cut header away
-            data_str = data_str[hp:]                            # cut header away
-            data = [float(s) for s in data_str.split(',')]      # convert into float numbers
+            data = read_trace(binary)   #get data from spectrum analyzer
             break;
 
         except:
             print("Error at "+str(t))
+            instrument.retry("read_trace", sys.exc_info()[1])
             time.sleep(4)
             pass
 
     return data
 
+def get_analyzer_burst_data(average_number, burst_time, binary=True):
+    """
+    Hardware looped averaging: the trigger box runs average_number cycles back-to-back
+    and the analyzer averages the traces of these sweeps (video average), only the
+    averaged trace is read out. burst_time is the time in s from the trigger until the
+    sweep of the last cycle is finished. The analyzer has to run in continuous mode.
+    """
+    if(average_number < 1):
+        average_number = 1
+
+    begin_batch()
+    set_value("analyzer", "trace_mode", "VIDeoavg", ":TRACe1:MODE VIDeoavg")
+    set_value("analyzer", "average_type", "VIDeo", ":TRACe1:AVERage:TYPE VIDeo")
+    set_value("analyzer", "average_count", str(average_number), ":TRACe:AVERage:COUNt "+str(average_number))
+    analyzer_write(":TRACe:AVERage:CLEar")
+    flush_batch()
+    send_trigger_burst(average_number)
+    time.sleep(burst_time)
+
+    deadline = time.perf_counter() + 2.0 + burst_time
+    avg_count = 0
+    while avg_count < average_number and time.perf_counter() < deadline:
+        try:
+            avg_count = int(float(query("analyzer", ":TRACe:AVERage:COUNt:CURRent?")))
+        except Exception as err:
+            print("Error at read average ("+str(err)+")")
+            instrument.retry("read average", err)
+        if avg_count < average_number:
+            time.sleep(0.2) # DSA 815 doesn't like to many request per time
+    if avg_count < average_number:
+        print("Only "+str(avg_count)+" of "+str(average_number)+" sweeps averaged")
+
+    data = get_analyzer_data_fast(binary)
+    set_value("analyzer", "trace_mode", "WRITe", ":TRACe1:MODE WRITe")   # back to single sweeps
+    return data
+
 #Axial Detection: Resonator Excited by SpectrumAnalyzer
 def set_resonator_power(power):
-    analyzer.write(":SOURce:POWer:LEVel:IMMediate:AMPLitude "+str(power))
-    analyzer.write("OUTPut ON")
+    set_value("analyzer", "source_power", str(power), ":SOURce:POWer:LEVel:IMMediate:AMPLitude "+str(power))
+    set_value("analyzer", "output", "ON", "OUTPut ON")
 
 def set_resonator_on(power):
-    analyzer.write("OUTPut ON")
+    set_value("analyzer", "output", "ON", "OUTPut ON")
 
 def set_resonator_off(power):
-    analyzer.write("OUTPut OFF")
+    set_value("analyzer", "output", "OFF", "OUTPut OFF")
 
 #trigger
     
 def get_trigger_times():
-    trigger.clear() # Why? 
-    trigger.write("times?")
-    data = trigger.read()
-    values = [float(s) for s in data[:-2].split(',')]
-    return values
+    # framed request, old acknowledgements in the input buffer are dropped
+    data = trigger.request(b"times?\r\n", lambda line: line.count(b",") == 6)
+    return [float(s) for s in data.decode().strip().split(',')]
 
 """
 def set_trigger_num(num):
     trigger.write(("trig_num "+str(num)+"\r\n").encode())
     trigger.write(("trig\n"+"\r\n").encode()) 
 """
+# number of cycles the trigger box runs for one "trig", see send_trigger_burst()
+state[("trigger", "burst")] = (1, None)
+
+def set_trigger_burst(num):
+    set_value("trigger", "burst", num, "trig_num "+str(num)+"\r\n")
+
 def send_trigger():
-    trigger.write(("trig"+"\r\n").encode()) 
+    set_trigger_burst(1)
+    send("trigger", "trig"+"\r\n")
+
+def trigger_shot(attempts=3, recovery_timeout=5):
+    # send_trigger for the scan loops: if the trigger box fails, its link reconnects in the
+    # background (see supervisor.py) and only this shot is triggered again
+    for attempt in range(attempts):
+        try:
+            return send_trigger()
+        except OSError as err:  # supervisor.LinkDown or an error of the port
+            print("trigger failed ("+str(err)+")")
+            instrument.retry("trigger", err)
+            if attempt == attempts-1:
+                raise
+            trigger.wait_up(recovery_timeout)
+
+def send_trigger_burst(num):
+    # the trigger box runs num measurement cycles back-to-back
+    set_trigger_burst(num)
+    send("trigger", "trig"+"\r\n")
+
+# the timings of the trigger box in the order of the "times" command
+trigger_times = ("load", "wait1", "excite", "wait2", "detect", "wait3", "rigol")
 
 def set_trigger_times(load, wait1, excite, wait2, detect, wait3, rigol):
     if load + wait1 + excite + wait2 + detect > 1500:
@@ -214,18 +470,158 @@ def set_trigger_times(load, wait1, excite, wait2, detect, wait3, rigol):
     cmd = "times "+str(load)+" "+str(wait1)+" "+str(excite)+" "
     cmd += str(wait2)+" "+str(detect)+" "+str(wait3)+" "+str(rigol)+"\r\n"
     time.sleep(0.1)
-    trigger.write( cmd.encode() )
+    send("trigger", cmd)
     time.sleep(0.1)
+    state[("trigger", "times")] = ((load, wait1, excite, wait2, detect, wait3, rigol), cmd)
+    for ident in trigger_times:
+        state.pop(("trigger", ident), None)     # contained in the times command now
+
+def configure_trigger(load, wait1, excite, wait2, detect, wait3, rigol):
+    # uploads the timing sequence with one command, nothing is sent if it did not change
+    config = (load, wait1, excite, wait2, detect, wait3, rigol)
+    if not state_cache or state.get(("trigger", "times"), (None,))[0] != config:
+        set_trigger_times(*config)
 
 def set_time(ident='load', val=200):
-    ident = ident+' '
-    val = str(val)
-    print('send', ident+val+"\r\n", end='')
+    cmd = ident+' '+str(val)+"\r\n"
+    print('send', cmd, end='')
     time.sleep(0.1)
-    trigger.write((ident+val+"\r\n").encode())
+    send("trigger", cmd)
     time.sleep(0.1)
-
-def fix_arduino_comm():
-    trigger.close()
-    time.sleep(2)
-    trigger = rm.open_resource('ASRL5::INSTR')
+    # cached for the replay after a reconnect: as part of the times command if that was sent before
+    times = state.get(("trigger", "times"))
+    if times is not None and ident in trigger_times:
+        config = list(times[0])
+        config[trigger_times.index(ident)] = val
+        state[("trigger", "times")] = (tuple(config), "times "+" ".join(str(t) for t in config)+"\r\n")
+    else:
+        state[("trigger", ident)] = (val, cmd)
+
+def fix_arduino_comm(timeout=5):
+    # reopens the connection to the trigger box (done by the supervisor after every failed transfer)
+    return trigger.reconnect(wait=True, timeout=timeout)
+
+def links_report():
+    return "; ".join(link.report() for link in (hameg, srs, trigger))
+
+# Event driven pacing
+# Instead of sleeping for the worst case after every command, the scripts can
+# wait for the devices to report that they are done:
+#   trigger:   the Arduino sends trigger_ack after the measurement cycle
+#   sweep:     the analyzer runs single sweeps, *OPC? returns after the sweep
+#   generator: *OPC? of the HF generator after a new frequency was set
+# Every wait has a timeout and falls back to the fixed sleep if the device
+# does not answer. A device that misses max_pacing_misses answers in a row
+# is switched back to fixed sleeps.
+pacing = {"trigger": False, "sweep": False, "generator": False}
+pacing_misses = {"trigger": 0, "sweep": 0, "generator": 0}
+pacing_stats = {"waited": 0.0, "fixed": 0.0, "confirmed": 0, "fallbacks": 0}
+max_pacing_misses = 3
+trigger_ack = b"done"
+
+def enable_event_pacing(events=("trigger", "sweep", "generator")):
+    for key in pacing:
+        pacing[key] = key in events
+        pacing_misses[key] = 0
+    if pacing["trigger"]:
+        trigger.reset_input_buffer()    # drop old acknowledgements
+    if pacing["sweep"]:
+        set_value("analyzer", "continuous", "OFF", ":INITiate:CONTinuous OFF")  # single sweep, armed by arm_sweep()
+
+def disable_event_pacing():
+    if pacing["sweep"]:
+        set_value("analyzer", "continuous", "ON", ":INITiate:CONTinuous ON")
+    for key in pacing:
+        pacing[key] = False
+
+def _paced(start, fixed, confirmed, device=None):
+    if device is not None:
+        pacing_misses[device] = 0 if confirmed else pacing_misses[device] + 1
+        if pacing_misses[device] >= max_pacing_misses:
+            print("No answer from "+device+", using fixed sleeps")
+            pacing[device] = False
+            if device == "sweep":
+                set_value("analyzer", "continuous", "ON", ":INITiate:CONTinuous ON")
+    waited = time.perf_counter() - start
+    if not confirmed and waited < fixed:
+        time.sleep(fixed - waited)
+        waited = fixed
+    pacing_stats["waited"] += waited
+    pacing_stats["fixed"] += fixed
+    if confirmed:
+        pacing_stats["confirmed"] += 1
+    else:
+        pacing_stats["fallbacks"] += 1
+    return confirmed
+
+def arm_sweep():
+    # arms the analyzer for the next external trigger (single sweep mode)
+    if pacing["sweep"]:
+        send("analyzer", ":INITiate:IMMediate")
+
+def wait_sweep_complete(fixed, timeout=None):
+    # waits until the triggered sweep is finished, at most timeout seconds
+    start = time.perf_counter()
+    if not pacing["sweep"]:
+        return _paced(start, fixed, False)
+    if timeout is None:
+        timeout = fixed + 1.0
+    old_timeout = analyzer.timeout
+    try:
+        analyzer.timeout = int(timeout*1000)
+        done = query("analyzer", "*OPC?").strip() == "1"
+    except Exception as err:
+        print("No sweep complete from analyzer ("+str(err)+")")
+        analyzer.clear()    # drop the pending *OPC?
+        done = False
+    finally:
+        analyzer.timeout = old_timeout
+    return _paced(start, fixed, done, "sweep")
+
+def wait_trigger_done(fixed, timeout=None):
+    # waits for the acknowledgement of the Arduino after the measurement cycle
+    start = time.perf_counter()
+    if not pacing["trigger"]:
+        return _paced(start, fixed, False)
+    if timeout is None:
+        timeout = fixed + 1.0
+    old_timeout = trigger.timeout
+    done = False
+    try:
+        while not done and time.perf_counter() - start < timeout:
+            trigger.timeout = max(timeout - (time.perf_counter() - start), 0.001)
+            with instrument.span("readline", "serial", device="trigger"):
+                line = trigger.readline()
+            if not line:
+                break
+            done = line.strip() == trigger_ack
+    except Exception as err:
+        print("No acknowledgement from trigger ("+str(err)+")")
+    finally:
+        trigger.timeout = old_timeout
+    return _paced(start, fixed, done, "trigger")
+
+def wait_generator_settled(fixed, timeout=0.5):
+    start = time.perf_counter()
+    if not pacing["generator"]:
+        return _paced(start, fixed, False)
+    old_timeout = hf_gen.timeout
+    try:
+        hf_gen.timeout = int(timeout*1000)
+        done = query("hf_gen", "*OPC?").strip() == "1"
+    except Exception as err:
+        print("HF generator does not confirm settling ("+str(err)+")")
+        hf_gen.clear()
+        done = False
+    finally:
+        hf_gen.timeout = old_timeout
+    return _paced(start, fixed, done, "generator")
+
+def pacing_report(reset=True):
+    # time spent waiting compared to the fixed sleeps
+    s = pacing_stats
+    report = "waited {:.1f} s instead of {:.1f} s (saved {:.1f} s, {} confirmed, {} fixed sleeps)".format(
+        s["waited"], s["fixed"], s["fixed"]-s["waited"], s["confirmed"], s["fallbacks"])
+    if reset:
+        s.update(waited=0.0, fixed=0.0, confirmed=0, fallbacks=0)
+    return report
@@ -0,0 +1,72 @@
+from collections import namedtuple
+import numpy as np
+from scipy.ndimage import uniform_filter1d, correlate1d
+
+# Dip depth (MMD) of zero-span traces, for a batch of traces at once
+# (2d array shots x samples, a single trace is a batch of one).
+# Methods:
+#   legacy    mean of the first baseline_points samples - min of the samples
+#             after the first (MeasurementScript.py)
+#   lifetime  mean of the first baseline_points samples - min of all samples
+#             (Lifetime.py before)
+#   smoothed  like legacy, but the minimum of the moving average over width
+#             samples, a single noisy sample does not dominate the depth
+#   matched   amplitude of the best fitting Gaussian dip with a standard
+#             deviation of template_width samples (matched filter, least
+#             squares amplitude at every position)
+# measure() returns the mean and std over the shots and the depth of every
+# shot, with reject the shots further than reject_k robust standard
+# deviations (MAD) from the median are not used for mean and std.
+
+Result = namedtuple('Result', ['mean', 'std', 'values', 'valid'])
+
+baseline_points = 10
+width = 5           # samples of the moving average of smoothed
+template_width = 17 # samples, standard deviation of the dip for matched (adjust to the sweep time)
+reject_k = 3.5
+
+
+def _batch(traces):
+    traces = np.asarray(traces, dtype=float)
+    return traces[None, :] if traces.ndim == 1 else traces
+
+
+def depths(traces, method='legacy', baseline_points=baseline_points, width=width, template_width=template_width):
+    """Dip depth of every trace (1d array, one value per shot)."""
+    traces = _batch(traces)
+    baseline = traces[:, :baseline_points].mean(axis=1)
+    if method == 'legacy':
+        return baseline - traces[:, 1:].min(axis=1)
+    if method == 'lifetime':
+        return baseline - traces.min(axis=1)
+    if method == 'smoothed':
+        return baseline - uniform_filter1d(traces[:, 1:], width, axis=1, mode='nearest').min(axis=1)
+    if method == 'matched':
+        x = np.arange(-3*template_width, 3*template_width + 1)
+        template = np.exp(-0.5*(x/template_width)**2)
+        template /= np.sum(template**2)     # least squares amplitude of a dip with this shape
+        dips = baseline[:, None] - traces
+        return correlate1d(dips, template, axis=1, mode='nearest').max(axis=1)
+    raise ValueError("unknown method " + repr(method))
+
+
+def outliers(values, k=reject_k):
+    """True for the values further than k robust standard deviations from the median."""
+    values = np.asarray(values, dtype=float)
+    median = np.median(values)
+    mad = 1.4826*np.median(np.abs(values - median))
+    if not mad > 0:
+        return np.zeros(len(values), dtype=bool)
+    return np.abs(values - median) > k*mad
+
+
+def measure(traces, method='legacy', reject=False, **kwargs):
+    """Result(mean, std, values, valid) of a batch of traces, valid: shots used for mean and std."""
+    values = depths(traces, method, **kwargs)
+    valid = ~outliers(values) if reject and len(values) > 2 else np.ones(len(values), dtype=bool)
+    return Result(np.mean(values[valid]), np.std(values[valid]), values, valid)
+
+
+def mmd(data):
+    # MMD of a single trace like in MeasurementScript.py
+    return depths(data)[0]
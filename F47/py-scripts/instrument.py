@@ -0,0 +1,227 @@
+import os
+import time
+import json
+import inspect
+import threading
+import functools
+
+# Opt-in timing of the acquisition: spans (name, category, start, duration)
+# of the functions of devices.py, the scan loops, every VISA/serial transfer
+# and every time.sleep, plus the retries of the readout loops with the error
+# that caused them. Nothing is recorded until enable() is called.
+#   instrument.enable(devices, traces, MeasurementScript)
+#   ...
+#   instrument.write_trace('timeline.json')   # chrome://tracing or ui.perfetto.dev
+#   print(instrument.summary())
+# For every (category, name) a histogram with power of two buckets (in us) is
+# kept, so the summary also works when the timeline is longer than max_events.
+# The breakdown by category uses the self time of the spans (without the
+# spans inside), e.g. a scan step = visa + serial + sleep + host computation.
+
+#---Settings------------------------------------------------
+max_events = 500000     # spans kept for the timeline
+#-----------------------------------------------------------
+
+enabled = False
+events = []     # (name, category, start, duration, thread, args)
+marks = []      # (name, time, thread, args), retries and errors
+stats = {}      # (category, name) -> [count, total, self time, max, buckets]
+retries = {}    # (where, cause) -> count
+_wrapped = []   # (module, name, original function)
+_local = threading.local()
+_lock = threading.Lock()
+_sleep = time.sleep
+t0 = time.perf_counter()
+
+
+class _Span:
+    __slots__ = ('name', 'cat', 'args', 'start', 'children')
+
+    def __init__(self, name, cat, args):
+        self.name, self.cat, self.args = name, cat, args
+
+    def __enter__(self):
+        stack = _stack()
+        stack.append(self)
+        self.children = 0.0
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        duration = end - self.start
+        stack = _stack()
+        stack.pop()
+        if stack:
+            stack[-1].children += duration
+        if exc_type is not None:
+            mark('error', name=self.name, cause=_cause(exc))
+        _record(self.name, self.cat, self.start, duration, duration - self.children, self.args)
+        return False
+
+
+class _NoSpan:
+    # returned by span() while disabled
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_no_span = _NoSpan()
+
+
+def _stack():
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
+
+
+def _cause(err):
+    return '{}: {}'.format(type(err).__name__, str(err)[:80]) if err is not None else 'unknown'
+
+
+def _record(name, cat, start, duration, self_time, args):
+    bucket = int(duration*1e6).bit_length()
+    with _lock:
+        s = stats.get((cat, name))
+        if s is None:
+            s = stats[(cat, name)] = [0, 0.0, 0.0, 0.0, [0]*48]
+        s[0] += 1
+        s[1] += duration
+        s[2] += self_time
+        s[3] = max(s[3], duration)
+        s[4][min(bucket, 47)] += 1
+    if len(events) < max_events:
+        events.append((name, cat, start, duration, threading.get_ident(), args))
+
+
+def span(name, cat='host', **args):
+    """Context manager which records the time of the block (does nothing while disabled)."""
+    if not enabled:
+        return _no_span
+    return _Span(name, cat, args or None)
+
+
+def mark(name, **args):
+    """Instant event in the timeline, e.g. a retry."""
+    if enabled:
+        marks.append((name, time.perf_counter(), threading.get_ident(), args))
+
+
+def retry(where, err=None):
+    """Counts a retry of a readout loop with the error that caused it."""
+    if not enabled:
+        return
+    cause = _cause(err)
+    with _lock:
+        retries[(where, cause)] = retries.get((where, cause), 0) + 1
+    mark('retry', where=where, cause=cause)
+
+
+def traced(func, cat):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return func(*args, **kwargs)
+        with _Span(func.__name__, cat, None):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _traced_sleep(seconds):
+    with span('sleep', 'sleep'):
+        _sleep(seconds)
+
+
+def enable(*modules):
+    """Starts recording, the functions of modules (e.g. devices) and time.sleep are recorded as spans."""
+    global enabled, t0
+    if not enabled:
+        reset()
+        t0 = time.perf_counter()
+    enabled = True
+    if time.sleep is _sleep:
+        time.sleep = _traced_sleep
+    for module in modules:
+        cat = module.__name__
+        for name, func in list(vars(module).items()):
+            if (inspect.isfunction(func) and func.__module__ == module.__name__
+                    and not name.startswith('_') and not hasattr(func, '__wrapped__')):
+                setattr(module, name, traced(func, cat))
+                _wrapped.append((module, name, func))
+
+
+def disable():
+    """Stops recording and restores the functions and time.sleep (the data is kept)."""
+    global enabled
+    enabled = False
+    if time.sleep is _traced_sleep:
+        time.sleep = _sleep
+    while _wrapped:
+        module, name, func = _wrapped.pop()
+        setattr(module, name, func)
+
+
+def reset():
+    del events[:]
+    del marks[:]
+    stats.clear()
+    retries.clear()
+
+
+def write_trace(fname):
+    """Writes the spans and marks as Chrome trace (json), open it in ui.perfetto.dev or chrome://tracing."""
+    pid = os.getpid()
+    threads = {t.ident: t.name for t in threading.enumerate()}
+    trace = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': threads.get(tid, str(tid))}}
+             for tid in set(e[4] for e in events)]
+    for name, cat, start, duration, tid, args in events:
+        event = {'name': name, 'cat': cat, 'ph': 'X', 'pid': pid, 'tid': tid,
+                 'ts': round((start - t0)*1e6, 1), 'dur': round(duration*1e6, 1)}
+        if args:
+            event['args'] = args
+        trace.append(event)
+    for name, t, tid, args in marks:
+        trace.append({'name': name, 'ph': 'i', 's': 't', 'pid': pid, 'tid': tid,
+                      'ts': round((t - t0)*1e6, 1), 'args': args})
+    with open(fname, 'w') as file:
+        json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, file)
+
+
+def _percentile(s, q):
+    # q-quantile of the histogram, interpolated in its bucket and at most the maximum, in s
+    buckets = s[4]
+    target = q*s[0]
+    count = 0
+    for b, k in enumerate(buckets):
+        if k and count + k >= target:
+            lower, upper = (2**(b-1) if b else 0)*1e-6, (2**b)*1e-6
+            return min(lower + (upper - lower)*(target - count)/k, s[3])
+        count += k
+    return s[3]
+
+
+def summary(top=25):
+    """Table of the time per category (self time) and of the slowest commands/functions."""
+    wall = time.perf_counter() - t0
+    lines = ['time per category ({:.1f} s since enable):'.format(wall)]
+    by_cat = {}
+    for (cat, name), s in stats.items():
+        by_cat[cat] = by_cat.get(cat, 0.0) + s[2]
+    for cat, t in sorted(by_cat.items(), key=lambda item: -item[1]):
+        lines.append('  {:<20} {:9.3f} s {:5.1f} %'.format(cat, t, 100*t/wall if wall > 0 else 0))
+    lines.append('{:<12} {:<32} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+        'category', 'name', 'calls', 'total s', 'mean ms', 'p50 ms', 'p99 ms', 'max ms'))
+    for (cat, name), s in sorted(stats.items(), key=lambda item: -item[1][1])[:top]:
+        lines.append('{:<12} {:<32} {:>7} {:9.3f} {:9.3f} {:9.3f} {:9.3f} {:9.3f}'.format(
+            cat[:12], name[:32], s[0], s[1], s[1]/s[0]*1e3, _percentile(s, 0.5)*1e3,
+            _percentile(s, 0.99)*1e3, s[3]*1e3))
+    if retries:
+        lines.append('retries:')
+        for (where, cause), n in sorted(retries.items(), key=lambda item: -item[1]):
+            lines.append('  {:>5} x {} ({})'.format(n, where, cause))
+    return '\n'.join(lines)
@@ -0,0 +1,69 @@
+import numpy as np
+from scipy.optimize import curve_fit
+
+# Fit of the storage time with the model of Lifetime_Analysis.py and the choice
+# of the next wait time for the online mode of Lifetime.py.
+# The next point is the one that reduces the variance of tau most per second
+# of beam time (locally optimal design): for a point at wait time t with n
+# shots the information matrix of the fit grows by n/sigma^2 * g g^T, where g
+# is the gradient of the model with respect to (N0, tau, off).
+
+guess = (300, 60, 1)
+
+
+def fit_func(t, N0, tau, off):
+    return N0*np.exp(-t/tau) + off
+
+
+def gradient(t, popt):
+    N0, tau, off = popt
+    e = np.exp(-np.asarray(t, dtype=float)/tau)
+    return np.array([e, N0*t/tau**2*e, np.ones_like(e)])
+
+
+def fit(wait, mmd, std, n, p0=guess, pooled=False):
+    """
+    Weighted fit with the standard errors of the averaged MMDs, returns popt, pcov.
+    pooled: the same single shot noise (shot_sigma) for all points, more robust
+    than the std of a few shots.
+    """
+    wait, mmd, std, n = (np.asarray(a, dtype=float) for a in (wait, mmd, std, n))
+    if pooled:
+        sigma = np.full(len(wait), shot_sigma(std, n)) / np.sqrt(n)
+        return curve_fit(fit_func, wait, mmd, sigma=sigma, p0=p0, absolute_sigma=True, maxfev=100000)
+    sigma = np.maximum(std, 0.05*np.median(std[std > 0]) if np.any(std > 0) else 1.0) / np.sqrt(n)
+    return curve_fit(fit_func, wait, mmd, sigma=sigma, p0=p0, maxfev=100000)
+
+
+def shot_sigma(std, n):
+    # pooled standard deviation of a single shot (std of the points with ddof=0 like np.std)
+    std, n = np.asarray(std, dtype=float), np.asarray(n, dtype=float)
+    dof = np.sum(n - 1)
+    return np.sqrt(np.sum(n*std**2) / dof) if dof > 0 else 1.0
+
+
+def information(wait, n, popt, sigma):
+    g = gradient(wait, popt)
+    return (g * (np.asarray(n, dtype=float)/sigma**2)) @ g.T
+
+
+def tau_variance(info):
+    return np.linalg.pinv(info)[1, 1]
+
+
+def next_point(candidates, shot_time, wait, n, popt, sigma, averages=(3, 5, 10)):
+    """
+    Best (t, averages) of the candidate wait times t and numbers of averages.
+    shot_time(t) is the time in s of one shot at wait time t.
+    """
+    info = information(wait, n, popt, sigma)
+    var = tau_variance(info)
+    best, best_gain = None, -np.inf
+    for t in candidates:
+        g = gradient(t, popt)
+        step = np.outer(g, g) / sigma**2
+        for k in averages:
+            gain = (var - tau_variance(info + k*step)) / (k*shot_time(t))
+            if gain > best_gain:
+                best, best_gain = (t, k), gain
+    return best
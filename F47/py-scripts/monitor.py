@@ -0,0 +1,238 @@
+import os
+import sys
+import time
+import subprocess
+from multiprocessing import shared_memory
+import numpy as np
+
+# Live monitor of the acquisition: the measurement loop puts every trace with
+# its frequency and MMD into a ring buffer in shared memory (feed), a separate
+# plot process shows the latest trace and the MMD of the last shots.
+# feed() only copies the trace into the buffer, it never waits for the plot
+# process. The plot process can be closed at any time and attached again, also
+# from another terminal with: python monitor.py <name>
+#   monitor.start()                       # in the measurement script
+#   monitor.feed(data, f, mmd(data))      # after every shot
+#
+# Layout of the shared memory:
+#   header  int64[4]          sequence number of the last shot, capacity, trace length, closed
+#   meta    float64[cap, 4]   sequence number, f, MMD, number of points of the trace
+#   traces  float32[cap, trace length]
+# A slot is marked with sequence number -1 while it is written, the reader
+# drops a trace if the slot changed while it was copied.
+
+#---Settings------------------------------------------------
+capacity = 256      # shots in the ring buffer
+trace_length = 601  # points of a DSA815 trace
+fps = 10            # maximal frame rate of the plot
+points = 600        # points of the plotted trace (min/max decimation)
+history = 2000      # shots in the MMD plot
+#-----------------------------------------------------------
+
+active = None   # Monitor of this process, see start()
+_created = set()    # names of the buffers created by this process
+
+
+class Ring:
+    """Ring buffer of traces in shared memory (create=True: new buffer, else attach by name)."""
+
+    def __init__(self, name=None, create=True, capacity=capacity, trace_length=trace_length):
+        if create:
+            size = 32 + capacity*4*8 + capacity*trace_length*4
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            header = np.ndarray(4, dtype=np.int64, buffer=self.shm.buf)
+            header[:] = (-1, capacity, trace_length, 0)
+            _created.add(self.shm.name)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if os.name == 'posix' and self.shm.name not in _created:
+                # only the creating process may unlink the buffer when it exits
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+            header = np.ndarray(4, dtype=np.int64, buffer=self.shm.buf)
+            capacity, trace_length = int(header[1]), int(header[2])
+        self.name = self.shm.name
+        self.capacity, self.trace_length = capacity, trace_length
+        self.header = header
+        self.meta = np.ndarray((capacity, 4), dtype=np.float64, buffer=self.shm.buf, offset=32)
+        self.traces = np.ndarray((capacity, trace_length), dtype=np.float32, buffer=self.shm.buf,
+                                 offset=32 + capacity*4*8)
+        self.creator = create
+
+    def push(self, trace, f=np.nan, mmd=np.nan):
+        seq = int(self.header[0]) + 1
+        slot = seq % self.capacity
+        trace = np.asarray(trace).ravel()[:self.trace_length]
+        self.meta[slot, 0] = -1
+        self.traces[slot, :len(trace)] = trace
+        self.meta[slot, 1:] = (f, mmd, len(trace))
+        self.meta[slot, 0] = seq
+        self.header[0] = seq
+
+    def last(self):
+        return int(self.header[0])
+
+    def read(self, seq):
+        """(f, mmd, trace) of shot seq, None if it was overwritten."""
+        slot = seq % self.capacity
+        if self.meta[slot, 0] != seq:
+            return None
+        f, mmd, n = self.meta[slot, 1:]
+        trace = self.traces[slot, :int(n)].copy()
+        if self.meta[slot, 0] != seq:
+            return None
+        return f, mmd, trace
+
+    def read_meta(self, start, stop):
+        """(seq, f, mmd) of the shots start..stop-1 which are still in the buffer."""
+        seqs = np.arange(max(start, stop - self.capacity), stop)
+        meta = self.meta[seqs % self.capacity]
+        valid = meta[:, 0] == seqs
+        return seqs[valid], meta[valid, 1], meta[valid, 2]
+
+    @property
+    def closed(self):
+        return bool(self.header[3])
+
+    def close(self):
+        if self.creator:
+            self.header[3] = 1
+        self.shm.close()
+        if self.creator:
+            self.shm.unlink()
+
+
+class Monitor:
+    """Ring buffer of this process and the plot process which shows it."""
+
+    def __init__(self, capacity=capacity, trace_length=trace_length):
+        self.ring = Ring(capacity=capacity, trace_length=trace_length)
+        self.process = None
+
+    def feed(self, trace, f=np.nan, mmd=np.nan):
+        self.ring.push(trace, f, mmd)
+
+    def attach(self, fps=fps):
+        """Starts the plot process (if it is not running)."""
+        if self.process is None or self.process.poll() is not None:
+            # a new interpreter, so the measurement script is not imported again
+            self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), self.ring.name, str(fps)])
+        return self.process
+
+    def detach(self):
+        """Closes the plot process, the acquisition keeps on feeding the buffer."""
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+        self.process = None
+
+    def close(self):
+        self.detach()
+        self.ring.close()
+
+
+def start(plot=True, fps=fps):
+    """Creates the monitor of this process (and starts the plot process), feed() then fills it."""
+    global active
+    if active is None:
+        active = Monitor()
+        print("monitor: python monitor.py {}".format(active.ring.name))
+    if plot:
+        active.attach(fps)
+    return active
+
+
+def feed(trace, f=np.nan, mmd=np.nan):
+    # does nothing if no monitor was started
+    if active is not None:
+        active.feed(trace, f, mmd)
+
+
+def stop():
+    global active
+    if active is not None:
+        active.close()
+        active = None
+
+
+def plot(name, fps=fps, show=True, frames=None):
+    """Plot loop of the plot process, reads the ring buffer name until it is closed (or for frames frames)."""
+    import matplotlib
+    if not show:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import decimate
+
+    ring = Ring(name, create=False)
+    fig, (ax_trace, ax_mmd) = plt.subplots(2, 1, figsize=(8, 6))
+    fig.subplots_adjust(hspace=0.4)
+    trace_line, = ax_trace.plot([], [], lw=0.8, animated=True)
+    mmd_line, = ax_mmd.plot([], [], '.', ms=2, animated=True)
+    label = ax_trace.text(0.01, 0.95, '', transform=ax_trace.transAxes, va='top', animated=True)
+    ax_trace.set_xlabel('point')
+    ax_trace.set_ylabel('Amplitude[a.u]')
+    ax_mmd.set_xlabel('shot')
+    ax_mmd.set_ylabel('MMD')
+    artists = (trace_line, mmd_line, label)
+    if show:
+        plt.show(block=False)
+    fig.canvas.draw()
+    background = fig.canvas.copy_from_bbox(fig.bbox)
+
+    seqs, mmds = np.empty(0), np.empty(0)
+    last = -1
+    frame = 0
+    while not ring.closed and (frames is None or frame < frames) and (not show or plt.fignum_exists(fig.number)):
+        frame_start = time.perf_counter()
+        seq = ring.last()
+        if seq > last:
+            s, f, m = ring.read_meta(last + 1, seq + 1)
+            seqs, mmds = np.append(seqs, s)[-history:], np.append(mmds, m)[-history:]
+            shot = ring.read(seq)
+            last = seq
+            rescale = False
+            if shot is not None:
+                f, m, trace = shot
+                x, y = decimate.minmax(np.arange(len(trace)), trace, points)
+                trace_line.set_data(x, y)
+                label.set_text('shot {}  f = {:.3f} MHz  MMD = {:.2f}'.format(seq, f, m))
+                rescale |= _outside(ax_trace, x, y)
+            mmd_line.set_data(seqs, mmds)
+            rescale |= _outside(ax_mmd, seqs, mmds)
+            if rescale:
+                # new limits: full redraw, then blitting again
+                for ax in (ax_trace, ax_mmd):
+                    ax.relim()
+                    ax.autoscale_view()
+                for artist in artists:
+                    artist.set_visible(False)
+                fig.canvas.draw()
+                background = fig.canvas.copy_from_bbox(fig.bbox)
+                for artist in artists:
+                    artist.set_visible(True)
+            fig.canvas.restore_region(background)
+            for artist in artists:
+                fig.draw_artist(artist)
+            fig.canvas.blit(fig.bbox)
+        fig.canvas.flush_events()
+        frame += 1
+        time.sleep(max(1/fps - (time.perf_counter() - frame_start), 0.001))
+    plt.close(fig)
+    ring.close()
+    return frame
+
+
+def _outside(ax, x, y):
+    # True if the data does not fit into the axis limits
+    if len(x) == 0:
+        return False
+    x0, x1 = ax.get_xlim()
+    y0, y1 = ax.get_ylim()
+    ymin, ymax = np.nanmin(y), np.nanmax(y)
+    if not (np.isfinite(ymin) and np.isfinite(ymax)):
+        return False
+    return np.min(x) < x0 or np.max(x) > x1 or ymin < y0 or ymax > y1
+
+if __name__ == '__main__':
+    # plot process: python monitor.py <name> [fps]
+    plot(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else fps)
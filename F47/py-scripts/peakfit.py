@@ -0,0 +1,92 @@
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from scipy.optimize import curve_fit
+
+# Fits of the resonances in the MMD spectra with the super-Gaussian model of
+# F47_Auswertung.ipynb:
+#   C_PI(x, a, b, c, y, n) = c*exp(-((x-a)/b)^(2n)) + y
+# Many (spectrum, window) jobs are fitted at once on a process pool, with the
+# analytic Jacobian of the model and initial guesses from the data (position
+# and depth of the minimum, width at half depth). The results are Peak records
+# like in the notebook, the error of f is max(error of a, |b|) like in fit_peak.
+#   jobs = [peakfit.Job(A1_30, (1930, 2000), n=1, I=1.3, U=40, P_e=10), ...]
+#   peaks = [result.peak for result in peakfit.fit_peaks(jobs)]
+
+Peak = namedtuple('Peak', ['I', 'U', 'P_e', 'f', 'sigma'])
+
+# data: (f, mmd) like np.genfromtxt(..., unpack=True), indices: (start, stop) in data,
+# guess: [a, b, c, y] or None (from the data)
+Job = namedtuple('Job', ['data', 'indices', 'n', 'guess', 'I', 'U', 'P_e'])
+Job.__new__.__defaults__ = (1, None, None, None, None)
+
+# peak, popt, pcov and n like the return value of fit_peak in the notebook
+Result = namedtuple('Result', ['peak', 'popt', 'pcov', 'n'])
+
+
+def C_PI(x, a, b, c, y, n=1):
+    return c*np.exp(-np.power((x-a)/b, 2*n)) + y
+
+
+def C_PI_jacobian(x, a, b, c, y, n=1):
+    # derivatives with respect to a, b, c, y
+    u = (x-a)/b
+    u2n = np.power(u, 2*n)
+    e = np.exp(-u2n)
+    d_u = c*e*2*n*np.power(u, 2*n-1)    # -d/du of c*exp(-u^2n)
+    return np.stack([d_u/b, d_u*u/b, e, np.ones_like(x)], axis=-1)
+
+
+def window_indices(data, f_min, f_max):
+    """(start, stop) of the points with f_min <= f < f_max."""
+    f = np.asarray(data[0])
+    return int(np.searchsorted(f, f_min)), int(np.searchsorted(f, f_max))
+
+
+def initial_guess(x, y, n=1):
+    """[a, b, c, y]: minimum, width at half depth, depth and baseline of the window."""
+    edge = max(len(y)//10, 1)
+    baseline = np.median(np.concatenate([y[:edge], y[-edge:]]))
+    i = int(np.argmin(y))
+    depth = y[i] - baseline
+    below = y < baseline + depth/2
+    lo, hi = i, i
+    while lo > 0 and below[lo-1]:
+        lo -= 1
+    while hi < len(y)-1 and below[hi+1]:
+        hi += 1
+    half_width = max((x[hi] - x[lo])/2, np.min(np.abs(np.diff(x))) if len(x) > 1 else 1.0)
+    # C_PI drops to half depth at |x-a| = b*ln(2)^(1/2n)
+    return [x[i], half_width/np.log(2)**(1/(2*n)), depth, baseline]
+
+
+def fit_peak(job):
+    """Fits one job, returns a Result (f and sigma are NaN if the fit fails)."""
+    i0, i1 = job.indices
+    x = np.asarray(job.data[0][i0:i1], dtype=float)
+    y = np.asarray(job.data[1][i0:i1], dtype=float)
+    n = job.n
+    guess = initial_guess(x, y, n) if job.guess is None else job.guess
+    try:
+        popt, pcov = curve_fit(lambda x, a, b, c, y: C_PI(x, a, b, c, y, n), x, y, p0=guess,
+                               jac=lambda x, a, b, c, y: C_PI_jacobian(x, a, b, c, y, n), maxfev=10000)
+    except (RuntimeError, ValueError) as err:
+        print('fit of {} failed ({})'.format(job[4:], err))
+        nan = np.full(4, np.nan)
+        return Result(Peak(job.I, job.U, job.P_e, np.nan, np.nan), nan, np.full((4, 4), np.nan), n)
+    peak_err = pcov[0][0]**0.5
+    width = np.abs(popt[1])
+    if width > peak_err:
+        peak_err = width
+    return Result(Peak(job.I, job.U, job.P_e, popt[0], peak_err), popt, pcov, n)
+
+
+def fit_peaks(jobs, processes=None, chunksize=4):
+    """Fits all jobs on a pool of processes (processes=1: in this process), results in job order."""
+    # only the windows are sent to the worker processes
+    jobs = [job._replace(data=(job.data[0][job.indices[0]:job.indices[1]], job.data[1][job.indices[0]:job.indices[1]]),
+                         indices=(0, job.indices[1]-job.indices[0])) for job in jobs]
+    if processes == 1 or len(jobs) < 2:
+        return [fit_peak(job) for job in jobs]
+    with ProcessPoolExecutor(processes) as pool:
+        return list(pool.map(fit_peak, jobs, chunksize=chunksize))
@@ -0,0 +1,237 @@
+import os
+import time
+from collections import namedtuple
+import numpy as np
+from scipy.ndimage import uniform_filter1d
+from scipy.signal import find_peaks
+
+import trap
+import peakfit
+from catalog import Catalog
+
+# Automatic identification of the resonances of a whole F47 campaign, without
+# the hand-picked index windows of F47_Auswertung.ipynb:
+#   1. the scans (csv files) are grouped into settings (I, U, P_e), the three
+#      frequency ranges of a setting are measured one after the other
+#   2. the dips of every scan are found with find_peaks on the smoothed -MMD,
+#      only dips deeper than min_snr times the noise of the scan are used
+#   3. the dips are matched to the lines expected from trap.trap_frequencies,
+#      first the fundamental modes (magnetron, axial, cyclotron), then the
+#      modified cyclotron frequency f_+ = f_c - f_- and the side bands from
+#      the found fundamental frequencies. A line gets the dip with the largest
+#      prominence * exp(-((f - f_expected)/tolerance)^2/2)
+#   4. the theory is off by a constant factor for every mode (the magnetron
+#      frequency is about 30% higher than predicted), so the matching is done
+#      a second time with the expected frequencies scaled by the median ratio
+#      found/expected over the campaign
+#   5. all lines are fitted at once with peakfit.fit_peaks, the window of a
+#      line is window_widths half widths of its dip (at most up to the middle
+#      to the next line)
+#   6. a fit is only used if it stayed on its dip (within max_fit_offset
+#      fitted widths) and inside the window the line was matched in, else the
+#      line is missing in the tables (e.g. a side band that merged into the
+#      broad axial dip instead of a second AXIAL entry)
+#   tables = peakid.campaign('../data')
+#   tables['MAGNETRON']     # list of peakfit.Peak like MAGNETRON in the notebook
+
+#---Settings------------------------------------------------
+min_snr = 10        # prominence of a dip / noise of the scan
+smooth = 3          # points of the moving average before find_peaks
+min_width = 1       # points at half depth
+min_fit_width = 1.2 # frequency steps, narrower fits are spikes, not resolved resonances
+window_widths = 3   # fit window: +- this many half widths of the dip
+min_half_width = 4  # points
+# relative tolerance of the fundamental modes, MHz for the derived lines
+tolerance = {'MAGNETRON': 0.5, 'AXIAL': 0.1, 'ZYKLOTRON': 0.01}
+derived_tolerance = 2.0
+max_distance = 3    # tolerances, farther dips are not used
+max_fit_offset = 2  # fitted widths between the fitted frequency and its dip
+#-----------------------------------------------------------
+
+# fundamental modes -> key of trap.trap_frequencies, in the order of the matching
+fundamental = {'MAGNETRON': 'minus', 'AXIAL': 'z', 'ZYKLOTRON': 'c'}
+# derived lines: sum of (factor, mode) of the found (else expected) frequencies,
+# only if at least one of the modes was found
+derived = {
+    'MOD': ((1, 'ZYKLOTRON'), (-1, 'MAGNETRON')),
+    'AXIAL+MAGNETRON': ((1, 'AXIAL'), (1, 'MAGNETRON')),
+    'AXIAL-MAGNETRON': ((1, 'AXIAL'), (-1, 'MAGNETRON')),
+    'MOD+AXIAL': ((1, 'MOD'), (1, 'AXIAL')),
+    'MOD-AXIAL': ((1, 'MOD'), (-1, 'AXIAL')),
+}
+# the tables of the notebook
+modes = ('MAGNETRON', 'AXIAL', 'MOD', 'ZYKLOTRON')
+
+# scans: the catalog scans of the setting (one per frequency range)
+Setting = namedtuple('Setting', ['I', 'U', 'P_e', 'scans'])
+
+# dips of a scan found by find_dips, arrays in MHz (f) and points (left, right)
+Dips = namedtuple('Dips', ['f', 'index', 'prominence', 'left', 'right', 'noise'])
+
+# one identified line: setting index, mode, expected and dip frequency, scan
+# index in the setting, fit window (start, stop) in the scan and the peakfit.Result
+Line = namedtuple('Line', ['setting', 'mode', 'expected', 'f_dip', 'scan', 'indices', 'result'])
+
+
+def group_settings(scans):
+    """
+    Settings of a campaign: consecutive scans (in file name order) with the same
+    I, U and P_e and different frequency ranges.
+    """
+    settings = []
+    for scan in scans:
+        if scan.attrs is None:
+            continue
+        key = (scan.ccurrent, scan.rvolt, scan.excitation_power)
+        ranges = [(s.freq_min, s.freq_max) for s in settings[-1].scans] if settings else []
+        if not settings or settings[-1][:3] != key or (scan.freq_min, scan.freq_max) in ranges:
+            settings.append(Setting(*key, scans=[]))
+        settings[-1].scans.append(scan)
+    return settings
+
+
+def noise_level(y):
+    # robust standard deviation of the points from the differences of neighbours
+    return 1.4826*np.median(np.abs(np.diff(y))) / np.sqrt(2)
+
+
+def find_dips(f, mmd, min_snr=min_snr, smooth=smooth, min_width=min_width):
+    """Dips of one scan, deeper than min_snr times its noise (of the smoothed MMD)."""
+    f, mmd = np.asarray(f, dtype=float), np.asarray(mmd, dtype=float)
+    noise = noise_level(uniform_filter1d(mmd, smooth) if smooth > 1 else mmd)
+    y = uniform_filter1d(mmd, smooth) if smooth > 1 else mmd
+    index, props = find_peaks(-y, prominence=min_snr*noise, width=min_width, rel_height=0.5)
+    return Dips(f[index], index, props['prominences'], props['left_ips'], props['right_ips'], noise)
+
+
+def expected(I, U, scale=None):
+    """Expected frequencies of the fundamental modes in MHz (times scale[mode])."""
+    theory = trap.trap_frequencies(I, U)
+    return {mode: float(theory[key]) * (scale or {}).get(mode, 1.0) for mode, key in fundamental.items()}
+
+
+def line_tolerance(mode, f_expected):
+    # width of the expected frequency used for the matching, in MHz
+    return tolerance[mode]*f_expected if mode in tolerance else derived_tolerance
+
+
+def _best_dip(candidates, f_expected, sigma, used):
+    best, best_score = None, 0.0
+    for i, k, f, prominence in candidates:
+        if (i, k) in used or abs(f - f_expected) > max_distance*sigma:
+            continue
+        score = prominence * np.exp(-0.5*((f - f_expected)/sigma)**2)
+        if score > best_score:
+            best, best_score = (i, k), score
+    return best
+
+
+def match(setting, dips, scale=None):
+    """
+    Lines of one setting: mode -> (expected f, scan index, dip index).
+    dips: list of Dips of the scans of the setting.
+    """
+    candidates = [(i, k, f, p) for i, d in enumerate(dips) for k, (f, p) in enumerate(zip(d.f, d.prominence))]
+    lines, found = {}, {}
+
+    def take(mode, f_expected, sigma):
+        best = _best_dip(candidates, f_expected, sigma, set(line[1:] for line in lines.values()))
+        if best is not None:
+            lines[mode] = (f_expected, ) + best
+            found[mode] = dips[best[0]].f[best[1]]
+
+    theory = expected(setting.I, setting.U, scale)
+    for mode, f in theory.items():
+        take(mode, f, line_tolerance(mode, f))
+    theory['MOD'] = theory['ZYKLOTRON'] - theory['MAGNETRON']
+    for mode, terms in derived.items():
+        if not any(m in found for _, m in terms):
+            continue    # nothing of this line was seen, e.g. no electrons in the trap
+        f = sum(factor*found.get(m, theory[m]) for factor, m in terms)
+        take(mode, f, line_tolerance(mode, f))
+    return lines
+
+
+def calibration(matches, dips):
+    """Median ratio found/expected of the fundamental modes over the campaign."""
+    scale = {}
+    for mode in fundamental:
+        ratios = [d[m[mode][1]].f[m[mode][2]] / m[mode][0] for m, d in zip(matches, dips) if mode in m]
+        if ratios:
+            scale[mode] = float(np.median(ratios))
+    return scale
+
+
+def fit_window(dips, k, others, n_points):
+    """(start, stop) of the fit of dip k of a scan, others: indices of the other lines in the scan."""
+    center = dips.index[k]
+    half = max((dips.right[k] - dips.left[k]) / 2, min_half_width)
+    start = int(np.floor(center - window_widths*half))
+    stop = int(np.ceil(center + window_widths*half)) + 1
+    for other in others:
+        if other < center:
+            start = max(start, (other + center)//2 + 1)
+        elif other > center:
+            stop = min(stop, (other + center + 1)//2)
+    return max(start, 0), min(stop, n_points)
+
+
+def identify(scans, calibrate=True, processes=1):
+    """
+    Identified and fitted lines of a campaign (a Catalog or a list of scans),
+    returns the settings and the list of Line records.
+    """
+    settings = group_settings(scans)
+    dips = [[find_dips(scan.f, scan.mmd) for scan in setting.scans] for setting in settings]
+    matches = [match(setting, d) for setting, d in zip(settings, dips)]
+    scale = None
+    if calibrate:
+        scale = calibration(matches, dips)
+        matches = [match(setting, d, scale) for setting, d in zip(settings, dips)]
+
+    lines, jobs = [], []
+    for s, (setting, m, d) in enumerate(zip(settings, matches, dips)):
+        for mode, (f_expected, i, k) in m.items():
+            others = [d[i].index[kk] for _, ii, kk in m.values() if ii == i and kk != k]
+            scan = setting.scans[i]
+            indices = fit_window(d[i], k, others, len(scan.f))
+            lines.append(Line(s, mode, f_expected, float(d[i].f[k]), i, indices, None))
+            jobs.append(peakfit.Job(scan.data, indices, 1, None, setting.I, setting.U, setting.P_e))
+    results = peakfit.fit_peaks(jobs, processes=processes)
+    lines = [line._replace(result=result) for line, result in zip(lines, results)]
+    return settings, lines
+
+
+def valid(line, settings):
+    # fit converged inside its window, the width is between min_fit_width steps and the window,
+    # the fit stayed on its dip and in the range in which the line was matched
+    f = settings[line.setting].scans[line.scan].f
+    lo, hi = f[line.indices[0]], f[line.indices[1]-1]
+    step = (hi - lo) / max(line.indices[1] - line.indices[0] - 1, 1)
+    peak = line.result.peak
+    if not (np.isfinite(peak.f) and lo <= peak.f <= hi and min_fit_width*step < peak.sigma < hi - lo):
+        return False
+    return bool(abs(peak.f - line.f_dip) <= max_fit_offset*peak.sigma and
+                abs(peak.f - line.expected) <= max_distance*line_tolerance(line.mode, line.expected))
+
+
+def tables(settings, lines, modes=modes):
+    """mode -> list of peakfit.Peak in the order of the campaign, like the tables of the notebook."""
+    return {mode: [line.result.peak for line in lines if line.mode == mode and valid(line, settings)]
+            for mode in modes}
+
+
+def campaign(path='.', pattern='*.csv', modes=modes, processes=1):
+    """Mode versus parameter tables of all scans in path in one call."""
+    return tables(*identify(Catalog(path, pattern), processes=processes), modes=modes)
+
+
+if __name__ == '__main__':
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+    start = time.perf_counter()
+    result = campaign(data_dir, modes=tuple(fundamental) + tuple(derived))
+    print('{:.0f} ms'.format((time.perf_counter() - start)*1e3))
+    for mode, peaks in result.items():
+        print(mode)
+        for peak in peaks:
+            print('  I={:<5} U={:<5} P_e={:<5} f={:8.3f} +- {:.3f} MHz'.format(*peak))
@@ -0,0 +1,119 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+
+import catalog
+import decimate
+
+# Multi-page pdf of frequency scans for check_data.py.
+# The scans are put on pages with a fixed grid (rows x cols), every trace is
+# downsampled to about `points` points with a peak preserving method (see
+# decimate.py) before it is plotted. Worker processes load and decimate the
+# scans of the next pages while the pages before are written, only a few
+# pages are in memory at any time. The workers do not write the index of the
+# catalog cache, their new entries are merged and written by this process.
+#   report.render(catalog.Catalog('../data'), 'FrequencyScans.pdf')
+
+#---Settings------------------------------------------------
+rows, cols = 4, 2   # scans per page
+points = 1000       # points per trace after decimation
+method = 'minmax'   # 'minmax' or 'lttb'
+title = 'Bestimmung Zyklotronfrequenz'
+#-----------------------------------------------------------
+
+_catalog = None
+
+
+def _init_worker(path, pattern):
+    global _catalog
+    _catalog = catalog.Catalog(path, pattern, write_index=False)
+
+
+def _prepare_page(fnames, points, method, cat=None):
+    # decimated traces of one page and the new index entries of the cache (runs in a worker process)
+    if cat is None:
+        cat = _catalog
+    traces = []
+    for fname in fnames:
+        f, mmd = cat.load(fname)
+        traces.append((fname, len(f)) + decimate.methods[method](f, mmd, points))
+    return traces, cat.updates()
+
+
+class _Page:
+    """Figure with rows x cols axes which is reused for all pages (creating the axes is slow)."""
+
+    def __init__(self, rows, cols, title):
+        self.fig, axs = plt.subplots(rows, cols, figsize=(8.27*cols/2, 11.69), squeeze=False)
+        self.fig.subplots_adjust(hspace=.6, wspace=0.25)
+        self.fig.suptitle(title, fontsize=12)
+        self.axs = axs.ravel()
+        self.lines = []
+        for ax in self.axs:
+            self.lines.append(ax.plot([], [], lw=0.5)[0])
+            ax.set_ylabel('Amplitude[a.u]', fontsize=6)
+            ax.set_xlabel('Frequency [MHz]', fontsize=6)
+            ax.tick_params(labelsize=6)
+            ax.locator_params(nbins=4)    # few ticks, drawing them takes most of the time
+
+    def draw(self, pdf, traces):
+        for i, (ax, line) in enumerate(zip(self.axs, self.lines)):
+            ax.set_visible(i < len(traces))
+            if i >= len(traces):
+                continue
+            fname, n, f, mmd = traces[i]
+            line.set_data(f, mmd)
+            ax.relim()
+            ax.autoscale_view()
+            ax.set_title(fname, fontsize=6)
+        pdf.savefig(self.fig)
+
+    def close(self):
+        plt.close(self.fig)
+
+
+def render(scans, pdfname, rows=rows, cols=cols, points=points, method=method, title=title,
+           processes=None, ahead=2):
+    """
+    Writes the scans (list of catalog.Scan of one catalog) to pdfname, returns the number of pages.
+    processes=1: everything in this process; ahead: pages prepared in advance per worker.
+    """
+    scans = list(scans)
+    per_page = rows*cols
+    pages = [[scan.fname for scan in scans[i:i+per_page]] for i in range(0, len(scans), per_page)]
+    if not pages:
+        return 0
+    cat = scans[0].catalog
+    page = _Page(rows, cols, title)
+    with PdfPages(pdfname) as pdf:
+        if processes == 1:
+            for fnames in pages:
+                traces, entries = _prepare_page(fnames, points, method, cat)
+                cat.merge(entries)
+                page.draw(pdf, traces)
+        else:
+            with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(cat.path, cat.pattern)) as pool:
+                window = ahead*(processes or os.cpu_count() or 1)
+                futures = []
+                for fnames in pages:
+                    futures.append(pool.submit(_prepare_page, fnames, points, method))
+                    if len(futures) > window:
+                        traces, entries = futures.pop(0).result()
+                        cat.merge(entries)
+                        page.draw(pdf, traces)
+                for future in futures:
+                    traces, entries = future.result()
+                    cat.merge(entries)
+                    page.draw(pdf, traces)
+    page.close()
+    cat.flush()
+    return len(pages)
+
+if __name__ == '__main__':
+    # writes the report of F47/data
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+    start = time.perf_counter()
+    n = render(catalog.Catalog(data_dir), 'FrequencyScans.pdf')
+    print('{} pages in {:.1f} s'.format(n, time.perf_counter() - start))
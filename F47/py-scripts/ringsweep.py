@@ -0,0 +1,77 @@
+import numpy as np
+from scipy.constants import e, m_e
+
+# Detection with the linear ring voltage ramp of the SRS (devices.set_ring_sweep).
+# The SRS scan is armed before every shot and started by the detect pulse of
+# the trigger box, the analyzer records the zero-span trace from 30 ms after
+# its own pulse. With the times of the trigger box (in ms) the sample i of a
+# trace of n points and sweep_time ms is recorded at
+#   t_i = i/(n-1)*sweep_time - ramp_delay,  ramp_delay = wait3 - 30 ms (+ offset)
+# after the start of the ramp, so its ring voltage is
+#   U_i = scan_start + (scan_stop - scan_start)*t_i/scan_time   (0 <= t_i <= scan_time)
+# The electrons give a dip where their axial frequency crosses the center
+# frequency of the analyzer (resonator), so one shot gives the dip depth
+# against the ring voltage, and a few shots at different center frequencies
+# give the axial frequency against the voltage (and the trap coefficient C_2,
+# see trap.py) without a scan per ring voltage.
+
+analyzer_trigger_delay = 30     # ms, the DSA815 starts the sweep 30 ms after the trigger
+
+
+def ramp_delay(wait3, offset=0.0):
+    """ms from the start of the analyzer sweep to the start of the ramp (wait3 = 30: at the same time)."""
+    return wait3 - analyzer_trigger_delay + offset
+
+
+def trace_voltages(n, sweep_time, scan_start, scan_stop, scan_time, delay):
+    """Ring voltage of the n samples of a trace (NaN before and after the ramp), times in ms."""
+    t = np.linspace(0, sweep_time, n) - delay
+    s = t / scan_time
+    voltages = scan_start + (scan_stop - scan_start)*s
+    voltages[(s < 0) | (s > 1)] = np.nan
+    return voltages
+
+
+def voltage_curve(trace, voltages):
+    """
+    Dip depth against ring voltage: (U, depth) of the samples during the ramp, sorted by U.
+    The depth is measured from the median of the trace (the dip is narrow compared to the ramp).
+    """
+    trace = np.asarray(trace, dtype=float)
+    valid = np.isfinite(voltages)
+    depth = np.nanmedian(trace) - trace[valid]
+    order = np.argsort(voltages[valid])
+    return voltages[valid][order], depth[order]
+
+
+def dip_voltage(U, depth, smooth=5):
+    """Voltage (centroid of the points above half depth around the deepest point) and depth of the dip."""
+    smoothed = np.convolve(depth, np.ones(smooth)/smooth, mode='same') if smooth > 1 else depth
+    i = int(np.argmax(smoothed))
+    half = smoothed[i]/2
+    lo, hi = i, i
+    while lo > 0 and smoothed[lo-1] > half:
+        lo -= 1
+    while hi < len(smoothed)-1 and smoothed[hi+1] > half:
+        hi += 1
+    weights = np.maximum(smoothed[lo:hi+1], 0)
+    if not np.sum(weights) > 0:
+        return np.nan, smoothed[i]
+    return np.sum(U[lo:hi+1]*weights)/np.sum(weights), smoothed[i]
+
+
+def fit_C2(freqs, voltages):
+    """
+    Trap coefficient from axial frequencies (MHz) at the dip voltages (V), w_z^2 = 2*U*C_2*e/m_e:
+    least squares through the origin, returns C_2 and its standard error.
+    """
+    w2 = (2*np.pi*np.asarray(freqs, dtype=float)*1e6)**2
+    U = np.asarray(voltages, dtype=float)
+    valid = np.isfinite(U)
+    w2, U = w2[valid], U[valid]
+    k = np.sum(w2*U) / np.sum(U**2)
+    if len(U) > 1:
+        k_err = np.sqrt(np.sum((w2 - k*U)**2) / (len(U) - 1) / np.sum(U**2))
+    else:
+        k_err = np.nan
+    return k/(2*e/m_e), k_err/(2*e/m_e)
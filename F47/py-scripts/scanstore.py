@@ -0,0 +1,208 @@
+import os
+import json
+import glob
+import time
+from collections import namedtuple
+import numpy as np
+
+# Binary store for the frequency scans of scanFreq.
+# A store is a directory with one raw little endian file per column and a
+# header.json with the run parameters. All scans (runs) of a campaign are
+# appended to the same column files, a run is a range of rows:
+#   f      frequency in MHz
+#   mmd    MMD averaged over the shots
+#   std    standard deviation of the single shot MMDs
+#   time   unix time of the point
+#   shots  MMD of every shot (max_shots values per row, unused ones are NaN)
+# The columns are read as memory maps, so loading a campaign only reads the
+# header. If the script dies during a scan, the rows written so far are kept
+# and the run ends at the last complete row.
+
+columns = {'f': '<f8', 'mmd': '<f8', 'std': '<f8', 'time': '<f8', 'shots': '<f4'}
+
+Run = namedtuple('Run', ['attrs', 'f', 'mmd', 'std', 'time', 'shots'])
+
+
+def parse_filename(fname):
+    """
+    Run parameters from a file name of scanFreq, e.g.
+    Neumann_Striebel_2021_04_30_15_45_11_40V_1.3A_1-10MHz_-5dBm.csv
+    """
+    parts = os.path.basename(fname).rsplit('.', 1)[0].split('_')
+    freq_min, freq_max = parts[-2][:-3].split('-', 1)
+    return {
+        'group': '_'.join(parts[:-10]),
+        'timestamp': '_'.join(parts[-10:-4]),
+        'rvolt': float(parts[-4][:-1]),
+        'ccurrent': float(parts[-3][:-1]),
+        'freq_min': float(freq_min),
+        'freq_max': float(freq_max),
+        'excitation_power': float(parts[-1][:-3]),
+    }
+
+
+def _header_file(path):
+    return os.path.join(path, 'header.json')
+
+
+def _column_file(path, name):
+    return os.path.join(path, name + '.bin')
+
+
+def read_header(path):
+    with open(_header_file(path)) as file:
+        return json.load(file)
+
+
+def _write_header(path, header):
+    # write to a temporary file first, the header is never half written
+    tmp = _header_file(path) + '.tmp'
+    with open(tmp, 'w') as file:
+        json.dump(header, file, indent=1)
+    os.replace(tmp, _header_file(path))
+
+
+def create(path, max_shots=10):
+    """Creates an empty store (if it does not exist yet) and returns its header."""
+    if os.path.exists(_header_file(path)):
+        return read_header(path)
+    os.makedirs(path, exist_ok=True)
+    header = {'version': 1, 'max_shots': max_shots, 'columns': columns, 'runs': []}
+    for name in columns:
+        open(_column_file(path, name), 'ab').close()
+    _write_header(path, header)
+    return header
+
+
+def _row_size(header, name):
+    width = header['max_shots'] if name == 'shots' else 1
+    return np.dtype(header['columns'][name]).itemsize * width
+
+
+def n_rows(path, header=None):
+    # number of complete rows (a crash can leave a partial row in some columns)
+    if header is None:
+        header = read_header(path)
+    return min(os.path.getsize(_column_file(path, name)) // _row_size(header, name)
+               for name in header['columns'])
+
+
+class ScanWriter:
+    """Appends the points of one run to a store, use as context manager."""
+
+    def __init__(self, path, attrs, max_shots=10, flush_every=10):
+        self.path = path
+        self.header = create(path, max_shots)
+        self.max_shots = self.header['max_shots']
+        self.flush_every = flush_every
+        self.n = n_rows(path, self.header)
+        self.files = {}
+        for name in self.header['columns']:
+            file = open(_column_file(path, name), 'ab')
+            file.truncate(self.n * _row_size(self.header, name))  # drop partial rows
+            self.files[name] = file
+        self.run = dict(attrs, start=self.n, stop=None)
+        self.header['runs'].append(self.run)
+        _write_header(path, self.header)
+        self.unflushed = 0
+
+    def append(self, f, shots, t=None):
+        """Appends one point, shots are the MMDs of the single shots."""
+        shots = np.asarray(shots, dtype=float).ravel()
+        self.extend([f], [np.mean(shots)], [np.std(shots)], [time.time() if t is None else t], [shots])
+
+    def extend(self, f, mmd, std, t, shots):
+        """Appends many points, shots is a list of arrays (or a 2d array)."""
+        n = len(f)
+        rows = np.full((n, self.max_shots), np.nan, dtype=self.header['columns']['shots'])
+        for i, s in enumerate(shots):
+            s = np.asarray(s, dtype=float).ravel()[:self.max_shots]
+            rows[i, :len(s)] = s
+        data = {'f': f, 'mmd': mmd, 'std': std, 'time': t, 'shots': rows}
+        for name, file in self.files.items():
+            file.write(np.asarray(data[name], dtype=self.header['columns'][name]).tobytes())
+        self.n += n
+        self.unflushed += n
+        if self.unflushed >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        for file in self.files.values():
+            file.flush()
+        self.unflushed = 0
+
+    def close(self):
+        self.flush()
+        for file in self.files.values():
+            file.close()
+        self.run['stop'] = self.n
+        _write_header(self.path, self.header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load(path, mmap=True):
+    """Returns the header and a dict with all columns (memory maps if mmap)."""
+    header = read_header(path)
+    n = n_rows(path, header)
+    data = {}
+    for name, dtype in header['columns'].items():
+        shape = (n, header['max_shots']) if name == 'shots' else (n,)
+        if n == 0:
+            data[name] = np.empty(shape, dtype=dtype)
+        elif mmap:
+            data[name] = np.memmap(_column_file(path, name), dtype=dtype, mode='r', shape=shape)
+        else:
+            data[name] = np.fromfile(_column_file(path, name), dtype=dtype, count=np.prod(shape)).reshape(shape)
+    return header, data
+
+
+def load_runs(path, mmap=True):
+    """List of Run records (attrs, f, mmd, std, time, shots), the columns are views of the store."""
+    header, data = load(path, mmap)
+    n = len(data['f'])
+    runs = []
+    starts = [run['start'] for run in header['runs']] + [n]
+    for i, run in enumerate(header['runs']):
+        stop = run['stop'] if run['stop'] is not None else min(starts[i+1], n)
+        attrs = {key: value for key, value in run.items() if key not in ('start', 'stop')}
+        runs.append(Run(attrs, *(data[name][run['start']:stop] for name in Run._fields[1:])))
+    return runs
+
+
+def convert_csv(files, path):
+    """Appends the f,mmd csv files of scanFreq to the store at path (one run per file)."""
+    for fname in files:
+        f, mmd = np.genfromtxt(fname, delimiter=',', unpack=True, ndmin=2)
+        attrs = parse_filename(fname)
+        attrs['source'] = os.path.basename(fname)
+        t = time.mktime(time.strptime(attrs['timestamp'], '%Y_%m_%d_%H_%M_%S'))
+        nan = np.full(len(f), np.nan)
+        with ScanWriter(path, attrs) as writer:
+            # only the averaged MMD is in the csv files
+            writer.extend(f, mmd, nan, np.full(len(f), t), [[]]*len(f))
+
+
+if __name__ == '__main__':
+    # converts F47/data/*.csv and compares the loading time with genfromtxt
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+    store = os.path.join(data_dir, 'scans.store')
+    files = sorted(glob.glob(os.path.join(data_dir, '*.csv')))
+    if not os.path.exists(store):
+        convert_csv(files, store)
+
+    start = time.perf_counter()
+    for fname in files:
+        np.genfromtxt(fname, delimiter=',', unpack=True)
+    csv_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    runs = load_runs(store)
+    store_time = time.perf_counter() - start
+
+    print('{} files: genfromtxt {:.0f} ms, store {:.1f} ms ({} runs, {} points)'.format(
+        len(files), csv_time*1e3, store_time*1e3, len(runs), sum(len(run.f) for run in runs)))
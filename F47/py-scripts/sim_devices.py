@@ -0,0 +1,441 @@
+import time
+import threading
+import numpy as np
+
+import traces
+from trap import trap_frequencies
+
+# Simulated Penning trap setup for devices.py.
+# Start a script with the environment variable F47_BACKEND=sim and devices.py
+# imports this module instead of pyvisa and pyserial. It provides the part of
+# both interfaces devices.py uses (ResourceManager/open_resource, Serial) and
+# answers like the lab devices: hameg, srs, hf_gen, the DSA815 analyzer and
+# the Arduino trigger box.
+# The dip in the trace shrinks when the excitation hits one of the trap
+# frequencies of trap.py and decays with the storage time wait2, writes to the
+# serial ports fail now and then (failures = False switches this off).
+
+# the latencies are simulated with sleeps that benchmarks must not count
+_sleep = time.sleep
+
+failures = True
+
+
+class VisaIOError(Exception):
+    pass
+
+class SerialException(OSError):   # like pyserial (IOError)
+    pass
+
+
+class Trap:
+    """State of the simulated setup shared by all devices."""
+    depth = 20.0        # dip depth in dB of a freshly loaded cloud
+    lifetime = 60.0     # storage time constant in ms, see Lifetime_Analysis.py
+    offset = 0.7        # depth without electrons
+    widths = {'minus': 0.4, 'z': 2.0, 'plus': 2.0, 'c': 1.5}   # resonance widths in MHz
+
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.ring_voltage = 0.0
+        self.coil_current = 0.0
+        self.excitation_frequency = 0.0
+        self.excitation_power = -100.0
+        self.excitation_on = False
+        self.times = {'load': 500, 'wait1': 5, 'excite': 10, 'wait2': 5,
+                      'detect': 50, 'wait3': 0, 'rigol': 5}
+        self.shots = []     # (trigger time, dip depth, ring ramp) of every measurement cycle
+
+    def cycle_time(self):
+        return sum(self.times.values()) / 1000
+
+    def rigol_delay(self):
+        # time between the trigger command and the trigger pulse for the analyzer
+        t = self.times
+        return (t['load'] + t['wait1'] + t['excite'] + t['wait2'] + t['rigol']) / 1000
+
+    def excitation_loss(self):
+        # fraction of the electrons removed by the excitation
+        if not self.excitation_on or self.times['excite'] <= 0:
+            return 0.0
+        strength = 1 / (1 + 10**(-(self.excitation_power + 5)/10))    # 0.5 at -5 dBm
+        remaining = 1.0
+        freqs = trap_frequencies(self.coil_current, self.ring_voltage)
+        for key, f0 in freqs.items():
+            remaining *= 1 - strength*np.exp(-((self.excitation_frequency - f0)/self.widths[key])**2)
+        return 1 - remaining
+
+    def dip_depth(self):
+        # depth of the axial dip in dB for the current settings
+        stored = self.depth * np.exp(-self.times['wait2']/self.lifetime)
+        return stored*(1 - self.excitation_loss()) + self.offset + self.rng.normal(0, 0.5)
+
+    def fire(self, now, num=1):
+        # runs num measurement cycles back-to-back, returns the end of the last one
+        with self.lock:
+            for i in range(num):
+                # an armed ramp of the SRS is started by the detect pulse of the first cycle
+                ramp = resources['COM4'].take_ramp()
+                self.shots.append((now + i*self.cycle_time(), self.dip_depth(), ramp))
+            return now + num*self.cycle_time()
+
+
+trap = Trap()
+
+
+class Device:
+    """Base class of the simulated devices, handle() answers a single command."""
+    write_latency = 0.001   # s per command
+    failure_rate = 0.0      # probability that a write to the serial port fails
+
+    def handle(self, cmd, now):
+        # returns None or (ready_time or callable, bytes)
+        return None
+
+
+class Hameg(Device):
+    write_latency = 0.005   # + 9600 baud, see Serial.write
+
+    def __init__(self):
+        self.output = None
+        self.currents = {}
+
+    def handle(self, cmd, now):
+        if cmd == '*IDN?':
+            return now, b'HAMEG,HMP4040,sim,1.0\r\n'
+        if cmd.startswith('INST'):
+            self.output = cmd.split()[-1]
+        elif cmd.startswith('CURR'):
+            self.currents[self.output] = float(cmd.split()[-1])
+            trap.coil_current = self.currents.get('OUT3', 0.0)
+
+
+class SRS(Device):
+    write_latency = 0.002
+
+    def __init__(self):
+        self.settings = {}
+
+    def take_ramp(self):
+        # (start, stop, time in s) of the armed scan, which is started (and disarmed) by the trigger
+        if self.settings.get('SCAA', '').upper() != 'ARMED':
+            return None
+        self.settings['SCAA'] = 'IDLE'
+        return float(self.settings['SCAB']), float(self.settings['SCAE']), float(self.settings['SCAT'])
+
+    def handle(self, cmd, now):
+        if cmd == '*IDN?':
+            return now, b'Stanford_Research_Systems,DC205,sim,1.0\r\n'
+        if cmd.startswith('VOLT'):
+            trap.ring_voltage = float(cmd[4:])
+        else:
+            self.settings[cmd[:4]] = cmd[4:].strip()
+
+
+class HFGenerator(Device):
+    write_latency = 0.002   # GPIB
+    settle_time = 0.005
+
+    def __init__(self):
+        self.settled = 0.0
+
+    def handle(self, cmd, now):
+        parts = cmd.split()
+        if parts[0] == 'FR':
+            trap.excitation_frequency = float(parts[1])
+            self.settled = now + self.settle_time
+        elif parts[0] == 'AP':
+            trap.excitation_power = float(parts[1])
+        elif parts[0] == 'R3':
+            trap.excitation_on = True
+        elif parts[0] == 'R2':
+            trap.excitation_on = False
+        elif parts[0] == '*OPC?':
+            return self.settled, b'1\n'
+
+
+class Analyzer(Device):
+    write_latency = 0.002
+    trigger_delay = 0.030   # the DSA815 has a 30 ms trigger delay
+    n_points = 601
+    link_rate = 1.0e6       # byte/s
+
+    def __init__(self):
+        self.format = 'ASCII'
+        self.continuous = True
+        self.armed = None
+        self.sweep_time = 0.1
+        self.averaging = False
+        self.average_count = 1
+        self.average_start = 0.0
+        self.settings = {}
+
+    def sweep_end(self, shot):
+        return shot[0] + trap.rigol_delay() + self.trigger_delay + self.sweep_time
+
+    def last_sweep(self, now):
+        # the shot shown on the display
+        shots = trap.shots
+        if not self.continuous:
+            shots = [s for s in shots if self.armed is not None and s[0] >= self.armed][:1]
+        done = [s for s in shots if self.sweep_end(s) <= now]
+        return done[-1] if done else None
+
+    def averaged_sweeps(self, now):
+        return [s for s in trap.shots if s[0] >= self.average_start and self.sweep_end(s) <= now][:self.average_count]
+
+    resonator_width = 0.3   # MHz, width of the axial dip in frequency
+
+    def trace(self, shot):
+        x = np.linspace(0, 1, self.n_points)
+        depth = 0.0 if shot is None else shot[1]
+        if shot is not None and shot[2] is not None:
+            # linear ramp of the SRS, starts with the detect pulse (wait3 after the analyzer pulse)
+            start, stop, scan_time = shot[2]
+            t = x*self.sweep_time - (trap.times['wait3']/1000 - self.trigger_delay)
+            voltage = start + (stop - start)*np.clip(t/scan_time, 0, 1)
+            f_z = trap_frequencies(trap.coil_current, voltage)['z']
+            center = float(self.settings.get(':SENSE:FREQUENCY:CENTER', '57.3MHz').lower().rstrip('mhz'))
+            dip = np.exp(-((f_z - center)/self.resonator_width)**2)
+        else:
+            dip = np.exp(-((x-0.45)/0.04)**2)
+        data = -40.0 - depth*dip + trap.rng.normal(0, 0.3, self.n_points)
+        return data
+
+    def displayed_trace(self, now):
+        if self.averaging:
+            sweeps = self.averaged_sweeps(now)
+            if sweeps:
+                return np.mean([self.trace(s) for s in sweeps], axis=0)
+        return self.trace(self.last_sweep(now))
+
+    def opc_ready(self):
+        if self.continuous or self.armed is None:
+            return time.perf_counter()
+        shots = [s for s in trap.shots if s[0] >= self.armed]
+        return self.sweep_end(shots[0]) if shots else None
+
+    def handle(self, cmd, now):
+        answers = [self.handle_one(c.strip(), now) for c in cmd.split(';')]
+        answers = [a for a in answers if a is not None]
+        return answers[-1] if answers else None
+
+    def handle_one(self, cmd, now):
+        key = cmd.split()[0].upper() if cmd else ''
+        if key.startswith(':FORM'):
+            self.format = 'REAL' if cmd.split()[-1].upper().startswith('REAL') else 'ASCII'
+        elif key.startswith(':INIT') and 'CONT' in key:
+            self.continuous = cmd.split()[-1].upper() in ('ON', '1')
+        elif key.startswith(':INIT'):
+            self.armed = now
+        elif key == '*OPC?':
+            return self.opc_ready, b'1\n'
+        elif key in (':SENS:SWE:TIME', ':SENSE:SWEEP:TIME'):
+            value = cmd.split()[-1].lower()
+            self.sweep_time = float(value.rstrip('ms')) / (1000 if value.endswith('ms') else 1)
+        elif key in (':TRAC1:MODE', ':TRACE1:MODE'):
+            self.averaging = cmd.split()[-1].upper().startswith('VID')
+        elif key in (':TRAC:AVER:COUN', ':TRACE:AVERAGE:COUNT'):
+            self.average_count = int(cmd.split()[-1])
+        elif key in (':TRAC:AVER:CLE', ':TRACE:AVERAGE:CLEAR'):
+            self.average_start = now
+        elif key in (':TRAC:AVER:COUN:CURR?', ':TRACE:AVERAGE:COUNT:CURRENT?'):
+            return now, (str(len(self.averaged_sweeps(now))) + '\n').encode()
+        elif key.startswith(':TRAC:DATA?') or key.startswith(':TRACE:DATA?'):
+            data = self.displayed_trace(now)
+            if self.format == 'REAL':
+                payload = traces.make_binary_payload(data)
+            else:
+                payload = traces.make_ascii_payload(data)
+            return now + len(payload)/self.link_rate, payload
+        elif key.endswith('?'):
+            return now, (str(self.settings.get(key.rstrip('?'), 0)) + '\n').encode()
+        else:
+            self.settings[key] = cmd[len(key):].strip()
+
+
+class Trigger(Device):
+    ack = b'done\r\n'
+    write_latency = 0.002
+    failure_rate = 0.002    # the Arduino drops off the USB now and then
+
+    def __init__(self):
+        self.burst = 1
+
+    def handle(self, cmd, now):
+        parts = cmd.split()
+        if not parts:
+            return None
+        if parts[0] == 'trig':
+            return trap.fire(now, self.burst), self.ack
+        if parts[0] == 'trig_num':
+            self.burst = int(parts[1])
+        if parts[0] == 'times?':
+            t = trap.times
+            values = [t['load'], t['wait1'], t['excite'], t['wait2'], t['detect'], t['wait3'], t['rigol']]
+            return now, (','.join(str(v) for v in values) + '\r\n').encode()
+        if parts[0] == 'times':
+            keys = ['load', 'wait1', 'excite', 'wait2', 'detect', 'wait3', 'rigol']
+            trap.times.update(zip(keys, (float(v) for v in parts[1:])))
+        elif parts[0] in trap.times:
+            trap.times[parts[0]] = float(parts[1])
+
+
+class Connection:
+    """Connection to a simulated device with a queue of pending answers."""
+
+    def __init__(self, device, timeout):
+        self.device = device
+        self.timeout = timeout
+        self.is_open = True
+        self.answers = []
+        self.buffer = b''
+
+    def _write(self, cmd, latency=0.0):
+        _sleep(self.device.write_latency + latency)
+        answer = self.device.handle(cmd.strip(), time.perf_counter())
+        if answer is not None:
+            self.answers.append(answer)
+
+    def _next_answer(self, timeout):
+        # waits for the next answer, returns None after timeout seconds
+        deadline = time.perf_counter() + timeout
+        while True:
+            if self.answers:
+                ready, data = self.answers[0]
+                if callable(ready):
+                    ready = ready()
+                if ready is not None and ready <= deadline:
+                    _sleep(max(ready - time.perf_counter(), 0))
+                    self.answers.pop(0)
+                    return data
+            if time.perf_counter() >= deadline:
+                return None
+            _sleep(0.001)
+
+    def clear(self):
+        self.answers = []
+        self.buffer = b''
+
+    def close(self):
+        self.is_open = False
+
+
+class Resource(Connection):
+    """pyvisa like resource, timeout in ms."""
+
+    def __init__(self, device, timeout=2000):
+        Connection.__init__(self, device, timeout)
+
+    def write(self, cmd):
+        self._write(cmd)
+        return len(cmd)
+
+    def read_raw(self):
+        data = self._next_answer(self.timeout/1000)
+        if data is None:
+            raise VisaIOError("VI_ERROR_TMO (-1073807339): Timeout expired before operation completed.")
+        return data
+
+    def read(self):
+        return self.read_raw().decode().rstrip('\r\n')
+
+    def query(self, cmd):
+        self.write(cmd)
+        return self.read()
+
+
+class Serial(Connection):
+    """pyserial like port, timeout in s."""
+
+    def __init__(self, port=None, baudrate=9600, timeout=None, **kwargs):
+        Connection.__init__(self, None, timeout)
+        self.port = port
+        self.baudrate = baudrate
+        self.dtr = True
+        self.is_open = False
+        if port is not None:    # like pyserial: Serial() is opened later with open()
+            self.open()
+
+    def open(self):
+        self.device = _device(self.port)
+        self.answers = []
+        self.buffer = b''
+        self.is_open = True
+
+    def _check_open(self):
+        if not self.is_open:
+            raise SerialException("Attempting to use a port that is not open")
+
+    def write(self, data):
+        self._check_open()
+        if isinstance(data, str):
+            raise TypeError("unicode strings are not supported, please encode to bytes: " + repr(data))
+        if failures and trap.rng.random() < self.device.failure_rate:
+            raise SerialException("WriteFile failed (PermissionError(13, 'The device does not recognize the command.', None, 22))")
+        for line in data.replace(b'\r', b'').split(b'\n'):
+            if line.strip():
+                self._write(line.decode(), (len(line) + 2)*10/self.baudrate)  # 10 bits per byte
+        return len(data)
+
+    def _fill(self, timeout):
+        self._check_open()
+        data = self._next_answer(timeout)
+        if data is not None:
+            self.buffer += data
+        return data is not None
+
+    def readline(self):
+        timeout = 1e9 if self.timeout is None else self.timeout
+        deadline = time.perf_counter() + timeout
+        while b'\n' not in self.buffer:
+            if not self._fill(max(deadline - time.perf_counter(), 0)):
+                break
+        line, sep, rest = self.buffer.partition(b'\n')
+        self.buffer = rest
+        return line + sep
+
+    def read(self, size=1):
+        if not self.buffer:
+            self._fill(1e9 if self.timeout is None else self.timeout)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    @property
+    def in_waiting(self):
+        while self._fill(0):
+            pass
+        return len(self.buffer)
+
+    def reset_input_buffer(self):
+        self.clear()
+
+
+# the lab resources, see devices.py
+resources = {
+    'COM6': Hameg(),
+    'COM4': SRS(),
+    'GPIB0::7::INSTR': HFGenerator(),
+    'USB0::0x1AB1::0x0960::DSA8A154402671::INSTR': Analyzer(),
+    'COM5': Trigger(),
+}
+resources['ASRL5::INSTR'] = resources['COM5']
+
+def _device(name):
+    if name not in resources:
+        raise SerialException("could not open port {}: no simulated device".format(name))
+    return resources[name]
+
+
+class ResourceManager:
+    def __init__(self, *args):
+        pass
+
+    def list_resources(self):
+        return tuple(name for name in resources if not name.startswith('COM'))
+
+    def open_resource(self, name):
+        if name not in resources:
+            raise VisaIOError("VI_ERROR_RSRC_NFOUND: no simulated device " + name)
+        return Resource(resources[name])
@@ -0,0 +1,263 @@
+import os
+import time
+import threading
+
+# Supervised serial links (hameg, srs and the Arduino trigger box).
+# A Link wraps the pyserial port of a device and has the same write, read,
+# readline, reset_input_buffer and timeout. If a transfer fails (or a framed
+# request gets no answer within a short timeout) the link is marked down and
+# reopened in a background thread with exponential backoff. After the port is
+# open again the probe request has to be answered, then on_connect replays the
+# cached settings (e.g. the trigger timings) over the new connection.
+# While a link is down its transfers raise LinkDown at once, the caller can
+# wait for the recovery with link.wait_up(timeout) and repeat its step.
+#   trigger = supervisor.Link("trigger", lambda: serial.Serial("COM5", 115200, timeout=1),
+#                             probe=(b"times?\r\n", lambda line: line.count(b",") == 6))
+
+#---Settings------------------------------------------------
+probe_timeout = 0.2     # s, answer to the probe request after a reconnect
+min_backoff = 0.05      # s, first wait after a failed reconnect
+max_backoff = 2.0       # s
+retry_timeout = 1.0     # s, writes of links with retry_writes wait this long for the recovery
+#-----------------------------------------------------------
+
+
+class LinkDown(OSError):
+    """Transfer over a link which failed or is reconnecting."""
+
+
+def open_serial(serial, port, baudrate, timeout, reset=True):
+    """
+    Opens a pyserial port (serial is the module). reset=False opens it with DTR low,
+    so an Arduino is not reset by the open (on most systems) and answers at once.
+    """
+    conn = serial.Serial()
+    conn.port, conn.baudrate, conn.timeout = port, baudrate, timeout
+    if not reset:
+        conn.dtr = False
+    conn.open()
+    return conn
+
+
+class Link:
+    """Serial connection of one device which reconnects by itself, see the top of this file."""
+
+    def __init__(self, name, opener, probe=None, on_connect=None, retry_writes=False, errors=(OSError,)):
+        self.name = name
+        self.opener = opener            # opens and returns a new connection
+        self.probe = probe              # (request, check(answer line)) or None
+        self.on_connect = on_connect    # on_connect(conn) after a reconnect
+        self.retry_writes = retry_writes
+        self.errors = errors            # exceptions of the connection which mean the link failed
+        self.conn = opener()
+        self._timeout = self.conn.timeout
+        self._lock = threading.Lock()
+        self._up = threading.Event()
+        self._up.set()
+        self._thread = None
+        self.closed = False
+        self.failures = 0
+        self.last_error = None
+        self.down_since = None
+        self.recoveries = []            # s from the failure until the link was up again
+
+    #---pyserial like interface---
+    @property
+    def up(self):
+        return self._up.is_set()
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self._timeout = value
+        if self.up:
+            self.conn.timeout = value
+
+    @property
+    def in_waiting(self):
+        return self._call(lambda conn: conn.in_waiting)
+
+    def write(self, data):
+        try:
+            return self._call(lambda conn: conn.write(data))
+        except LinkDown:
+            if not self.retry_writes or not self.wait_up(retry_timeout):
+                raise
+            return self._call(lambda conn: conn.write(data))
+
+    def read(self, size=1):
+        return self._call(lambda conn: conn.read(size))
+
+    def readline(self):
+        return self._call(lambda conn: conn.readline())
+
+    def reset_input_buffer(self):
+        return self._call(lambda conn: conn.reset_input_buffer())
+
+    def request(self, data, check=None, timeout=probe_timeout):
+        """
+        Framed exchange: sends data and returns the answer line. No answer within
+        timeout (or check(line) False) counts as failure of the link, raises LinkDown.
+        """
+        def exchange(conn):
+            old = conn.timeout
+            try:
+                conn.reset_input_buffer()
+                conn.write(data)
+                conn.timeout = timeout
+                return conn.readline()
+            finally:
+                conn.timeout = old
+        conn = self.conn
+        line = self._call(exchange)
+        if not line or (check is not None and not check(line)):
+            self._failed(conn, LinkDown("no answer to {!r} from {}".format(data, self.name)))
+            raise LinkDown("no answer to {!r} from {}".format(data, self.name))
+        return line
+
+    def close(self):
+        self.closed = True
+        self._up.set()
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+    #---supervision---
+    def _call(self, func):
+        if not self.up:
+            raise LinkDown("{} is reconnecting ({})".format(self.name, self.last_error))
+        conn = self.conn
+        try:
+            return func(conn)
+        except self.errors as err:
+            self._failed(conn, err)
+            raise LinkDown("link to {} failed ({})".format(self.name, err)) from err
+
+    def _failed(self, conn, err):
+        with self._lock:
+            if conn is not self.conn or not self.up or self.closed:
+                return  # already reconnecting
+            self._up.clear()
+            self.failures += 1
+            self.last_error = err
+            self.down_since = time.perf_counter()
+            self._thread = threading.Thread(target=self._reconnect, name=self.name + " reconnect", daemon=True)
+            self._thread.start()
+
+    def _reconnect(self):
+        delay = min_backoff
+        while not self.closed:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            try:
+                conn = self.opener()
+                if self.probe is not None:
+                    request, check = self.probe
+                    conn.reset_input_buffer()
+                    conn.write(request)
+                    conn.timeout = probe_timeout
+                    line = conn.readline()
+                    if not line or not check(line):
+                        conn.close()
+                        raise LinkDown("no answer to the probe {!r}".format(request))
+                conn.timeout = self._timeout
+                if self.on_connect is not None:
+                    self.on_connect(conn)
+                with self._lock:
+                    self.conn = conn
+                    self.recoveries.append(time.perf_counter() - self.down_since)
+                    self._up.set()
+                print("{} reconnected after {:.2f} s".format(self.name, self.recoveries[-1]))
+                return
+            except Exception as err:
+                self.last_error = err
+                time.sleep(delay)
+                delay = min(2*delay, max_backoff)
+
+    def wait_up(self, timeout=None):
+        """Waits until the link is up (again), returns False after timeout seconds."""
+        return self._up.wait(timeout) and not self.closed
+
+    def reconnect(self, wait=True, timeout=None):
+        """Reopens the connection (like after a failure)."""
+        self._failed(self.conn, LinkDown("reconnect requested"))
+        return self.wait_up(timeout) if wait else self.up
+
+    def report(self):
+        recoveries = self.recoveries
+        return "{}: {}, {} failures, recovery {}".format(
+            self.name, "up" if self.up else "DOWN ({})".format(self.last_error), self.failures,
+            "mean {:.0f} ms, max {:.0f} ms".format(1e3*sum(recoveries)/len(recoveries), 1e3*max(recoveries))
+            if recoveries else "-")
+
+
+class PtyStandIn:
+    """
+    Local stand-in for a serial device for tests: a pseudo terminal whose other end
+    answers the lines with handle(line) -> answer bytes or None. The port is a
+    symlink at path, drop() makes the port fail (like a device that falls off the USB),
+    restart() creates a new pseudo terminal at the same path.
+    """
+
+    def __init__(self, path, handle):
+        self.path = path
+        self.handle = handle
+        self.master = None
+        self.thread = None
+        self.lines = 0
+        self.restart()
+
+    def restart(self):
+        import pty, tty     # posix only, the stand-in is for tests
+        master, slave = pty.openpty()
+        tty.setraw(slave)   # no echo, no line editing
+        name = os.ttyname(slave)
+        self._slave = slave
+        if os.path.lexists(self.path):
+            os.remove(self.path)
+        os.symlink(name, self.path)
+        self.master = master
+        self.thread = threading.Thread(target=self._serve, args=(master,), daemon=True)
+        self.thread.start()
+
+    def _serve(self, master):
+        buffer = b''
+        while True:
+            try:
+                data = os.read(master, 1024)
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                line = line.strip()
+                if not line:
+                    continue
+                self.lines += 1
+                answer = self.handle(line.decode())
+                if answer is not None:
+                    try:
+                        os.write(master, answer)
+                    except OSError:
+                        return
+
+    def drop(self):
+        # closes both ends: the open port gets I/O errors and the path cannot be opened until restart()
+        for fd in (self.master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        if os.path.lexists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        self.drop()
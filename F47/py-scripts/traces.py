@@ -0,0 +1,95 @@
+import numpy as np
+
+# Parsing of the trace data sent by the RIGOL DSA815 on ":TRACe:DATA? TRACE1".
+# Both the ASCII and the binary (REAL, 32 bit float) answers are wrapped in an
+# IEEE 488.2 definite length block:
+#
+#   #<n><length with n digits><data>[\n]
+#
+# e.g. b"#9000002404" followed by 601*4 bytes. The old parser searched for the
+# first "-" to cut the header away, which breaks as soon as the first point of
+# the trace is positive.
+
+# the DSA815 sends little endian 32 bit floats in the REAL format
+BINARY_DTYPE = np.dtype('<f4')
+
+
+def parse_block_header(raw):
+    """
+    Returns (offset, length) of the data in an IEEE 488.2 block.
+    length is None if the answer has no header or is an indefinite block (#0).
+    Whitespace before the header is skipped (and counted in offset), an answer
+    without header is returned unchanged (its first bytes may be whitespace).
+    """
+    if isinstance(raw, str):
+        raw = raw.encode('ascii', 'ignore')
+    header = raw.lstrip()
+    if header[:1] != b'#':
+        return 0, None
+    skip = len(raw) - len(header)
+    n = header[1:2]
+    if not n.isdigit():
+        raise ValueError("invalid block header: " + repr(header[:12]))
+    n = int(n)
+    if n == 0:
+        return skip+2, None
+    length = header[2:2+n]
+    if len(length) != n or not length.isdigit():
+        raise ValueError("invalid block header: " + repr(header[:12]))
+    return skip+2+n, int(length)
+
+
+def parse_binary_trace(raw, dtype=BINARY_DTYPE):
+    """
+    Decodes a binary trace block without copying the data.
+    The returned array is a read-only view on raw.
+    """
+    offset, length = parse_block_header(raw)
+    if length is None:
+        length = len(raw) - offset
+        if length % dtype.itemsize != 0 and raw.endswith(b'\n'):
+            length -= 1     # terminator, a last data byte 0x0a keeps the length a multiple of the item size
+    if offset + length > len(raw):
+        raise ValueError("truncated trace block: expected {} bytes, got {}".format(length, len(raw)-offset))
+    if length % dtype.itemsize != 0:
+        raise ValueError("trace block length {} is not a multiple of {}".format(length, dtype.itemsize))
+    return np.frombuffer(raw, dtype=dtype, count=length//dtype.itemsize, offset=offset)
+
+
+def parse_ascii_trace(raw):
+    """Decodes an ASCII trace (comma separated numbers, with or without block header)."""
+    if isinstance(raw, bytes):
+        raw = raw.decode('ascii')
+    raw = raw.lstrip()
+    offset, length = parse_block_header(raw)
+    if length is None:
+        text = raw[offset:]
+    else:
+        if offset + length > len(raw):
+            raise ValueError("truncated trace block: expected {} bytes, got {}".format(length, len(raw)-offset))
+        text = raw[offset:offset+length]
+    text = text.strip().rstrip(',')
+    if not text:
+        raise ValueError("empty trace")
+    try:
+        return np.array(text.split(','), dtype=float)
+    except ValueError:
+        raise ValueError("invalid number in trace") from None
+
+
+def parse_trace(raw, binary):
+    if binary:
+        return parse_binary_trace(raw)
+    return parse_ascii_trace(raw)
+
+
+# helpers to create payloads exactly like the analyzer sends them
+
+def make_block(data):
+    return "#9{:09d}".format(len(data)).encode() + data + b"\n"
+
+def make_binary_payload(trace):
+    return make_block(np.asarray(trace, dtype=BINARY_DTYPE).tobytes())
+
+def make_ascii_payload(trace):
+    return make_block(", ".join("{:.6e}".format(v) for v in trace).encode())
@@ -0,0 +1,37 @@
+import numpy as np
+from scipy.constants import m_e, e, mu_0
+
+# Expected eigenfrequencies of an electron in the Penning trap, same formulas
+# as in F47_Auswertung.ipynb (section "Vorbereitung"):
+#   B   = mu_0 * N/L * I
+#   w_c = e/m_e * B
+#   w_z = sqrt(2*V_0*C_2 * e/m_e)
+#   w_- = 1/2 * (w_c - sqrt(w_c^2 - 2*w_z^2))
+#   w_+ = 1/2 * (w_c + sqrt(w_c^2 - 2*w_z^2))
+
+# coil of the magnet
+N = 2400
+L = 246e-3
+
+# trap coefficient, estimated from the measured axial frequency (section 6 of the notebook)
+C_2 = 1.17e4
+
+
+def magnetic_field(current):
+    """B in T for the coil current in A"""
+    return mu_0 * N / L * np.asarray(current, dtype=float)
+
+
+def trap_frequencies(current, voltage, C_2=C_2):
+    """
+    Expected frequencies in MHz for the coil current I in A and the ring voltage V_0 in V.
+    Returns a dict with the cyclotron (c), axial (z), magnetron (minus) and
+    modified cyclotron (plus) frequency. Works for arrays of currents/voltages.
+    """
+    w_c = e/m_e * magnetic_field(current)
+    w_z = np.sqrt(2*np.asarray(voltage, dtype=float)*C_2*e/m_e)
+    root = np.sqrt(np.maximum(w_c**2 - 2*w_z**2, 0))
+    w_m = 0.5*(w_c - root)
+    w_p = 0.5*(w_c + root)
+    to_MHz = 1e-6 / (2*np.pi)
+    return {'c': w_c*to_MHz, 'z': w_z*to_MHz, 'minus': w_m*to_MHz, 'plus': w_p*to_MHz}
@@ -0,0 +1,231 @@
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from scipy.optimize import curve_fit
+
+import lifetimefit
+import peakfit
+
+# Uncertainties of the least squares fits from their distributions instead of
+# the diagonal of the curve_fit covariance (Lifetime_Analysis.py):
+#   bootstrap  parametric (new y from the fitted model and the errors) or
+#              non-parametric (points drawn with replacement) resamples, all
+#              resamples of a chunk refitted at once by Levenberg-Marquardt on
+#              arrays (resamples, points), started at the nominal solution;
+#              the chunks run on a process pool with independent seeds
+#   profile    chi^2 minimized over the other parameters on a grid of one
+#              parameter (all grid points at once), the interval from
+#              Delta chi^2 = 1
+# A model is the function and its Jacobian of a fit: lifetime (N0*exp(-t/tau)+off
+# of lifetimefit) is in models, resonance(n) is C_PI of peakfit with exponent n.
+#   wait, avg, std = np.genfromtxt('../data/lifetime_Neumann_Striebel.txt', delimiter=',', unpack=True)
+#   result = uncertainty.analyse('lifetime', wait, avg, std, p0=lifetimefit.guess)
+#   result.intervals['tau']     # Interval from the bootstrap, result.profile: from chi^2
+
+#---Settings------------------------------------------------
+resamples = 5000
+chunk = 1000        # resamples per job of the pool
+iterations = 50     # Levenberg-Marquardt steps at most
+tolerance = 1e-10   # relative change of chi^2 to stop
+level = 0.6827      # content of the intervals
+seed = 0
+#-----------------------------------------------------------
+
+# f(x, *p) and jacobian(x, *p) -> (..., points, parameters), both broadcasting over arrays of parameters
+Model = namedtuple('Model', ['f', 'jacobian', 'names'])
+
+# value (nominal fit), lower and upper end of the interval and the standard deviation of the distribution
+Interval = namedtuple('Interval', ['value', 'lower', 'upper', 'sigma'])
+
+# nominal popt, pcov and chi^2, samples (resamples, parameters) of the converged refits,
+# parameter name -> Interval of the bootstrap and the profile interval (or None)
+Result = namedtuple('Result', ['popt', 'pcov', 'chi2', 'samples', 'intervals', 'profile'])
+
+
+def lifetime_jacobian(t, N0, tau, off):
+    return np.moveaxis(np.broadcast_arrays(*lifetimefit.gradient(t, (N0, tau, off))), 0, -1)
+
+
+def resonance(n=1):
+    """Model of the resonance C_PI of peakfit with exponent n."""
+    return Model(partial(peakfit.C_PI, n=n), partial(peakfit.C_PI_jacobian, n=n), ('a', 'b', 'c', 'y'))
+
+
+models = {
+    'lifetime': Model(lifetimefit.fit_func, lifetime_jacobian, ('N0', 'tau', 'off')),
+    'C_PI': resonance(1),
+}
+
+
+def _model(model):
+    return models[model] if isinstance(model, str) else model
+
+
+#---fits-----------------------------------------------------
+def nominal(model, x, y, sigma, p0, absolute_sigma=False):
+    """popt, pcov and chi^2 of the fit of the data (curve_fit like Lifetime_Analysis.py)."""
+    model = _model(model)
+    popt, pcov = curve_fit(model.f, x, y, p0=p0, sigma=sigma, absolute_sigma=absolute_sigma,
+                           jac=lambda x, *p: model.jacobian(x, *p), maxfev=100000)
+    chi2 = float(np.sum(((y - model.f(x, *popt)) / sigma)**2))
+    return popt, pcov, chi2
+
+
+def fit_batch(model, x, y, sigma, p0, fixed=None, iterations=iterations, tolerance=tolerance):
+    """
+    Levenberg-Marquardt fits of many data sets at once: x, y, sigma (sets, points) or broadcasting,
+    p0 (sets, parameters). fixed: index of a parameter kept at its p0 (profile).
+    Returns p (sets, parameters), chi^2 (sets) and the converged sets.
+    """
+    model = _model(model)
+    p = np.array(p0, dtype=float)
+    k = p.shape[1]
+    x = np.broadcast_to(x, (len(p), np.shape(x)[-1]))
+    free = np.ones(k, dtype=bool)
+    if fixed is not None:
+        free[fixed] = False
+
+    def residuals_and_jacobian(p):
+        params = [p[:, i:i+1] for i in range(k)]
+        r = (y - model.f(x, *params)) / sigma
+        J = model.jacobian(x, *params) / np.asarray(sigma)[..., None]
+        return r, J[..., free]
+
+    r, J = residuals_and_jacobian(p)
+    cost = np.sum(r**2, axis=1)
+    damping = np.full(len(p), 1e-3)
+    done = np.zeros(len(p), dtype=bool)
+    with np.errstate(all='ignore'):
+        for _ in range(iterations):
+            JTJ = np.einsum('nmi,nmj->nij', J, J)
+            g = np.einsum('nmi,nm->ni', J, r)
+            diagonal = np.einsum('nii->ni', JTJ)
+            A = JTJ + (damping[:, None]*diagonal + 1e-12)[:, :, None] * np.eye(free.sum())
+            step = np.zeros_like(p)
+            step[:, free] = np.linalg.solve(A, g[..., None])[..., 0]
+            new_r, new_J = residuals_and_jacobian(p + step)
+            new_cost = np.sum(new_r**2, axis=1)
+            better = np.isfinite(new_cost) & (new_cost < cost) & ~done
+            done |= better & (cost - new_cost < tolerance*cost)
+            p[better], r[better], J[better] = (p + step)[better], new_r[better], new_J[better]
+            cost = np.where(better, new_cost, cost)
+            damping = np.where(better, damping/10, damping*10)
+            if np.all(done | (damping > 1e10)):
+                break
+    converged = np.all(np.isfinite(p), axis=1) & (done | (damping > 1e10))
+    return p, cost, converged
+
+
+#---bootstrap------------------------------------------------
+def resample(rng, n, x, y, sigma, popt, model, kind, scale=1.0):
+    """n resampled data sets (x, y, sigma), arrays (n, points)."""
+    points = len(x)
+    if kind == 'parametric':
+        mu = model.f(x, *popt)
+        y_b = mu + scale * sigma * rng.standard_normal((n, points))
+        return np.broadcast_to(x, (n, points)), y_b, np.broadcast_to(sigma, (n, points))
+    index = rng.integers(0, points, (n, points))
+    return x[index], y[index], sigma[index]
+
+
+def _bootstrap_chunk(job):
+    model, x, y, sigma, popt, kind, scale, n, seed_sequence = job
+    model = _model(model)
+    x_b, y_b, sigma_b = resample(np.random.default_rng(seed_sequence), n, x, y, sigma, popt, model, kind, scale)
+    p, chi2, converged = fit_batch(model, x_b, y_b, sigma_b, np.tile(popt, (n, 1)))
+    return p[converged]
+
+
+def bootstrap(model, x, y, sigma, popt, kind='parametric', n=resamples, chi2=None, processes=None,
+              chunk=chunk, seed=seed):
+    """
+    Refitted parameters (converged resamples, parameters) of n bootstrap resamples.
+    kind: 'parametric' or 'nonparametric'. chi2: chi^2 of the nominal fit, for a parametric
+    bootstrap the errors are scaled by sqrt(chi^2/dof) like the pcov of curve_fit (absolute_sigma=False).
+    """
+    x, y, sigma, popt = (np.asarray(a, dtype=float) for a in (x, y, sigma, popt))
+    scale = np.sqrt(chi2 / (len(x) - len(popt))) if chi2 is not None else 1.0
+    sizes = [min(chunk, n - start) for start in range(0, n, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(model, x, y, sigma, popt, kind, scale, size, s) for size, s in zip(sizes, seeds)]
+    if processes == 1 or len(jobs) < 2:
+        results = [_bootstrap_chunk(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(_bootstrap_chunk, jobs))
+    return np.concatenate(results)
+
+
+def interval(samples, value, level=level):
+    """Central interval with the content level of the samples of one parameter."""
+    lower, upper = np.percentile(samples, [50*(1 - level), 50*(1 + level)])
+    return Interval(value, lower, upper, np.std(samples, ddof=1))
+
+
+#---profile likelihood---------------------------------------
+def profile(model, x, y, sigma, popt, index, grid, chi2=None):
+    """
+    chi^2 minimized over the other parameters at the values grid of parameter index (all at once)
+    and the Delta chi^2 = 1 Interval (chi^2 scaled by dof/chi2 of the nominal fit if chi2 is given,
+    like the pcov of curve_fit). Returns chi^2 on the grid and the Interval.
+    """
+    x, y, sigma, popt, grid = (np.asarray(a, dtype=float) for a in (x, y, sigma, popt, grid))
+    p0 = np.tile(popt, (len(grid), 1))
+    p0[:, index] = grid
+    p, chi2_grid, converged = fit_batch(model, x, y, sigma, p0, fixed=index)
+    chi2_grid = np.where(converged, chi2_grid, np.nan)
+    scale = (len(x) - len(popt)) / chi2 if chi2 is not None else 1.0
+    delta = (chi2_grid - np.nanmin(chi2_grid)) * scale
+    best = int(np.nanargmin(delta))
+    lower = _crossing(grid[:best+1][::-1], delta[:best+1][::-1])
+    upper = _crossing(grid[best:], delta[best:])
+    return chi2_grid, Interval(popt[index], lower, upper, (upper - lower) / 2)
+
+
+def _crossing(grid, delta, up=1.0):
+    # first point where delta goes above up (linear interpolation), NaN if it never does
+    above = np.nonzero(delta > up)[0]
+    if len(above) == 0 or above[0] == 0:
+        return np.nan
+    i = above[0]
+    return grid[i-1] + (up - delta[i-1]) / (delta[i] - delta[i-1]) * (grid[i] - grid[i-1])
+
+
+#---all at once----------------------------------------------
+def analyse(model, x, y, sigma, p0, kind='parametric', n=resamples, profile_parameter=None, grid=None,
+            absolute_sigma=False, processes=None):
+    """
+    Nominal fit, bootstrap intervals of all parameters and optionally the profile interval of
+    profile_parameter (name or index) on grid (default: +-5 sigma of curve_fit in 201 points).
+    """
+    model_ = _model(model)
+    x, y, sigma = (np.asarray(a, dtype=float) for a in (x, y, sigma))
+    popt, pcov, chi2 = nominal(model_, x, y, sigma, p0, absolute_sigma)
+    scaled = None if absolute_sigma else chi2
+    samples = bootstrap(model, x, y, sigma, popt, kind, n, scaled, processes)
+    intervals = {name: interval(samples[:, i], popt[i]) for i, name in enumerate(model_.names)}
+    result = None
+    if profile_parameter is not None:
+        index = model_.names.index(profile_parameter) if isinstance(profile_parameter, str) else profile_parameter
+        if grid is None:
+            error = np.sqrt(pcov[index, index])
+            grid = np.linspace(popt[index] - 5*error, popt[index] + 5*error, 201)
+        result = profile(model_, x, y, sigma, popt, index, grid, scaled)[1]
+    return Result(popt, pcov, chi2, samples, intervals, result)
+
+
+if __name__ == '__main__':
+    fname = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'lifetime_Neumann_Striebel.txt')
+    wait, avg, std = np.genfromtxt(fname, delimiter=',', unpack=True)
+    for kind in ('parametric', 'nonparametric'):
+        start = time.perf_counter()
+        result = analyse('lifetime', wait, avg, std, lifetimefit.guess, kind, profile_parameter='tau')
+        t = time.perf_counter() - start
+        tau = result.intervals['tau']
+        print('{} bootstrap, {} of {} refits in {:.2f} s'.format(kind, len(result.samples), resamples, t))
+        print('  tau = {:.2f} ms, curve_fit +- {:.2f}, bootstrap [{:.2f}, {:.2f}] (std {:.2f}), profile [{:.2f}, {:.2f}]'
+              .format(tau.value, np.sqrt(result.pcov[1, 1]), tau.lower, tau.upper, tau.sigma,
+                      result.profile.lower, result.profile.upper))
@@ -0,0 +1,102 @@
+#---Benchmark of the batch spot detection of F69-----------------------------
+# The notebook way: fit_spots of fit_spots.ipynb in a loop (blob_dog on the
+# whole image, cut afterwards, figure and _spots.txt for every file; the
+# image is read with PIL instead of cv2, the gray values are the same for
+# the L png files). The spots.py way: spots.process on the same directory
+# without plots, with one process and with the pool.
+# 1. Topaz1.png and Pyrit2.png: spot lists of both must be identical
+# 2. a directory of copies of both images upscaled by a factor of upscale
+#    (regions and beam stop scaled too), like high resolution exposures
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from PIL import Image
+from skimage.feature import blob_dog
+
+import spots
+
+#---Settings------------------------------------------------
+path = os.path.dirname(os.path.abspath(__file__))
+upscale = 3
+copies = 4          # copies of every image in the high resolution directory
+processes = None    # None: one per CPU
+#-----------------------------------------------------------
+
+
+def notebook_fit_spots(filename, min_x, max_x, min_y, max_y, center_x, center_y, center_radius):
+    # fit_spots of the notebook (PIL for cv2), returns the list of (x, y) it writes
+    name = filename.split('.')[0]
+    results = open(f"{name}_spots.txt", "w")
+    img = np.asarray(Image.open(filename).convert('L'))
+    blobs = blob_dog(img, min_sigma=1, max_sigma=10, threshold=0.18, overlap=0)
+
+    fig, ax = plt.subplots(figsize=(15, 10))
+    ax.imshow(img, cmap='gray')
+    found = []
+    for blob in blobs:
+        y, x, r = blob
+        if (
+            (min_x < x < max_x) and (min_y < y < max_y)
+            and not ((x - center_x)**2 + (y - center_y)**2 < center_radius**2)
+        ):
+            c = plt.Circle((x, y), 5, color='yellow', linewidth=2, fill=False)
+            ax.add_patch(c)
+            results.write(f'{int(x)}\t{int(y)}\n')
+            found.append((int(x), int(y)))
+
+    results.close()
+    c = plt.Circle((center_x, center_y), center_radius, color='black')
+    ax.add_patch(c)
+    ax.axis('off')
+    fig.savefig(f'{name}_fitted_spots.png')
+    plt.close(fig)
+    return found
+
+
+def notebook_loop(directory, regions, beam_stop):
+    found = {}
+    for name in sorted(regions):
+        found[name] = notebook_fit_spots(os.path.join(directory, name), *regions[name], *beam_stop)
+    return found
+
+
+def compare(label, directory, regions, beam_stop):
+    start = time.perf_counter()
+    reference = notebook_loop(directory, regions, beam_stop)
+    t_notebook = time.perf_counter() - start
+    print('{}: {} images, notebook loop {:.2f} s'.format(label, len(regions), t_notebook))
+    for procs, name in ((1, '1 process'), (processes, 'pool')):
+        start = time.perf_counter()
+        result = spots.process(directory, regions=regions, beam_stop=beam_stop, processes=procs)
+        t = time.perf_counter() - start
+        same = all([(int(s.x), int(s.y)) for s in result[n]] == reference[n] for n in regions)
+        print('  spots.process, {:<9} {:.2f} s ({:.1f}x), {} spots, identical to the notebook: {}'.format(
+            name + ':', t, t_notebook / t, sum(len(s) for s in result.values()), same))
+
+
+if __name__ == '__main__':
+    directory = tempfile.mkdtemp()
+    try:
+        for name in spots.regions:
+            shutil.copy(os.path.join(path, name), directory)
+        compare('notebook images', directory, spots.regions, spots.beam_stop)
+
+        shutil.rmtree(directory)
+        directory = tempfile.mkdtemp()
+        regions = {}
+        for name, region in spots.regions.items():
+            image = Image.open(os.path.join(path, name)).convert('L')
+            image = image.resize((image.width*upscale, image.height*upscale), Image.BICUBIC)
+            for i in range(copies):
+                copy = '{}_{}.png'.format(os.path.splitext(name)[0], i)
+                image.save(os.path.join(directory, copy))
+                regions[copy] = tuple(upscale*v for v in region)
+        beam_stop = tuple(upscale*v for v in spots.beam_stop)
+        compare('{}x upscaled copies'.format(upscale), directory, regions, beam_stop)
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,327 @@
+import os
+import glob
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib.pyplot as plt
+from PIL import Image
+from scipy.ndimage import gaussian_filter
+from scipy.spatial import cKDTree
+
+# Batch spot detection of the Laue images, the blob_dog of fit_spots in
+# fit_spots.ipynb without the work on the parts of the image that are thrown
+# away afterwards:
+#   1. only the region of interest (min_x, max_x, min_y, max_y), grown by the
+#      reach of the blob pruning, is searched and the maxima in the beam stop
+#      are dropped before the pruning (the Gaussian filters see halo pixels
+#      around every tile, so the difference of Gaussians is the same as for the
+#      whole image)
+#   2. the search region is split into tiles, the tiles of all images are
+#      processed on one process pool, a maximum belongs to the tile whose core
+#      contains it and the maxima of all tiles are pruned together, so blobs
+#      across a tile seam are merged like in blob_dog
+#   3. the blobs are cut to the region and the beam stop of the notebook and
+#      the centres are refined with a 2-D Gaussian fit of all spots at once
+#      (Levenberg-Marquardt on the stack of patches)
+# Plots and the _spots.txt files are only written when asked for.
+#   spots = spots.process('.')              # name -> list of Spot
+#   spots.fit_spots('Topaz1.png', 0, 800, 50, 600, 489, 325, 50)   # like the notebook
+
+#---Settings------------------------------------------------
+min_sigma = 1       # px, blob_dog of the notebook
+max_sigma = 10      # px
+sigma_ratio = 1.6
+threshold = 0.18    # of the DoG of the image scaled to [0, 1]
+overlap = 0         # blobs overlapping by more than this are pruned
+tile = 512          # px, edge of the tiles of the search region on a pool
+fit_half_width = 4  # px, the Gaussian fit uses a (2*fit_half_width + 1)^2 patch
+fit_iterations = 30
+# (min_x, max_x, min_y, max_y) of the images of the notebook, else the whole image
+regions = {
+    'Topaz1.png': (0, 800, 50, 600),
+    'Pyrit2.png': (200, 800, 100, 550),
+}
+beam_stop = (489, 325, 50)  # center_x, center_y, radius in px
+#-----------------------------------------------------------
+
+# blob position (px, like blob_dog), sigma of the DoG, fitted centre and its error
+Spot = namedtuple('Spot', ['x', 'y', 'sigma', 'x_fit', 'y_fit', 'x_err', 'y_err'])
+
+# pixels of a tile (with halo), offset of the pixels in the image, core (row0, row1, col0, col1)
+# in image coordinates, beam stop of the search (x, y, r or None) and index of the image
+Tile = namedtuple('Tile', ['pixels', 'offset', 'core', 'beam_stop', 'image'])
+
+
+def sigmas(min_sigma=min_sigma, max_sigma=max_sigma, sigma_ratio=sigma_ratio):
+    # the scales of blob_dog
+    k = int(np.log(max_sigma / min_sigma) / np.log(sigma_ratio) + 1)
+    return np.array([min_sigma * sigma_ratio**i for i in range(k + 1)])
+
+
+def halo():
+    # px around a tile: radius of the widest Gaussian (truncate 4) and the 3x3x3 maximum filter
+    return int(4*sigmas()[-1] + 0.5) + 1
+
+
+def reach():
+    # largest distance at which two blobs can overlap (radius sqrt(2)*sigma)
+    return int(np.ceil(2*np.sqrt(2)*sigmas()[-2]))
+
+
+def load(fname):
+    """Grayscale image as float in [0, 1] (like cv2 gray + img_as_float in the notebook)."""
+    return np.asarray(Image.open(fname).convert('L'), dtype=float) / 255
+
+
+#---detection------------------------------------------------
+def tiles(image, region=None, beam_stop=beam_stop, size=tile, index=0):
+    """
+    Tiles of the search region of an image: region (min_x, max_x, min_y, max_y) grown by reach().
+    size=None: one tile for the whole search region.
+    """
+    n_rows, n_cols = image.shape
+    min_x, max_x, min_y, max_y = region or (-1, n_cols, -1, n_rows)
+    d, h = reach(), halo()
+    r0, r1 = max(int(np.floor(min_y)) - d, 0), min(int(np.ceil(max_y)) + d + 1, n_rows)
+    c0, c1 = max(int(np.floor(min_x)) - d, 0), min(int(np.ceil(max_x)) + d + 1, n_cols)
+    # maxima closer than reach() to the rim of the beam stop can still prune a blob outside
+    inner = (beam_stop[0], beam_stop[1], beam_stop[2] - d) if beam_stop and beam_stop[2] > d else None
+    size = size or max(r1 - r0, c1 - c0)
+    result = []
+    for top in range(r0, r1, size):
+        for left in range(c0, c1, size):
+            core = (top, min(top + size, r1), left, min(left + size, c1))
+            if inner and _inside(core, inner):
+                continue
+            rows = slice(max(core[0] - h, 0), min(core[1] + h, n_rows))
+            cols = slice(max(core[2] - h, 0), min(core[3] + h, n_cols))
+            result.append(Tile(image[rows, cols], (rows.start, cols.start), core, inner, index))
+    return result
+
+
+def _inside(core, circle):
+    # all corners of the core in the circle
+    x, y, r = circle
+    return all((c - x)**2 + (rr - y)**2 < r**2 for rr in core[:2] for c in core[2:])
+
+
+def tile_maxima(tile):
+    """Local maxima (row, col, scale index, DoG) of the scale space of a tile, in image coordinates."""
+    scales = sigmas()
+    cube = np.empty(tile.pixels.shape + (len(scales) - 1,))
+    previous = gaussian_filter(tile.pixels, scales[0], mode='reflect')
+    for i, s in enumerate(scales[1:]):
+        current = gaussian_filter(tile.pixels, s, mode='reflect')
+        cube[..., i] = previous - current
+        previous = current
+    cube *= 1 / (sigma_ratio - 1)
+    # peak_local_max with a 3x3x3 footprint (edges 'nearest'), but only for the points above threshold
+    peaks = np.argwhere(cube > threshold)
+    values = cube[tuple(peaks.T)]
+    is_max = np.ones(len(peaks), dtype=bool)
+    for shift in np.ndindex(3, 3, 3):
+        neighbours = np.clip(peaks + np.array(shift) - 1, 0, np.array(cube.shape) - 1)
+        is_max &= values >= cube[tuple(neighbours.T)]
+    peaks, values = peaks[is_max] + [tile.offset[0], tile.offset[1], 0], values[is_max]
+    r0, r1, c0, c1 = tile.core
+    keep = (r0 <= peaks[:, 0]) & (peaks[:, 0] < r1) & (c0 <= peaks[:, 1]) & (peaks[:, 1] < c1)
+    if tile.beam_stop:
+        x, y, r = tile.beam_stop
+        keep &= (peaks[:, 1] - x)**2 + (peaks[:, 0] - y)**2 >= r**2
+    return np.column_stack([peaks[keep], values[keep]])
+
+
+def _overlap(r1, r2, d):
+    # overlapping area of two circles over the area of the smaller one (skimage blob._blob_overlap)
+    if r1 == 0 or r2 == 0 or d >= r1 + r2:
+        return 0.0
+    if d <= abs(r1 - r2):
+        return 1.0
+    a1 = r1**2 * np.arccos(np.clip((d**2 + r1**2 - r2**2) / (2*d*r1), -1, 1))
+    a2 = r2**2 * np.arccos(np.clip((d**2 + r2**2 - r1**2) / (2*d*r2), -1, 1))
+    a3 = 0.5 * np.sqrt(abs((-d + r1 + r2) * (d + r1 - r2) * (d - r1 + r2) * (d + r1 + r2)))
+    return (a1 + a2 - a3) / (np.pi * min(r1, r2)**2)
+
+
+def merge(maxima, overlap=overlap):
+    """
+    Blobs (row, col, sigma) from the maxima of all tiles of an image, in the order of blob_dog
+    (highest DoG first) and pruned like blob_dog: of two overlapping blobs the smaller goes.
+    """
+    if len(maxima) == 0:
+        return np.empty((0, 3))
+    # peak_local_max: row-major order of the whole scale space, then stable by intensity
+    order = np.lexsort((maxima[:, 2], maxima[:, 1], maxima[:, 0]))
+    maxima = maxima[order][np.argsort(-maxima[order, 3], kind='stable')]
+    blobs = np.column_stack([maxima[:, :2], sigmas()[maxima[:, 2].astype(int)]])
+    distance = 2 * blobs[:, 2].max() * np.sqrt(2)
+    for i, j in cKDTree(blobs[:, :2]).query_pairs(distance):
+        d = np.hypot(*(blobs[i, :2] - blobs[j, :2]))
+        if _overlap(blobs[i, 2]*np.sqrt(2), blobs[j, 2]*np.sqrt(2), d) > overlap:
+            if blobs[i, 2] > blobs[j, 2]:
+                blobs[j, 2] = 0
+            else:
+                blobs[i, 2] = 0
+    return blobs[blobs[:, 2] > 0]
+
+
+def select(blobs, region=None, beam_stop=beam_stop):
+    # the cut of fit_spots: inside the region, outside the beam stop
+    y, x = blobs[:, 0], blobs[:, 1]
+    keep = np.ones(len(blobs), dtype=bool)
+    if region:
+        min_x, max_x, min_y, max_y = region
+        keep &= (min_x < x) & (x < max_x) & (min_y < y) & (y < max_y)
+    if beam_stop:
+        center_x, center_y, radius = beam_stop
+        keep &= ~((x - center_x)**2 + (y - center_y)**2 < radius**2)
+    return blobs[keep]
+
+
+def detect(images, regions=None, beam_stops=None, processes=None, chunksize=1):
+    """
+    Blobs (row, col, sigma) of a list of images (arrays from load), the tiles of
+    all images on one pool (processes=1: in this process, without tiles, the
+    halos of the tiles only pay off on several CPUs).
+    regions, beam_stops: one per image (None: whole image, no beam stop).
+    """
+    regions = regions or [None] * len(images)
+    beam_stops = beam_stops or [None] * len(images)
+    serial = (processes or os.cpu_count()) == 1
+    jobs = [t for i, (image, region, stop) in enumerate(zip(images, regions, beam_stops))
+            for t in tiles(image, region, stop, None if serial else tile, index=i)]
+    if serial or len(jobs) < 2:
+        maxima = [tile_maxima(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            maxima = list(pool.map(tile_maxima, jobs, chunksize=chunksize))
+    result = []
+    for i, (region, stop) in enumerate(zip(regions, beam_stops)):
+        found = [m for job, m in zip(jobs, maxima) if job.image == i]
+        result.append(select(merge(np.concatenate(found) if found else np.empty((0, 4))), region, stop))
+    return result
+
+
+#---sub-pixel centres----------------------------------------
+def _gauss2d(p, x, y, data):
+    # residuals and Jacobian of A exp(-((x-x0)^2 + (y-y0)^2) / (2 s^2)) + c for a stack of patches
+    A, x0, y0, s, c = (p[:, i:i+1] for i in range(5))
+    dx, dy = x - x0, y - y0
+    e = np.exp(-(dx**2 + dy**2) / (2*s**2))
+    residuals = A*e + c - data
+    J = np.stack([e, A*e*dx/s**2, A*e*dy/s**2, A*e*(dx**2 + dy**2)/s**3, np.ones_like(e)], axis=-1)
+    return residuals, J
+
+
+def refine(image, blobs, half_width=fit_half_width, iterations=fit_iterations):
+    """
+    Spots with the centres of a 2-D Gaussian fit of the patch around every blob,
+    all blobs at once. Fits that leave the patch keep the blob position (errors NaN).
+    """
+    n, w = len(blobs), half_width
+    if n == 0:
+        return []
+    padded = np.pad(image, w, mode='edge')
+    dy, dx = np.mgrid[-w:w+1, -w:w+1]
+    rows, cols = blobs[:, 0].astype(int), blobs[:, 1].astype(int)
+    data = padded[rows[:, None] + w + dy.ravel(), cols[:, None] + w + dx.ravel()]
+    x, y = dx.ravel().astype(float), dy.ravel().astype(float)
+
+    p = np.column_stack([data.max(1) - data.min(1), np.zeros(n), np.zeros(n), blobs[:, 2], data.min(1)])
+    residuals, J = _gauss2d(p, x, y, data)
+    cost = np.sum(residuals**2, axis=1)
+    damping = np.full(n, 1e-3)
+    for _ in range(iterations):
+        JTJ = np.einsum('nmi,nmj->nij', J, J)
+        g = np.einsum('nmi,nm->ni', J, residuals)
+        diagonal = np.einsum('nii->ni', JTJ)
+        A = JTJ + (damping[:, None] * diagonal + 1e-12)[:, :, None] * np.eye(5)
+        step = np.linalg.solve(A, -g[..., None])[..., 0]
+        new_residuals, new_J = _gauss2d(p + step, x, y, data)
+        new_cost = np.sum(new_residuals**2, axis=1)
+        better = np.isfinite(new_cost) & (new_cost < cost)
+        p[better], residuals[better], J[better], cost[better] = (p + step)[better], new_residuals[better], \
+            new_J[better], new_cost[better]
+        damping = np.where(better, damping / 10, damping * 10)
+
+    cov = np.linalg.pinv(np.einsum('nmi,nmj->nij', J, J)) * (cost / (len(x) - 5))[:, None, None]
+    errors = np.sqrt(np.abs(np.einsum('nii->ni', cov)))
+    ok = np.all(np.isfinite(p), axis=1) & (np.abs(p[:, 1]) <= w) & (np.abs(p[:, 2]) <= w) & (p[:, 0] > 0)
+    spots = []
+    for (row, col, sigma), q, err, good in zip(blobs, p, errors, ok):
+        if good:
+            spots.append(Spot(col, row, sigma, col + q[1], row + q[2], err[1], err[2]))
+        else:
+            spots.append(Spot(col, row, sigma, col, row, np.nan, np.nan))
+    return spots
+
+
+#---files----------------------------------------------------
+def write_spots(fname, spots, fitted=False):
+    """name_spots.txt like fit_spots (int x, int y per line), fitted=True: the fitted centres and errors."""
+    with open(fname, 'w') as f:
+        for spot in spots:
+            if fitted:
+                f.write('{:.2f}\t{:.2f}\t{:.2f}\t{:.2f}\n'.format(spot.x_fit, spot.y_fit, spot.x_err, spot.y_err))
+            else:
+                f.write(f'{int(spot.x)}\t{int(spot.y)}\n')
+
+
+def plot_spots(fname, image, spots, beam_stop=beam_stop):
+    """The figure of fit_spots: image, spots in yellow, beam stop in black."""
+    fig, ax = plt.subplots(figsize=(15, 10))
+    ax.imshow(image, cmap='gray')
+    for spot in spots:
+        ax.add_patch(plt.Circle((spot.x_fit, spot.y_fit), 5, color='yellow', linewidth=2, fill=False))
+    if beam_stop:
+        ax.add_patch(plt.Circle(beam_stop[:2], beam_stop[2], color='black'))
+    ax.axis('off')
+    fig.savefig(fname)
+    plt.close(fig)
+
+
+def process(path='.', pattern='*.png', regions=regions, beam_stop=beam_stop, processes=None, plot=False,
+            write=False):
+    """
+    Spots of all images in path: name -> list of Spot. regions: name -> (min_x, max_x, min_y, max_y).
+    plot / write: name_fitted_spots.png / name_spots.txt next to the images.
+    """
+    fnames = [f for f in sorted(glob.glob(os.path.join(path, pattern))) if not f.endswith('_fitted_spots.png')]
+    images = [load(f) for f in fnames]
+    names = [os.path.basename(f) for f in fnames]
+    blobs = detect(images, [regions.get(name) for name in names], [beam_stop] * len(names), processes)
+    result = {}
+    for fname, name, image, b in zip(fnames, names, images, blobs):
+        result[name] = refine(image, b)
+        base = os.path.splitext(fname)[0]
+        if write:
+            write_spots(f'{base}_spots.txt', result[name])
+        if plot:
+            plot_spots(f'{base}_fitted_spots.png', image, result[name], beam_stop)
+    return result
+
+
+def fit_spots(filename, min_x, max_x, min_y, max_y, center_x, center_y, center_radius, plot=True, write=True):
+    """fit_spots of the notebook (same arguments and files), returns the list of Spot."""
+    image = load(filename)
+    stop = (center_x, center_y, center_radius)
+    blobs = detect([image], [(min_x, max_x, min_y, max_y)], [stop], processes=1)[0]
+    spots = refine(image, blobs)
+    name = filename.split('.')[0]
+    if write:
+        write_spots(f'{name}_spots.txt', spots)
+    if plot:
+        plot_spots(f'{name}_fitted_spots.png', image, spots, stop)
+    return spots
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    result = process(os.path.dirname(os.path.abspath(__file__)))
+    print('{} images in {:.0f} ms'.format(len(result), (time.perf_counter() - start)*1e3))
+    for name, spots in result.items():
+        print(name, len(spots), 'spots')
+        for spot in spots:
+            print('  {:4.0f} {:4.0f}  ->  {:7.2f} +- {:.2f}  {:7.2f} +- {:.2f}'.format(
+                spot.x, spot.y, spot.x_fit, spot.x_err, spot.y_fit, spot.y_err))
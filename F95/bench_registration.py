@@ -0,0 +1,84 @@
+#---Benchmark of the all-pairs registration of Aufgabe 1 of F95-------------
+# The camera images Bild1..Bild10.jpg are not in the repository, only the
+# imshowpair figures Bilder_i_j.png of Aufgabe1_Franka_Nick.m. The green
+# channel of the axes of Bilder_i_i.png is image i (with the contrast
+# stretch of imshowpair), it is cut out and scaled back to 640x480.
+# 1. one pair at a time like the MATLAB loop: both images loaded, converted
+#    and transformed for every pair, full resolution phase correlation,
+#    MI with np.histogram2d
+# 2. registration.study: every image loaded and transformed once, pyramid,
+#    all pairs on the pool (1 process and processes)
+# dx, dy are compared with aufgabe1_parameter.txt for the pairs that the
+# notebook counts as good registrations (|dist| <= 12 cm).
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+from PIL import Image
+
+import registration
+
+#---Settings------------------------------------------------
+path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'aufgabe1')
+axes = (slice(43, 792), slice(145, 1144))  # px of the image in the figures
+processes = None    # None: one per CPU
+#-----------------------------------------------------------
+
+
+def extract(directory):
+    fnames = []
+    for i in range(1, 11):
+        figure = plt.imread(os.path.join(path, 'Bilder', 'Bilder_{}_{}.png'.format(i, i)))
+        green = (figure[axes + (1, )] * 255).round().astype(np.uint8)
+        fnames.append(os.path.join(directory, 'Bild{}.png'.format(i)))
+        Image.fromarray(green).resize((640, 480), Image.BILINEAR).save(fnames[-1])
+    return fnames
+
+
+def one_by_one(fnames):
+    pairs = []
+    for i, f1 in enumerate(fnames):
+        for j, f2 in enumerate(fnames):
+            orig, mov = registration.load(f1, levels=1), registration.load(f2, levels=1)
+            dx, dy = registration.register(orig, mov)
+            moved = registration.warp(mov.gray, dx, dy)
+            joint = np.histogram2d(orig.gray.ravel(), moved.ravel(), bins=registration.n_bins,
+                                   range=[[0, 256], [0, 256]])[0]
+            p = joint / joint.sum()
+            pa, pb = p.sum(axis=1), p.sum(axis=0)
+            nz = p > 0
+            MI = np.sum(p[nz] * np.log2(p[nz] / np.outer(pa, pb)[nz]))
+            pairs.append(registration.Pair(i + 1, j + 1, registration.distances[i] - registration.distances[j],
+                                           dx, dy, MI, registration.msd(orig.gray, moved)))
+    return pairs
+
+
+if __name__ == '__main__':
+    directory = tempfile.mkdtemp()
+    try:
+        fnames = extract(directory)
+        start = time.perf_counter()
+        reference = one_by_one(fnames)
+        t_loop = time.perf_counter() - start
+        print('one pair at a time:           {:.2f} s for {} pairs'.format(t_loop, len(reference)))
+        for procs, label in ((1, '1 process'), (processes, 'pool')):
+            start = time.perf_counter()
+            pairs = registration.study(fnames, processes=procs)
+            t = time.perf_counter() - start
+            print('registration.study, {:<10} {:.2f} s ({:.1f}x)'.format(label + ':', t, t_loop / t))
+        same = max(max(abs(p.dx - r.dx), abs(p.dy - r.dy), abs(p.MI - r.MI)) for p, r in zip(pairs, reference))
+        print('max difference to one pair at a time (dx, dy, MI): {:.2g}'.format(same))
+    finally:
+        shutil.rmtree(directory)
+
+    table = np.loadtxt(os.path.join(path, 'aufgabe1_parameter.txt'), skiprows=1)
+    good = np.abs(table[:, 2]) <= 12
+    dx, dy = np.array([p.dx for p in pairs]), np.array([p.dy for p in pairs])
+    print('|dx - dx_matlab| for |dist| <= 12 cm: median {:.2f} px, max {:.2f} px ({} pairs)'.format(
+        np.median(np.abs(dx - table[:, 3])[good]), np.max(np.abs(dx - table[:, 3])[good]), good.sum()))
+    print('|dy - dy_matlab| for |dist| <= 12 cm: median {:.2f} px, max {:.2f} px'.format(
+        np.median(np.abs(dy - table[:, 4])[good]), np.max(np.abs(dy - table[:, 4])[good])))
+    a, b = np.polyfit(table[:, 2], dx, 1)
+    print('dx = a*dist + b over all pairs: a = {:.3f} px/cm (notebook, good pairs only: 5.060 +- 0.017)'.format(a))
@@ -0,0 +1,204 @@
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+
+# Translation registration of all image pairs of Aufgabe 1 in Python, instead
+# of the loop of imregtform / imwarp / mutualInfo in Aufgabe1_Franka_Nick.m:
+#   1. every image is loaded once, converted like rgb2gray and a pyramid of
+#      levels (2x2 means) is built; the Hann-windowed FFT of every level is
+#      kept as a pure phase spectrum F/|F|
+#   2. dx, dy of a pair by phase correlation, coarse to fine: the full inverse
+#      FFT of the cross power spectrum on the coarsest level, on the finer
+#      levels the correlation only at +-radius px around the doubled estimate
+#      and on the full image at 1/upsample px (DFT as matrix products)
+#   3. the moving image is shifted like imwarp (linear, zero outside, uint8)
+#      and MI (joint histogram of nBins x nBins, bits) and MSD are computed
+#      against the original
+# All pairs run on a process pool, the spectra go to every worker only once.
+#   pairs = registration.study(['Bild{}.jpg'.format(i) for i in range(1, 11)])
+#   registration.write_table('aufgabe1_parameter.txt', pairs)
+
+#---Settings------------------------------------------------
+distances = [0, 1, 2, 4, 6, 9, 12, 16, 21, 30]   # cm, positions of Bild1..Bild10 (Aufgabe1_Franka_Nick.m)
+levels = 3          # pyramid levels (1: full image only)
+radius = 2          # px, search around the estimate of the coarser level
+upsample = 20       # sub-pixel steps per px on the full image
+n_bins = 256        # bins per image of the joint histogram of MI
+uint8_msd = True    # difference and square saturate at 0 and 255 like uint8 in MATLAB
+#-----------------------------------------------------------
+
+header = 'orig\tmov\tdist\tdx\tdy\tMI\tMSD\n'
+
+# an image: name, gray values (uint8) and the phase spectra of the pyramid levels (full image first)
+Frame = namedtuple('Frame', ['name', 'gray', 'spectra'])
+
+# one line of aufgabe1_parameter.txt (orig and mov count from 1)
+Pair = namedtuple('Pair', ['orig', 'mov', 'dist', 'dx', 'dy', 'MI', 'MSD'])
+
+
+def rgb2gray(rgb):
+    # weights and rounding of MATLAB rgb2gray for uint8
+    if rgb.ndim == 2:
+        return rgb
+    gray = rgb[..., :3].astype(float) @ [0.298936021293775, 0.587043074451121, 0.114020904255103]
+    return np.clip(np.round(gray), 0, 255).astype(np.uint8)
+
+
+def pyramid(gray, levels=levels):
+    """Full image and levels-1 halvings (means of 2x2 pixels)."""
+    result = [np.asarray(gray, dtype=float)]
+    for _ in range(levels - 1):
+        image = result[-1]
+        rows, cols = image.shape[0] // 2 * 2, image.shape[1] // 2 * 2
+        result.append(image[:rows, :cols].reshape(rows // 2, 2, cols // 2, 2).mean(axis=(1, 3)))
+    return result
+
+
+def phase_spectrum(image):
+    # FFT of the Hann windowed image (without mean), only the phase
+    window = np.outer(np.hanning(image.shape[0]), np.hanning(image.shape[1]))
+    F = np.fft.fft2((image - image.mean()) * window)
+    return F / np.maximum(np.abs(F), 1e-12)
+
+
+def load(fname, levels=levels):
+    """Frame of an image file: loaded, converted to gray and transformed once."""
+    gray = rgb2gray(np.asarray(Image.open(fname)))
+    return Frame(os.path.basename(fname), gray, [phase_spectrum(level) for level in pyramid(gray, levels)])
+
+
+#---registration---------------------------------------------
+def correlation_at(R, rows, cols):
+    """Inverse DFT of the cross power spectrum R at the shifts rows x cols (px, may be fractional)."""
+    fy, fx = np.fft.fftfreq(R.shape[0]), np.fft.fftfreq(R.shape[1])
+    Ey = np.exp(2j*np.pi*np.outer(rows, fy))
+    Ex = np.exp(2j*np.pi*np.outer(fx, cols))
+    return (Ey @ R @ Ex).real / R.size
+
+
+def _peak(c, rows, cols):
+    i, j = np.unravel_index(np.argmax(c), c.shape)
+    return rows[i], cols[j]
+
+
+def register(orig, mov, radius=radius, upsample=upsample):
+    """
+    (dx, dy) in px of the translation that moves mov onto orig (T.T(3,1), T.T(3,2) of imregtform):
+    orig(x, y) ~ mov(x - dx, y - dy).
+    """
+    R = orig.spectra[-1] * np.conj(mov.spectra[-1])
+    c = np.fft.ifft2(R).real
+    dy, dx = np.unravel_index(np.argmax(c), c.shape)
+    # shifts beyond half the image are negative
+    dy = dy - c.shape[0] if dy > c.shape[0] // 2 else dy
+    dx = dx - c.shape[1] if dx > c.shape[1] // 2 else dx
+    for level in range(len(orig.spectra) - 2, -1, -1):
+        R = orig.spectra[level] * np.conj(mov.spectra[level])
+        rows, cols = np.arange(2*dy - radius, 2*dy + radius + 1), np.arange(2*dx - radius, 2*dx + radius + 1)
+        dy, dx = _peak(correlation_at(R, rows, cols), rows, cols)
+    if upsample > 1:
+        R = orig.spectra[0] * np.conj(mov.spectra[0])
+        steps = np.arange(-upsample, upsample + 1) / upsample
+        rows, cols = dy + steps, dx + steps
+        dy, dx = _peak(correlation_at(R, rows, cols), rows, cols)
+    return float(dx), float(dy)
+
+
+def _shifted(image, oy, ox):
+    # image(y + oy, x + ox) for integer offsets, 0 outside
+    out = np.zeros_like(image)
+    rows, cols = image.shape
+    ys, xs = slice(max(-oy, 0), min(rows - oy, rows)), slice(max(-ox, 0), min(cols - ox, cols))
+    if ys.start < ys.stop and xs.start < xs.stop:
+        out[ys, xs] = image[ys.start + oy: ys.stop + oy, xs.start + ox: xs.stop + ox]
+    return out
+
+
+def warp(gray, dx, dy):
+    """imwarp of the moving image with OutputView of the original: bilinear, 0 outside, uint8."""
+    image = gray.astype(float)
+    iy, ix = int(np.floor(-dy)), int(np.floor(-dx))
+    fy, fx = -dy - iy, -dx - ix
+    moved = (1 - fy) * ((1 - fx) * _shifted(image, iy, ix) + fx * _shifted(image, iy, ix + 1)) \
+        + fy * ((1 - fx) * _shifted(image, iy + 1, ix) + fx * _shifted(image, iy + 1, ix + 1))
+    return np.clip(np.round(moved), 0, 255).astype(np.uint8)
+
+
+def mutual_info(a, b, n_bins=n_bins):
+    """Mutual information in bits of two uint8 images from their joint histogram of n_bins x n_bins."""
+    ia = (a.astype(np.int64) * n_bins) >> 8
+    ib = (b.astype(np.int64) * n_bins) >> 8
+    joint = np.bincount((ia * n_bins + ib).ravel(), minlength=n_bins*n_bins).reshape(n_bins, n_bins)
+    p = joint / joint.sum()
+    pa, pb = p.sum(axis=1), p.sum(axis=0)
+    nz = p > 0
+    return float(np.sum(p[nz] * np.log2(p[nz] / np.outer(pa, pb)[nz])))
+
+
+def msd(a, b, saturate=uint8_msd):
+    """Mean squared difference; saturate: (a - b).^2 of uint8 in MATLAB (clipped to 0..255 twice)."""
+    if saturate:
+        d = np.clip(a.astype(float) - b, 0, 255)
+        return float(np.mean(np.minimum(d*d, 255)))
+    d = a.astype(float) - b
+    return float(np.mean(d*d))
+
+
+def evaluate(orig, mov, n_bins=n_bins):
+    """dx, dy, MI and MSD of a pair of frames."""
+    dx, dy = register(orig, mov)
+    moved = warp(mov.gray, dx, dy)
+    return dx, dy, mutual_info(orig.gray, moved, n_bins), msd(orig.gray, moved)
+
+
+#---all pairs------------------------------------------------
+_frames = None
+
+
+def _init(frames):
+    global _frames
+    _frames = frames
+
+
+def _evaluate(job):
+    i, j, n_bins = job
+    return evaluate(_frames[i], _frames[j], n_bins)
+
+
+def study(fnames, distances=distances, n_bins=n_bins, levels=levels, processes=None, chunksize=5):
+    """
+    All pairs (orig, mov) of the images, orig and mov in file order, as Pair.
+    distances: cm of every image (dist = distances[orig] - distances[mov]).
+    processes=1: in this process.
+    """
+    frames = [load(f, levels) for f in fnames]
+    jobs = [(i, j, n_bins) for i in range(len(frames)) for j in range(len(frames))]
+    if processes == 1:
+        _init(frames)
+        results = [_evaluate(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(processes, initializer=_init, initargs=(frames, )) as pool:
+            results = list(pool.map(_evaluate, jobs, chunksize=chunksize))
+    return [Pair(i + 1, j + 1, distances[i] - distances[j], *result) for (i, j, _), result in zip(jobs, results)]
+
+
+def write_table(fname, pairs):
+    """The table of Aufgabe1_Franka_Nick.m (orig mov dist dx dy MI MSD)."""
+    with open(fname, 'w') as f:
+        f.write(header)
+        for p in pairs:
+            f.write('%d\t%d\t%.3f\t%.3f\t%.3f\t%.3f\t%.3f\n' % p)
+
+
+if __name__ == '__main__':
+    # python registration.py <directory with Bild1.jpg .. Bild10.jpg> [output]
+    path = sys.argv[1] if len(sys.argv) > 1 else '.'
+    out = sys.argv[2] if len(sys.argv) > 2 else 'aufgabe1_parameter.txt'
+    start = time.perf_counter()
+    pairs = study([os.path.join(path, 'Bild{}.jpg'.format(i)) for i in range(1, len(distances) + 1)])
+    write_table(out, pairs)
+    print('{} pairs in {:.2f} s -> {}'.format(len(pairs), time.perf_counter() - start, out))
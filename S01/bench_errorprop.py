@@ -0,0 +1,91 @@
+#---Benchmark of the compiled error propagation of S01-----------------------
+# The notebook way (S01_error_prop_01.ipynb): the formula of error_prop_corr
+# (cylinder b) and transform_cov (r, theta of c), evaluated point by point with
+# subs and evalf. The symbolic evaluation is timed on n_symbolic points and
+# scaled to n_points, errorprop runs on all n_points (first call with the
+# differentiation and lambdify, then from the cache).
+import time
+import numpy as np
+from sympy import diff, simplify, sqrt, sympify, atan2, pi, symbols, Symbol
+
+import errorprop
+
+#---Settings------------------------------------------------
+n_points = 10**5
+n_symbolic = 200    # points of the symbolic evaluation
+#-----------------------------------------------------------
+
+
+def error_prop_corr(f, vars, cov):
+    sum = sympify("0")
+    for i in range(len(vars)):
+        for j in range(len(vars)):
+            sum += diff(f, vars[i]) * diff(f, vars[j]) * cov[i][j]
+    return sqrt(simplify(sum))
+
+
+def notebook_transform_cov(cov, f1, f2, vars, rho, _rho):
+    G = np.array([[diff(f1, vars[0]), diff(f1, vars[1])],
+                  [diff(f2, vars[0]), diff(f2, vars[1])]])
+    U = (G.dot(cov.dot(G.T)))
+    for i in range(2):
+        for j in range(2):
+            U[i, j] = simplify(U[i, j].subs([(rho, _rho)]).evalf())
+    return U
+
+
+def report(label, t_symbolic, t_first, t_cached, difference):
+    t_scaled = t_symbolic * n_points / n_symbolic
+    print('{}\n  symbolic: {:.1f} ms per point, {:.0f} s for {} points (scaled from {})'.format(
+        label, t_symbolic / n_symbolic * 1e3, t_scaled, n_points, n_symbolic))
+    print('  errorprop: {:.3f} s first call, {:.4f} s cached ({:.0f}x), max relative difference {:.1e}'.format(
+        t_first, t_cached, t_scaled / t_cached, difference))
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    rho = Symbol('rho', real=True)
+
+    # b) cylinder, correlated
+    r, h, sigma_r, sigma_h = symbols('r, h, sigma_r, sigma_h', positive=True)
+    V = pi * r**2 * h
+    rs, hs = rng.uniform(1, 3, n_points), rng.uniform(2, 4, n_points)
+    srs, shs, rhos = rng.uniform(0.01, 0.1, n_points), rng.uniform(0.01, 0.1, n_points), rng.uniform(-1, 1, n_points)
+    start = time.perf_counter()
+    cov = [[sigma_r**2, rho * sigma_r * sigma_h], [rho * sigma_r * sigma_h, sigma_h**2]]
+    sigma_V = error_prop_corr(V, [r, h], cov)
+    symbolic = [float(sigma_V.subs([(r, rs[k]), (sigma_r, srs[k]), (h, hs[k]), (sigma_h, shs[k]), (rho, rhos[k])])
+                      .evalf()) for k in range(n_symbolic)]
+    t_symbolic = time.perf_counter() - start
+    errorprop.clear_cache()
+    corr = np.ones((n_points, 2, 2))
+    corr[:, 0, 1] = corr[:, 1, 0] = rhos
+    times = []
+    for _ in range(2):
+        start = time.perf_counter()
+        value, sigma = errorprop.error(V, [r, h], [rs, hs], sigmas=[srs, shs], corr=corr)
+        times.append(time.perf_counter() - start)
+    report('cylinder V = pi r^2 h, correlated', t_symbolic, *times,
+           np.max(np.abs(sigma[:n_symbolic] / symbolic - 1)))
+
+    # c) r, theta
+    x, y = symbols('x, y')
+    sigma_x, sigma_y = symbols('sigma_x, sigma_y', positive=True)
+    xs, ys = rng.normal(0, 10, n_points), rng.normal(0, 10, n_points)
+    sxs, sys_ = rng.uniform(0.05, 0.2, n_points), rng.uniform(0.05, 0.2, n_points)
+    transformation = [sqrt(x**2 + y**2), atan2(y, x)]
+    start = time.perf_counter()
+    V = np.array([[sigma_x**2, rho * sigma_x * sigma_y], [rho * sigma_x * sigma_y, sigma_y**2]])
+    U = notebook_transform_cov(V, *transformation, [x, y], rho, 0)
+    symbolic = np.array([[[float(U[i, j].subs([(x, xs[k]), (y, ys[k]), (sigma_x, sxs[k]), (sigma_y, sys_[k])]))
+                           for j in range(2)] for i in range(2)] for k in range(n_symbolic)])
+    t_symbolic = time.perf_counter() - start
+    errorprop.clear_cache()
+    cov = errorprop.covariance(np.column_stack([sxs, sys_]))
+    times = []
+    for _ in range(2):
+        start = time.perf_counter()
+        values, U = errorprop.transform_cov(transformation, [x, y], [xs, ys], cov)
+        times.append(time.perf_counter() - start)
+    report('transform_cov r, theta, uncorrelated', t_symbolic, *times,
+           np.max(np.abs(U[:n_symbolic] - symbolic) / np.abs(symbolic).max(axis=(1, 2))[:, None, None]))
@@ -0,0 +1,89 @@
+#---Benchmark of the toy Monte Carlo of S01----------------------------------
+# 1. lifetime, tau = 2, n = 500: the ensemble of S01_ml_01.ipynb c) (list of
+#    generate_data, mean and tau/sqrt(n) per data set) against toymc.run, with
+#    the times drawn (events=True) and with the Gamma distributed sums
+# 2. the Delta ln L = 0.5 intervals of the closed form against the Newton
+#    steps and against the grid scan of all toys in one broadcast
+# 3. polynomial: the fit of S01_least_squares_01.ipynb a) for one toy at a
+#    time (curve_fit) against toymc.run
+import time
+import numpy as np
+from scipy.optimize import curve_fit
+
+import toymc
+
+#---Settings------------------------------------------------
+n_notebook = 10000  # toys of the one-by-one loops
+n_toys = 10**6
+processes = None    # None: one per CPU
+x = np.array([-0.75, -0.5, -0.25, 0., 0.25, 0.5, 0.75])
+sigma_y = np.array([1, 1, 0.5, 0.5, 0.5, 1, 1])
+theta = [5.0, 1.0, -4.0]
+#-----------------------------------------------------------
+
+
+def generate_data(tau, n_samples):
+    return np.random.exponential(tau, n_samples)
+
+
+def pol2(x, a, b, c):
+    return a + b*x + c*x*x
+
+
+def line(label, n, t, t_reference=None, extra=''):
+    speed = '' if t_reference is None else ', {:.0f}x faster per toy'.format(t_reference / t * n / n_notebook)
+    print('  {:<34} {:>8} toys {:7.2f} s{}{}'.format(label, n, t, speed, extra))
+
+
+if __name__ == '__main__':
+    print('lifetime, tau = 2, n = 500')
+    np.random.seed(0)
+    start = time.perf_counter()
+    data = np.array([generate_data(2, 500) for _ in range(n_notebook)])
+    tau_guess = np.mean(data, axis=1)
+    sigma_guess = tau_guess / np.sqrt(500)
+    covered = np.count_nonzero(np.abs(tau_guess - 2) < sigma_guess) / n_notebook
+    t_notebook = time.perf_counter() - start
+    line('notebook loop', n_notebook, t_notebook, extra=', coverage {:.4f}'.format(covered))
+    for label, model, n, procs in (('toymc events, 1 process', toymc.lifetime(2, 500, events=True), 10**5, 1),
+                                   ('toymc Gamma sums, 1 process', toymc.lifetime(2, 500), n_toys, 1),
+                                   ('toymc Gamma sums, pool', toymc.lifetime(2, 500), n_toys, processes)):
+        start = time.perf_counter()
+        s = toymc.summary(model, toymc.run(model, n, processes=procs))
+        line(label, n, time.perf_counter() - start, t_notebook,
+             ', coverage {:.4f} +- {:.4f}'.format(s.coverage_sigma[0], s.coverage_err[0]))
+
+    print('Delta ln L = 0.5 intervals, 10^5 toys')
+    model = toymc.lifetime(2, 500)
+    total = model.generate(np.random.default_rng(1), 10**5)
+    closed = model.fit(total)
+    start = time.perf_counter()
+    f = lambda tau: toymc.lifetime_loglikelihood(tau, total, 500)
+    df = lambda tau: -500/tau + total/tau**2
+    lower, upper = toymc.likelihood_interval(f, df, closed.value[:, 0], closed.error[:, 0])
+    t = time.perf_counter() - start
+    print('  Newton steps:     {:.3f} s, max |difference| to the closed form {:.1e}'.format(
+        t, max(np.max(np.abs(lower - closed.lower[:, 0])), np.max(np.abs(upper - closed.upper[:, 0])))))
+    grid = np.linspace(1.5, 2.5, 2001)
+    start = time.perf_counter()
+    scan = toymc.grid_estimate(toymc.surface(model, total[:10**4], grid), grid)
+    t = time.perf_counter() - start
+    closed = model.fit(total[:10**4])
+    print('  grid of {} points: {:.3f} s for 10^4 toys, max |difference| to the closed form {:.1e} (step {:.1e})'
+          .format(len(grid), t, np.nanmax(np.abs(np.concatenate([scan.lower - closed.lower,
+                                                                   scan.upper - closed.upper]))), grid[1] - grid[0]))
+
+    print('polynomial least squares, theta = {}'.format(theta))
+    model = toymc.polynomial(x, sigma_y, theta)
+    rng = np.random.default_rng(0)
+    ys = model.generate(rng, n_notebook)
+    start = time.perf_counter()
+    values = np.array([curve_fit(pol2, x, y, sigma=sigma_y, absolute_sigma=True)[0] for y in ys])
+    t_notebook = time.perf_counter() - start
+    line('curve_fit loop', n_notebook, t_notebook)
+    print('  max |difference| curve_fit - toymc: {:.1e}'.format(np.max(np.abs(values - model.fit(ys).value))))
+    for label, procs in (('toymc, 1 process', 1), ('toymc, pool', processes)):
+        start = time.perf_counter()
+        s = toymc.summary(model, toymc.run(model, n_toys, processes=procs))
+        line(label, n_toys, time.perf_counter() - start, t_notebook,
+             ', pull widths ' + ' '.join('{:.3f}'.format(w) for w in s.pull_std))
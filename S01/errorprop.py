@@ -0,0 +1,113 @@
+import time
+from collections import namedtuple
+import numpy as np
+import sympy
+
+# Gaussian error propagation of S01_error_prop_01.ipynb for whole columns of
+# data: error_prop / error_prop_corr / transform_cov build the formula with
+# SymPy and evaluate it point by point with subs and evalf. Here the
+# expressions are differentiated once, the values and the Jacobian go through
+# common subexpression elimination and lambdify into one NumPy function, and
+# the result is cached per (expressions, variables, constants). The
+# covariances of all points are then J V J^T in one einsum:
+#   x, y = sympy.symbols('x, y')
+#   value, sigma = errorprop.error(sympy.sqrt(x**2 + y**2), [x, y], [xs, ys], sigmas=[sx, sy])
+#   values, U = errorprop.transform_cov([r, theta], [x, y], [xs, ys], V)   # V: (n, 2, 2) or (2, 2)
+
+# the compiled form of a list of expressions: expressions, variables and
+# function(*values) -> (values of the expressions, Jacobian d expression_i / d variable_j)
+Compiled = namedtuple('Compiled', ['exprs', 'vars', 'function'])
+
+_cache = {}
+
+
+def compiled(exprs, vars, constants=None):
+    """
+    Compiled value and Jacobian of one expression or a list of expressions in the variables vars.
+    constants: {symbol: value} substituted before the differentiation.
+    Cached on (expressions, variables, constants).
+    """
+    exprs = tuple(sympy.sympify(e) for e in (exprs if isinstance(exprs, (list, tuple)) else [exprs]))
+    vars = tuple(vars)
+    constants = tuple(sorted((constants or {}).items(), key=lambda item: str(item[0])))
+    key = (exprs, vars, constants)
+    if key not in _cache:
+        subs = [e.subs(constants) for e in exprs]
+        jacobian = [sympy.diff(e, v) for e in subs for v in vars]
+        function = sympy.lambdify(vars, subs + jacobian, modules='numpy', cse=True)
+        _cache[key] = Compiled(exprs, vars, function)
+    return _cache[key]
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def _stacked(values):
+    # one array per variable -> array (..., n_vars)
+    if isinstance(values, (list, tuple)):
+        return np.stack(np.broadcast_arrays(*[np.asarray(v, dtype=float) for v in values]), axis=-1)
+    return np.asarray(values, dtype=float)
+
+
+def evaluate(c, values):
+    """
+    Values (..., n_exprs) and Jacobian (..., n_exprs, n_vars) of the Compiled c at the points
+    values (one array per variable, or an array (..., n_vars)).
+    """
+    values = np.moveaxis(_stacked(values), -1, 0)
+    results = np.broadcast_arrays(*[np.asarray(r, dtype=float) for r in c.function(*values)], values[0])
+    n, m = len(c.exprs), len(c.vars)
+    f = np.stack(results[:n], axis=-1)
+    J = np.stack(results[n:n + n*m], axis=-1).reshape(f.shape[:-1] + (n, m))
+    return f, J
+
+
+def covariance(sigmas=None, cov=None, corr=None):
+    """Covariance matrices (..., n, n) from sigmas (..., n) and correlations (..., n, n), or cov itself."""
+    if cov is not None:
+        return np.asarray(cov, dtype=float)
+    sigmas = np.asarray(sigmas, dtype=float)
+    V = sigmas[..., :, None] * sigmas[..., None, :]
+    if corr is None:
+        return V * np.eye(sigmas.shape[-1])
+    return V * np.asarray(corr, dtype=float)
+
+
+def transform_cov(exprs, vars, values, cov, constants=None):
+    """
+    Values (..., n_exprs) and covariance matrices U = J V J^T (..., n_exprs, n_exprs) of the
+    expressions for the covariance matrices cov (..., n_vars, n_vars) of the variables at values.
+    """
+    f, J = evaluate(compiled(exprs, vars, constants), values)
+    return f, np.einsum('...ij,...jk,...lk->...il', J, np.asarray(cov, dtype=float), J)
+
+
+def error(expr, vars, values, sigmas=None, cov=None, corr=None, constants=None):
+    """
+    Value and uncertainty of one expression (error_prop and error_prop_corr of the notebook):
+    uncorrelated with sigmas (one per variable), else with cov or sigmas and corr.
+    """
+    f, J = evaluate(compiled(expr, vars, constants), values)
+    J = J[..., 0, :]
+    if cov is None and corr is None:
+        # uncorrelated: sum of (df/dx sigma_x)^2
+        return f[..., 0], np.sqrt(np.sum((J * _stacked(sigmas))**2, axis=-1))
+    V = covariance(None if sigmas is None else _stacked(sigmas), cov, corr)
+    return f[..., 0], np.sqrt(np.einsum('...i,...ij,...j->...', J, V, J))
+
+
+if __name__ == '__main__':
+    # b) cylinder of the notebook, r = 2 cm, h = 3 cm, sigma = 0.05 cm, rho = 0 and 1
+    r, h = sympy.symbols('r, h', positive=True)
+    V = sympy.pi * r**2 * h
+    for rho in (0, 1):
+        value, sigma = error(V, [r, h], [2, 3], sigmas=[0.05, 0.05], corr=[[1, rho], [rho, 1]])
+        print('rho = {}: V = ({:.1f} +- {:.1f}) cm^3'.format(rho, value, sigma))
+    # c) r and theta of 10^6 positions at once
+    x, y = sympy.symbols('x, y')
+    rng = np.random.default_rng(0)
+    points = rng.normal(0, 10, (10**6, 2))
+    start = time.perf_counter()
+    values, U = transform_cov([sympy.sqrt(x**2 + y**2), sympy.atan2(y, x)], [x, y], points, np.diag([0.1, 0.2])**2)
+    print('r, theta of {} points in {:.2f} s, U of the first:\n{}'.format(len(points), time.perf_counter() - start, U[0]))
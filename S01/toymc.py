@@ -0,0 +1,214 @@
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from scipy.special import lambertw
+
+# Toy Monte Carlo of the estimators of S01, all pseudo-experiments of a chunk
+# as one array instead of the list comprehension over generate_data in
+# S01_ml_01.ipynb and the one-by-one fits of S01_least_squares_01.ipynb:
+#   lifetime    exponential decay times, ML estimate of tau (mean of the times)
+#               with sigma = tau/sqrt(n) and the Delta ln L = 0.5 interval in
+#               closed form (Lambert W); the sum of the n times is drawn from
+#               its Gamma(n, tau) distribution, events=True draws the times
+#   polynomial  linear least squares fit of a polynomial to points with
+#               Gaussian errors, all toys by one matrix product with the
+#               G = (A^T C^-1 A)^-1 A^T C^-1 of the notebook
+# surface gives ln L (-chi^2/2) of all toys on a parameter grid in one
+# broadcast, likelihood_interval the Delta ln L = up interval of all toys by
+# Newton steps for models without a closed form. The toys are generated in
+# chunks of at most chunk toys (bounded memory), the chunks run on a process
+# pool with independent seeds (SeedSequence.spawn), so the result does not
+# depend on the number of processes.
+#   model = toymc.lifetime(tau=2, n=500)
+#   estimates = toymc.run(model, 10**6)
+#   print(toymc.summary(model, estimates))
+
+#---Settings------------------------------------------------
+chunk = 100000      # toys per chunk
+seed = 0
+up = 0.5            # Delta ln L of the intervals (1 sigma)
+newton_steps = 20
+#-----------------------------------------------------------
+
+# a toy model: name, true parameters, generate(rng, n_toys) -> data of the toys (toys on the first
+# axis), fit(data) -> Estimate, surface(data, grid) -> ln L of every toy at every grid point
+Model = namedtuple('Model', ['name', 'truth', 'generate', 'fit', 'surface'])
+
+# arrays (toys, parameters): estimate, its error and the likelihood interval
+Estimate = namedtuple('Estimate', ['value', 'error', 'lower', 'upper'])
+
+# per parameter: bias (value - truth) with its error, mean and width of the pulls
+# (value - truth)/error, coverage of [lower, upper] and of value +- error with binomial errors
+Summary = namedtuple('Summary', ['n_toys', 'truth', 'bias', 'bias_err', 'pull_mean', 'pull_std',
+                                 'coverage', 'coverage_sigma', 'coverage_err'])
+
+
+#---lifetime-------------------------------------------------
+def _lifetime_generate(tau, n, events, rng, n_toys):
+    # sufficient statistic of a toy: the sum of its decay times
+    if events:
+        return rng.exponential(tau, (n_toys, n)).sum(axis=1)
+    return rng.gamma(n, tau, n_toys)
+
+
+def lifetime_loglikelihood(tau, total, n):
+    """ln L(tau) = -n ln(tau) - sum(t)/tau (loglikelihood of the notebook from the sum of the times)."""
+    return -n*np.log(tau) - total/tau
+
+
+def _lifetime_fit(n, total):
+    tau = total / n
+    # ln L(tau_hat) - ln L(tau) = up  <=>  u - ln(u) = 1 + up/n  with u = tau_hat/tau
+    c = 1 + up/n
+    u_upper = -lambertw(-np.exp(-c), 0).real
+    u_lower = -lambertw(-np.exp(-c), -1).real
+    return Estimate(tau[:, None], (tau/np.sqrt(n))[:, None], (tau/u_lower)[:, None], (tau/u_upper)[:, None])
+
+
+def _lifetime_surface(n, total, grid):
+    return lifetime_loglikelihood(np.asarray(grid)[None, :], total[:, None], n)
+
+
+def lifetime(tau=2.0, n=500, events=False):
+    """Model of n decay times with mean lifetime tau (S01_ml_01.ipynb)."""
+    return Model('lifetime', np.array([tau]), partial(_lifetime_generate, tau, n, events),
+                 partial(_lifetime_fit, n), partial(_lifetime_surface, n))
+
+
+#---polynomial least squares---------------------------------
+def design(x, degree):
+    # the matrix A of the notebook: columns x^0 .. x^degree
+    return np.column_stack([np.asarray(x, dtype=float)**k for k in range(degree + 1)])
+
+
+def _polynomial_generate(mu, sigma_y, rng, n_toys):
+    return mu + sigma_y * rng.standard_normal((n_toys, len(mu)))
+
+
+def _polynomial_fit(G, cov, y):
+    value = y @ G.T
+    error = np.broadcast_to(np.sqrt(np.diag(cov)), value.shape)
+    # linear model: the Delta chi^2 = 2*up interval is value +- sqrt(2*up)*error
+    return Estimate(value, error, value - np.sqrt(2*up)*error, value + np.sqrt(2*up)*error)
+
+
+def _polynomial_surface(A, sigma_y, y, grid):
+    # -chi^2/2 = -(sum y^2/s^2 - 2 y W A theta + theta^T A^T W A theta)/2 for all toys and grid points
+    w = 1 / sigma_y**2
+    grid = np.atleast_2d(grid)
+    mu = grid @ A.T
+    chi2 = (y**2 @ w)[:, None] - 2*(y*w) @ mu.T + (mu**2 @ w)[None, :]
+    return -0.5*chi2
+
+
+def polynomial(x, sigma_y, theta):
+    """Model of the points (x, y +- sigma_y) of a polynomial with parameters theta (S01_least_squares_01.ipynb)."""
+    x, sigma_y, theta = (np.asarray(v, dtype=float) for v in (x, sigma_y, theta))
+    A = design(x, len(theta) - 1)
+    Cinv = np.diag(1 / sigma_y**2)
+    cov = np.linalg.inv(A.T @ Cinv @ A)
+    G = cov @ A.T @ Cinv
+    return Model('polynomial', theta, partial(_polynomial_generate, A @ theta, sigma_y),
+                 partial(_polynomial_fit, G, cov), partial(_polynomial_surface, A, sigma_y))
+
+
+#---likelihood scans-----------------------------------------
+def surface(model, data, grid):
+    """ln L of all toys (rows) at all grid points (columns) in one broadcast."""
+    return model.surface(data, grid)
+
+
+def grid_estimate(lnL, grid, up=up):
+    """
+    Estimate of one parameter from the surfaces of all toys on a 1-d grid: maximum
+    and the Delta ln L = up crossings (linear interpolation between grid points).
+    """
+    grid = np.asarray(grid, dtype=float)
+    best = np.argmax(lnL, axis=1)
+    rows = np.arange(len(lnL))
+    level = lnL[rows, best] - up
+    below = lnL < level[:, None]
+    index = np.arange(len(grid))
+    # last grid point below the level left of the maximum, first one right of it
+    left = np.where(below & (index <= best[:, None]), index, -1).max(axis=1)
+    right = np.where(below & (index >= best[:, None]), index, len(grid)).min(axis=1)
+
+    def crossing(i, j):
+        i, j = np.clip(i, 0, len(grid) - 1), np.clip(j, 0, len(grid) - 1)
+        y0, y1 = lnL[rows, i], lnL[rows, j]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            f = np.where(y1 != y0, (level - y0) / (y1 - y0), 0.0)
+        return grid[i] + f*(grid[j] - grid[i])
+
+    lower = np.where(left >= 0, crossing(left, left + 1), np.nan)
+    upper = np.where(right < len(grid), crossing(right - 1, right), np.nan)
+    value = grid[best]
+    return Estimate(value[:, None], ((upper - lower)/2)[:, None], lower[:, None], upper[:, None])
+
+
+def likelihood_interval(f, df, value, error, up=up, steps=newton_steps):
+    """
+    Delta ln L = up interval of all toys by Newton steps: f(theta), df(theta) are ln L and its
+    derivative for arrays with one theta per toy, value the ML estimates, error the start offsets.
+    """
+    level = f(value) - up
+    result = []
+    for sign in (-1, 1):
+        theta = value + sign*error
+        for _ in range(steps):
+            theta = theta - (f(theta) - level) / df(theta)
+        result.append(theta)
+    return tuple(result)
+
+
+#---runs-----------------------------------------------------
+def _run_chunk(job):
+    model, n_toys, seed_sequence = job
+    return model.fit(model.generate(np.random.default_rng(seed_sequence), n_toys))
+
+
+def run(model, n_toys, chunk=chunk, processes=None, seed=seed):
+    """
+    Estimates of n_toys pseudo-experiments of a model, in chunks of chunk toys on a pool
+    of processes (processes=1: in this process). Returns an Estimate of arrays (toys, parameters).
+    """
+    sizes = [min(chunk, n_toys - start) for start in range(0, n_toys, chunk)]
+    jobs = [(model, size, s) for size, s in zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes)))]
+    if processes == 1 or len(jobs) < 2:
+        results = [_run_chunk(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(_run_chunk, jobs))
+    return Estimate(*(np.concatenate(arrays) for arrays in zip(*results)))
+
+
+def pulls(model, estimates):
+    """(value - truth)/error of all toys (toys, parameters)."""
+    return (estimates.value - model.truth) / estimates.error
+
+
+def summary(model, estimates):
+    """Bias, pulls and coverage of the estimates of a model."""
+    n = len(estimates.value)
+    residual = estimates.value - model.truth
+    pull = pulls(model, estimates)
+    covered = np.mean((estimates.lower <= model.truth) & (model.truth <= estimates.upper), axis=0)
+    covered_sigma = np.mean(np.abs(residual) < estimates.error, axis=0)
+    return Summary(n, model.truth, residual.mean(axis=0), residual.std(axis=0, ddof=1)/np.sqrt(n),
+                   pull.mean(axis=0), pull.std(axis=0, ddof=1), covered, covered_sigma,
+                   np.sqrt(covered*(1 - covered)/n))
+
+
+if __name__ == '__main__':
+    x = [-0.75, -0.5, -0.25, 0., 0.25, 0.5, 0.75]
+    sigma_y = [1, 1, 0.5, 0.5, 0.5, 1, 1]
+    for model in (lifetime(2, 500), lifetime(2, 30), polynomial(x, sigma_y, [5.0, 1.0, -4.0])):
+        start = time.perf_counter()
+        s = summary(model, run(model, 10**6))
+        print('{} ({:.2f} s for {} toys)'.format(model.name, time.perf_counter() - start, s.n_toys))
+        for i, truth in enumerate(s.truth):
+            print('  {:6.2f}: bias {:+.5f} +- {:.5f}, pull {:+.3f} / {:.3f}, coverage {:.4f} (+-error {:.4f}) +- {:.4f}'
+                  .format(truth, s.bias[i], s.bias_err[i], s.pull_mean[i], s.pull_std[i], s.coverage[i],
+                          s.coverage_sigma[i], s.coverage_err[i]))